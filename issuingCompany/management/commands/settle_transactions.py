@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from issuingCompany.constants import TransactionStatus
+from issuingCompany.models import Transaction
+from issuingCompany.settlement import settle_pending_transactions
+
+
+class Command(BaseCommand):
+    help = (
+        "Règle en lot les transactions en attente, société par société. "
+        "A planifier fréquemment (cron); plusieurs instances peuvent tourner en parallèle."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        company_ids = (
+            Transaction.objects.filter(status=TransactionStatus.PENDING, settled_at__isnull=True)
+            .order_by().values_list('issuing_company_id', flat=True).distinct()
+        )
+        total_settled, failed_ids = 0, set()
+        for company_id in company_ids:
+            while True:
+                settled, failed = settle_pending_transactions(company_id, None, options['batch_size'])
+                total_settled += len(settled)
+                failed_ids.update(failed)
+                # Les transactions refusées restent en attente: on s'arrête quand plus rien n'avance
+                if len(settled) + len(failed) < options['batch_size'] or not settled:
+                    break
+        self.stdout.write(self.style.SUCCESS(
+            f"{total_settled} transaction(s) réglée(s), {len(failed_ids)} refusée(s)"
+        ))
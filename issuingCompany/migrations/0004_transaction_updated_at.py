@@ -0,0 +1,38 @@
+# Generated by Django 5.1.3 on 2026-10-19 11:03
+
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('issuingCompany', '0003_initial'),
+        ('sharedapp', '0004_streamevent'),
+        ('shareholders', '0003_populate_keycloakuserrole'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='historicaltransaction',
+            name='updated_at',
+            field=models.DateTimeField(blank=True, default=django.utils.timezone.now, editable=False),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='issuingcompany',
+            index=models.Index(fields=['updated_at'], name='issuingComp_updated_a77024_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['updated_at'], name='issuingComp_updated_e0ac49_idx'),
+        ),
+    ]
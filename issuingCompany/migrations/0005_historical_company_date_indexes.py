@@ -0,0 +1,34 @@
+# Generated by Django 5.1.3 on 2026-10-19 11:06
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('issuingCompany', '0004_transaction_updated_at'),
+        ('sharedapp', '0004_streamevent'),
+        ('shareholders', '0004_shareholder_updated_at_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='historicalissuingcompany',
+            index=models.Index(fields=['id', 'history_date'], name='issuingComp_id_41974b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='historicalsocialact',
+            index=models.Index(fields=['issuing_company', 'history_date'], name='issuingComp_issuing_dcc9d8_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='historicalsociale',
+            index=models.Index(fields=['issuing_company', 'history_date'], name='issuingComp_issuing_2d9773_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='historicaltransaction',
+            index=models.Index(fields=['issuing_company', 'history_date'], name='issuingComp_issuing_1031d3_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.3 on 2026-10-19 11:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('issuingCompany', '0005_historical_company_date_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='historicalissuingcompany',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='historicalsocialact',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='issuingcompany',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='socialact',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
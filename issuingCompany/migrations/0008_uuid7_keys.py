@@ -0,0 +1,34 @@
+# Generated by Django 5.1.3 on 2026-10-19 11:18
+
+import sharedapp.ids
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('issuingCompany', '0007_transaction_settled_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='historicalsociale',
+            name='id',
+            field=models.UUIDField(db_index=True, default=sharedapp.ids.uuid7, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='historicaltransaction',
+            name='id',
+            field=models.UUIDField(db_index=True, default=sharedapp.ids.uuid7, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='sociale',
+            name='id',
+            field=models.UUIDField(default=sharedapp.ids.uuid7, editable=False, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='transaction',
+            name='id',
+            field=models.UUIDField(default=sharedapp.ids.uuid7, editable=False, primary_key=True, serialize=False),
+        ),
+    ]
@@ -0,0 +1,84 @@
+# Generated by Django 5.1.3 on 2026-10-19 13:35
+
+import issuingCompany.exceptions
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('issuingCompany', '0008_uuid7_keys'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='historicalissuingcompany',
+            name='internal_regulations_document',
+            field=models.CharField(db_index=True, max_length=100, validators=[issuingCompany.exceptions.Exception.validate_file_extension, issuingCompany.exceptions.Exception.validate_file_size]),
+        ),
+        migrations.AlterField(
+            model_name='historicalissuingcompany',
+            name='logo',
+            field=models.CharField(db_index=True, help_text='Upload the Company logo when creating it', max_length=100, validators=[issuingCompany.exceptions.Exception.validate_image_extension, issuingCompany.exceptions.Exception.validate_file_size]),
+        ),
+        migrations.AlterField(
+            model_name='historicalissuingcompany',
+            name='organization_chart',
+            field=models.CharField(db_index=True, max_length=100, validators=[issuingCompany.exceptions.Exception.validate_file_extension, issuingCompany.exceptions.Exception.validate_file_size]),
+        ),
+        migrations.AlterField(
+            model_name='historicalissuingcompany',
+            name='registration_trade_register',
+            field=models.CharField(db_index=True, max_length=100, validators=[issuingCompany.exceptions.Exception.validate_file_extension, issuingCompany.exceptions.Exception.validate_file_size]),
+        ),
+        migrations.AlterField(
+            model_name='historicalissuingcompany',
+            name='status_document',
+            field=models.CharField(db_index=True, max_length=100, validators=[issuingCompany.exceptions.Exception.validate_file_extension, issuingCompany.exceptions.Exception.validate_file_size]),
+        ),
+        migrations.AlterField(
+            model_name='historicalsocialact',
+            name='general_assembly_pv',
+            field=models.CharField(db_index=True, max_length=100, validators=[issuingCompany.exceptions.Exception.validate_file_extension, issuingCompany.exceptions.Exception.validate_file_size]),
+        ),
+        migrations.AlterField(
+            model_name='historicaltransaction',
+            name='transaction_document',
+            field=models.CharField(blank=True, db_index=True, max_length=100, null=True),
+        ),
+        migrations.AlterField(
+            model_name='issuingcompany',
+            name='internal_regulations_document',
+            field=models.FileField(db_index=True, upload_to='documents/', validators=[issuingCompany.exceptions.Exception.validate_file_extension, issuingCompany.exceptions.Exception.validate_file_size]),
+        ),
+        migrations.AlterField(
+            model_name='issuingcompany',
+            name='logo',
+            field=models.ImageField(db_index=True, help_text='Upload the Company logo when creating it', upload_to='logos/', validators=[issuingCompany.exceptions.Exception.validate_image_extension, issuingCompany.exceptions.Exception.validate_file_size]),
+        ),
+        migrations.AlterField(
+            model_name='issuingcompany',
+            name='organization_chart',
+            field=models.FileField(db_index=True, upload_to='documents/', validators=[issuingCompany.exceptions.Exception.validate_file_extension, issuingCompany.exceptions.Exception.validate_file_size]),
+        ),
+        migrations.AlterField(
+            model_name='issuingcompany',
+            name='registration_trade_register',
+            field=models.FileField(db_index=True, upload_to='documents/', validators=[issuingCompany.exceptions.Exception.validate_file_extension, issuingCompany.exceptions.Exception.validate_file_size]),
+        ),
+        migrations.AlterField(
+            model_name='issuingcompany',
+            name='status_document',
+            field=models.FileField(db_index=True, upload_to='documents/', validators=[issuingCompany.exceptions.Exception.validate_file_extension, issuingCompany.exceptions.Exception.validate_file_size]),
+        ),
+        migrations.AlterField(
+            model_name='socialact',
+            name='general_assembly_pv',
+            field=models.FileField(db_index=True, upload_to='documents/', validators=[issuingCompany.exceptions.Exception.validate_file_extension, issuingCompany.exceptions.Exception.validate_file_size]),
+        ),
+        migrations.AlterField(
+            model_name='transaction',
+            name='transaction_document',
+            field=models.FileField(blank=True, db_index=True, null=True, upload_to='transaction_documents/'),
+        ),
+    ]
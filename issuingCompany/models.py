@@ -9,7 +9,6 @@ from issuingCompany.exceptions import Exception
 
 from django.core.validators import MinValueValidator
 from django.contrib.auth.models import User
-import uuid
 
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes.fields import GenericForeignKey
@@ -18,7 +17,9 @@ from django.contrib.contenttypes.fields import GenericForeignKey
 from issuingCompany.constants import TransactionType
 from django.core.validators import  RegexValidator
 from simple_history.models import HistoricalRecords
-from simple_history.models import HistoricalRecords
+from sharedapp.historical import IndexedHistoricalRecords
+from sharedapp.ids import uuid7
+from sharedapp.transitions import APPROVAL_WORKFLOW
 from shareholders.models import Address
 
 # Create your models here.
@@ -31,13 +32,13 @@ class IssuingCompany(models.Model):
     name = models.CharField(max_length=255,verbose_name="Company Name") #nom de la societe
     description = models.TextField(max_length=1000,blank=True, null=True) 
     legal = models.CharField(max_length=255,verbose_name="Legal Status")
-    logo = models.ImageField(upload_to='logos/',validators=[Exception.validate_image_extension,Exception.validate_file_size],
+    logo = models.ImageField(upload_to='logos/',db_index=True,validators=[Exception.validate_image_extension,Exception.validate_file_size],
                              help_text="Upload the Company logo when creating it")
     founded_date = models.DateField() #date de creation
     currency = models.CharField(max_length=10,choices=IssuingCompanyStatus.CASH_CURRENT,default='FCFA') #monnaie de l entreprise
-    status_document = models.FileField(upload_to='documents/',validators=[Exception.validate_file_extension,Exception.validate_file_size])#document de status
-    internal_regulations_document = models.FileField(upload_to='documents/',validators=[Exception.validate_file_extension,Exception.validate_file_size])#document de reglement interieur
-    registration_trade_register = models.FileField(upload_to='documents/',validators=[Exception.validate_file_extension,Exception.validate_file_size])#rccm
+    status_document = models.FileField(upload_to='documents/',db_index=True,validators=[Exception.validate_file_extension,Exception.validate_file_size])#document de status
+    internal_regulations_document = models.FileField(upload_to='documents/',db_index=True,validators=[Exception.validate_file_extension,Exception.validate_file_size])#document de reglement interieur
+    registration_trade_register = models.FileField(upload_to='documents/',db_index=True,validators=[Exception.validate_file_extension,Exception.validate_file_size])#rccm
     # ninea = models.CharField(max_length=12,validators=[MinLengthValidator(9)],help_text="Enter a NINEA between 9 to 12 digits")
     ninea = models.CharField(
     max_length=12,
@@ -45,7 +46,7 @@ class IssuingCompany(models.Model):
     help_text="Enter a NINEA between 9 to 12 digits"
 )
 
-    organization_chart = models.FileField(upload_to='documents/',validators=[Exception.validate_file_extension,Exception.validate_file_size]) #organigramme
+    organization_chart = models.FileField(upload_to='documents/',db_index=True,validators=[Exception.validate_file_extension,Exception.validate_file_size]) #organigramme
     capital_social = models.DecimalField(max_digits=10,decimal_places=2,validators=[MinValueValidator(0.01)]) #capital social
     number_of_shares = models.IntegerField(validators=[MinValueValidator(0)]) #nombre de parts sociales
     value_of_shares = models.DecimalField(max_digits=10,decimal_places=2,validators=[MinValueValidator(0.01)]) #valeur des parts sociales
@@ -61,30 +62,23 @@ class IssuingCompany(models.Model):
     approved_by = models.ForeignKey(User,on_delete=models.SET_NULL,null=True, related_name='%(class)s_approved')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    version = models.PositiveIntegerField(default=0)  # Incrémentée à chaque transition de statut
     # address = models.ForeignKey('shareholders.Address', on_delete=models.SET_NULL, null=True, blank=True)
 
-    history = HistoricalRecords()
+    history = IndexedHistoricalRecords(indexes=[('id', 'history_date')])
+    workflow = APPROVAL_WORKFLOW
 
     class Meta:
         verbose_name = "Issuing Company"
         verbose_name_plural = "Issuing Companies"
         ordering = ['name']
+        indexes = [
+            models.Index(fields=['updated_at']),
+        ]
 
-    def transition_status(self,new_status):
-        valid_transitions ={
-            IssuingCompanyStatus.SUBMITTED:[IssuingCompanyStatus.EXAMINED],
-            IssuingCompanyStatus.EXAMINED:[IssuingCompanyStatus.APPROVED,IssuingCompanyStatus.REJECTED],
-            IssuingCompanyStatus.APPROVED:[],
-            IssuingCompanyStatus.REJECTED:[IssuingCompanyStatus.SUBMITTED]
-        }
-        possible_transitions = valid_transitions.get(self.status,[])
-        if new_status not in possible_transitions:
-            raise ValueError(
-                    f"Transition d'état invalide : '{self.status}' -> '{new_status}'. "
-                    f"États possibles : {possible_transitions}."
-                    )
-        self.status = new_status
-        self.save()
+    def transition_status(self,new_status,user=None,expected_version=None):
+        self.workflow.perform(self, new_status, user, expected_version)
+        return True
 
     def __str__(self):
         return self.name
@@ -94,7 +88,7 @@ class SocialAct(models.Model):
     """
     Creation du modele de l'acte social
     """
-    general_assembly_pv = models.FileField(upload_to='documents/',validators=[Exception.validate_file_extension,Exception.validate_file_size]) #pv de l'assemblée générale
+    general_assembly_pv = models.FileField(upload_to='documents/',db_index=True,validators=[Exception.validate_file_extension,Exception.validate_file_size]) #pv de l'assemblée générale
     date = models.DateField()
     general_assembly_type = models.CharField(max_length=20, choices=SocialActType.TYPE_GENERAL_ASSEMBLY,default=SocialActType.ORDINARY) #type de l'assemblée générale ordinaire ou extraordinaire
     social_act_type = models.CharField(max_length=20, choices=SocialActType.TYPE_SOCIAL_ACT,default=SocialActType.STORE_INCORPORATION) #type de l'acte social incorporation de reserves/ressources internes
@@ -109,9 +103,11 @@ class SocialAct(models.Model):
     approved_by = models.ForeignKey(User,on_delete=models.SET_NULL,null=True, related_name='%(class)s_approved') 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    version = models.PositiveIntegerField(default=0)  # Incrémentée à chaque transition de statut
     history = models.JSONField(default=list,blank=True)
 
-    history = HistoricalRecords()
+    history = IndexedHistoricalRecords(indexes=[('issuing_company', 'history_date')])
+    workflow = APPROVAL_WORKFLOW
 
     class Meta:
         verbose_name = "Social Act"
@@ -140,21 +136,9 @@ class SocialAct(models.Model):
     def get_social_act_type_display(self):
         return dict(SocialActType.TYPE_SOCIAL_ACT).get(self.social_act_type,"Inconnu")
     
-    def transition_status(self,new_status):
-        valid_transitions ={
-            SocialActType.SUBMITTED:[SocialActType.EXAMINED],
-            SocialActType.EXAMINED:[SocialActType.APPROVED,SocialActType.REJECTED],
-            SocialActType.APPROVED:[],
-            SocialActType.REJECTED:[SocialActType.SUBMITTED]
-        }
-        possible_transitions = valid_transitions.get(self.status,[])
-        if new_status not in possible_transitions:
-            raise ValueError(
-                f"Transition d'état invalide : '{self.status}' -> '{new_status}'. "
-                f"États possibles : {possible_transitions}."
-                )
-        self.status = new_status
-        self.save()
+    def transition_status(self,new_status,user=None,expected_version=None):
+        self.workflow.perform(self, new_status, user, expected_version)
+        return True
     
     def __str__(self):
         return f"Social Act ({self.issuing_company}) - {self.date}"
@@ -218,7 +202,7 @@ class Sociale(models.Model):
     """
     Model representing social capital details
     """
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
     
     # Social capital as a string (can include currency or formatting)
     capital_social = models.CharField(max_length=200)
@@ -247,7 +231,7 @@ class Sociale(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
-    history = HistoricalRecords()
+    history = IndexedHistoricalRecords(indexes=[('issuing_company', 'history_date')])
     
     class Meta:
         verbose_name = 'Social Capital'
@@ -269,7 +253,7 @@ class Transaction(models.Model):
     """
     
 
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False) # Transaction ID
+    id = models.UUIDField(primary_key=True, default=uuid7, editable=False) # Transaction ID
     # Les different types de transactions (achat, vente, transferer)
     type = models.CharField(
         max_length=20, 
@@ -307,11 +291,13 @@ class Transaction(models.Model):
     )
     
     transaction_date = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     # Document de la transaction
     transaction_document = models.FileField(
         upload_to='transaction_documents/', 
         null=True, 
-        blank=True
+        blank=True,
+        db_index=True
     )
     
     # Si la transaction est confidentielle ou non, par defaut c'est non
@@ -324,6 +310,9 @@ class Transaction(models.Model):
         default=TransactionStatus.PENDING
     )
     
+    # Date du règlement (mouvement des parts entre vendeur et acheteur)
+    settled_at = models.DateTimeField(null=True, blank=True)
+
     # Qui a validé la transaction
     validated_by = models.ForeignKey(
         User, 
@@ -345,7 +334,7 @@ class Transaction(models.Model):
 
     notes = models.TextField(blank=True)  # Notes en cas de rejet
 
-    history = HistoricalRecords()
+    history = IndexedHistoricalRecords(indexes=[('issuing_company', 'history_date')])
     def save(self, *args, **kwargs):
         # Calcul du capital total
         self.total_capital_value = sum(
@@ -358,7 +347,9 @@ class Transaction(models.Model):
     class Meta:
         indexes = [
             models.Index(fields=['transaction_date']),
-            models.Index(fields=['type'])
+            models.Index(fields=['type']),
+            models.Index(fields=['updated_at']),
+            models.Index(fields=['issuing_company', 'status', 'transaction_date']),
         ]
 
         ordering = ['-transaction_date']
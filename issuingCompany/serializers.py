@@ -2,10 +2,12 @@ from rest_framework import serializers
 from .models import IssuingCompany,SocialAct
 from shareholders.serializers import UserSerializer,AddressSerializer
 from shareholders.models import Address 
+from sharedapp.images import ImageVariantsMixin
+from sharedapp.uploads import UploadedFileFieldsMixin
 from .models import ActeSocialAugmentation,ActeSocialReduction,Sociale,Transaction
 
 
-class IssuingCompanySerializer(serializers.ModelSerializer):
+class IssuingCompanySerializer(ImageVariantsMixin, UploadedFileFieldsMixin, serializers.ModelSerializer):
     head_office_address = AddressSerializer(required=False)  # Remove required=False to make it required
     created_by = UserSerializer(read_only=True)
     examined_by = UserSerializer(read_only=True)
@@ -14,7 +16,8 @@ class IssuingCompanySerializer(serializers.ModelSerializer):
     class Meta:
         model = IssuingCompany
         fields = '__all__'
-        read_only_fields = ('created_at', 'updated_at', 'status', 'history')
+        read_only_fields = ('created_at', 'updated_at', 'status', 'version', 'history')
+        image_variant_fields = ['logo']
 
     def create(self, validated_data):
         request = self.context.get('request')
@@ -79,7 +82,7 @@ class SocialActSerializer(serializers.ModelSerializer):
     class Meta:
         model = SocialAct
         fields = '__all__'
-        read_only_fields = ('created_at', 'updated_at','status','history')
+        read_only_fields = ('created_at', 'updated_at','status','version','history')
 
     #Validation du capital
     def validate(self,data):
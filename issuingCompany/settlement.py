@@ -0,0 +1,175 @@
+# settlement.py
+import logging
+from collections import defaultdict
+
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from sharedapp.models import WorkflowEvent
+from sharedapp.notifications import notify_bulk_status_change
+from sharedapp.responsecache import invalidate_updated
+from sharedapp.transitions import TransitionConflict
+
+from .constants import TransactionStatus
+from .models import Transaction
+
+logger = logging.getLogger(__name__)
+
+
+class SettlementError(Exception):
+    """
+    Transaction non réglable (parties manquantes, solde insuffisant...)
+    """
+
+
+def _transaction_parties(transaction_instance):
+    return (
+        (transaction_instance.seller_content_type_id, transaction_instance.seller_object_id),
+        (transaction_instance.buyer_content_type_id, transaction_instance.buyer_object_id),
+    )
+
+
+def lock_holdings(party_keys):
+    """
+    Verrouille les lignes d'actionnaires concernées dans un ordre déterministe
+    (type de contenu puis clé primaire) pour éviter les interblocages.
+    Retourne {(content_type_id, object_id): actionnaire}.
+    """
+    by_content_type = defaultdict(set)
+    for content_type_id, object_id in party_keys:
+        by_content_type[content_type_id].add(object_id)
+
+    holdings = {}
+    for content_type_id in sorted(by_content_type):
+        model = ContentType.objects.get_for_id(content_type_id).model_class()
+        rows = model.objects.select_for_update().filter(pk__in=by_content_type[content_type_id]).order_by('pk')
+        for holder in rows:
+            holdings[(content_type_id, holder.pk)] = holder
+    return holdings
+
+
+def check_transaction(transaction_instance, holdings, balances):
+    """
+    Vérifie une transaction contre les soldes courants (en mémoire); lève SettlementError
+    """
+    seller_key, buyer_key = _transaction_parties(transaction_instance)
+    if seller_key not in holdings or buyer_key not in holdings:
+        raise SettlementError("Seller and buyer must be set.")
+    if seller_key == buyer_key:
+        raise SettlementError("Seller and buyer must be different.")
+    for key in (seller_key, buyer_key):
+        if holdings[key].issuing_company_id != transaction_instance.issuing_company_id:
+            raise SettlementError("Seller and buyer must be shareholders of the issuing company.")
+    if transaction_instance.quantity <= 0 or transaction_instance.total_amount <= 0:
+        raise SettlementError("Quantity and total amount must be greater than zero.")
+    if balances[seller_key] < transaction_instance.quantity:
+        raise SettlementError(
+            f"Insufficient shares: seller holds {balances[seller_key]}, "
+            f"{transaction_instance.quantity} required."
+        )
+
+
+def _write_settlement(settled, holdings, deltas, user, comment=''):
+    """
+    Ecrit les mouvements nets (un UPDATE par modèle et par delta distinct),
+    marque les transactions réglées et enregistre historique et événements en masse
+    """
+    now = timezone.now()
+    by_delta = defaultdict(list)
+    for (content_type_id, object_id), delta in deltas.items():
+        if delta:
+            by_delta[(content_type_id, delta)].append(object_id)
+    for (content_type_id, delta), object_ids in sorted(by_delta.items()):
+        model = ContentType.objects.get_for_id(content_type_id).model_class()
+        model.objects.filter(pk__in=object_ids).update(total_shares=F('total_shares') + delta, updated_at=now)
+
+    changed = defaultdict(list)
+    for key, delta in deltas.items():
+        if delta:
+            holder = holdings[key]
+            holder.total_shares += delta
+            holder.updated_at = now
+            changed[type(holder)].append(holder)
+    for model, holders in changed.items():
+        model.history.bulk_history_create(holders, update=True, default_user=user, default_change_reason='settlement')
+        invalidate_updated(model, {holder.issuing_company_id for holder in holders})
+
+    Transaction.objects.filter(pk__in=[item.pk for item in settled]).update(
+        status=TransactionStatus.VALIDATED, validated_by=user, settled_at=now, updated_at=now
+    )
+    for item in settled:
+        item.status, item.validated_by, item.settled_at, item.updated_at = TransactionStatus.VALIDATED, user, now, now
+    Transaction.history.bulk_history_create(settled, update=True, default_user=user, default_change_reason='settlement')
+
+    content_type = ContentType.objects.get_for_model(Transaction)
+    WorkflowEvent.objects.bulk_create([
+        WorkflowEvent(
+            content_type=content_type, object_id=str(item.pk), action='settle',
+            from_status=TransactionStatus.PENDING, to_status=item.status, actor=user, comment=comment
+        )
+        for item in settled
+    ], batch_size=500)
+
+
+def settle_transaction(transaction_id, user, comment=''):
+    """
+    Règle une transaction en une seule transaction courte: verrouille la transaction
+    puis les lignes du vendeur et de l'acheteur, vérifie le solde et déplace les parts.
+    Lève TransitionConflict si elle n'est plus en attente, SettlementError sinon.
+    """
+    with transaction.atomic():
+        transaction_instance = Transaction.objects.select_for_update().get(pk=transaction_id)
+        if transaction_instance.status != TransactionStatus.PENDING or transaction_instance.settled_at:
+            raise TransitionConflict("Only transactions with 'PENDING' status can be validated.")
+
+        holdings = lock_holdings(_transaction_parties(transaction_instance))
+        balances = {key: holder.total_shares for key, holder in holdings.items()}
+        check_transaction(transaction_instance, holdings, balances)
+
+        seller_key, buyer_key = _transaction_parties(transaction_instance)
+        deltas = {seller_key: -transaction_instance.quantity, buyer_key: transaction_instance.quantity}
+        _write_settlement([transaction_instance], holdings, deltas, user, comment)
+    return transaction_instance
+
+
+def settle_pending_transactions(issuing_company_id, user, limit=500):
+    """
+    Règle en lot la file des transactions en attente d'une société, dans l'ordre d'arrivée.
+    Les soldes sont vérifiés transaction par transaction en mémoire, puis les mouvements
+    sont compensés par actionnaire et écrits en une passe, avec une notification groupée
+    mise en file dans la même transaction. Les transactions déjà
+    verrouillées par un autre règlement sont laissées pour le lot suivant.
+    Retourne (transactions réglées, {transaction_id: motif} des transactions refusées).
+    """
+    with transaction.atomic():
+        pending = list(
+            Transaction.objects.select_for_update(skip_locked=True)
+            .filter(issuing_company_id=issuing_company_id, status=TransactionStatus.PENDING, settled_at__isnull=True)
+            .order_by('transaction_date', 'pk')[:limit]
+        )
+        if not pending:
+            return [], {}
+
+        holdings = lock_holdings({key for item in pending for key in _transaction_parties(item)})
+        balances = {key: holder.total_shares for key, holder in holdings.items()}
+        deltas = defaultdict(int)
+        settled, failed = [], {}
+        for item in pending:
+            try:
+                check_transaction(item, holdings, balances)
+            except SettlementError as e:
+                failed[str(item.pk)] = str(e)
+                continue
+            seller_key, buyer_key = _transaction_parties(item)
+            for key, delta in ((seller_key, -item.quantity), (buyer_key, item.quantity)):
+                balances[key] += delta
+                deltas[key] += delta
+            settled.append(item)
+
+        if settled:
+            _write_settlement(settled, holdings, deltas, user)
+            notify_bulk_status_change(settled, user)
+    logger.info(f"Settled {len(settled)} transaction(s) for company {issuing_company_id}, {len(failed)} refused")
+    return settled, failed
@@ -1,3 +1,116 @@
 from django.test import TestCase
 
 # Create your tests here.
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from rest_framework.test import APIClient
+
+from shareholders.constants import KeycloakRoles
+from sharedapp.models import Announcement, NotificationJob, WorkflowEvent
+from sharedapp.tests import make_company, make_physical_shareholder, make_user
+from sharedapp.transitions import TransitionConflict
+
+from .constants import IssuingCompanyStatus, TransactionStatus
+from .models import Transaction
+from .settlement import SettlementError, settle_pending_transactions, settle_transaction
+
+
+class SettlementTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='editor', password='password')
+        self.company = make_company()
+        self.announcement = Announcement.objects.create(
+            description='Vente', quantity=10, price=100, expiration_date='2030-01-01', share=self.company
+        )
+        self.alice = make_physical_shareholder('REF-A', issuing_company=self.company, total_shares=10)
+        self.bob = make_physical_shareholder('REF-B', issuing_company=self.company, total_shares=5)
+
+    def make_transaction(self, seller, buyer, quantity):
+        content_type = ContentType.objects.get_for_model(seller)
+        return Transaction.objects.create(
+            seller_content_type=content_type, seller_object_id=seller.pk,
+            buyer_content_type=content_type, buyer_object_id=buyer.pk,
+            quantity=quantity, price_per_share=100, issuing_company=self.company,
+            announcement=self.announcement
+        )
+
+    def balances(self):
+        self.alice.refresh_from_db()
+        self.bob.refresh_from_db()
+        return self.alice.total_shares, self.bob.total_shares
+
+    def test_settle_moves_shares_once(self):
+        sale = self.make_transaction(self.alice, self.bob, 4)
+        settle_transaction(sale.pk, self.user)
+        self.assertEqual(self.balances(), (6, 9))
+        sale.refresh_from_db()
+        self.assertEqual(sale.status, TransactionStatus.VALIDATED)
+        self.assertIsNotNone(sale.settled_at)
+        self.assertEqual(WorkflowEvent.objects.filter(action='settle').count(), 1)
+
+        with self.assertRaises(TransitionConflict):
+            settle_transaction(sale.pk, self.user)
+        self.assertEqual(self.balances(), (6, 9))
+
+    def test_insufficient_balance(self):
+        sale = self.make_transaction(self.alice, self.bob, 11)
+        with self.assertRaises(SettlementError):
+            settle_transaction(sale.pk, self.user)
+        self.assertEqual(self.balances(), (10, 5))
+
+    def test_batch_nets_in_order(self):
+        first = self.make_transaction(self.alice, self.bob, 8)
+        second = self.make_transaction(self.alice, self.bob, 5)
+        third = self.make_transaction(self.bob, self.alice, 13)
+
+        settled, failed = settle_pending_transactions(self.company.pk, self.user)
+        self.assertEqual([item.pk for item in settled], [first.pk, third.pk])
+        self.assertEqual(list(failed), [str(second.pk)])
+        self.assertEqual(self.balances(), (15, 0))
+
+        job = NotificationJob.objects.get()
+        self.assertEqual(job.payload['status_event']['ids'], [str(first.pk), str(third.pk)])
+        self.assertEqual(job.payload['status_event']['status'], TransactionStatus.VALIDATED)
+
+    def test_settle_pending_validates_company(self):
+        client = APIClient()
+        client.force_authenticate(user=make_user('settler', [KeycloakRoles.EDITOR]))
+        url = '/api/issuingCompany/transactions/settle_pending/'
+        self.make_transaction(self.alice, self.bob, 4)
+
+        self.assertEqual(client.post(url, {}, format='json').status_code, 400)
+        self.assertEqual(client.post(url, {'issuing_company': 'abc'}, format='json').status_code, 400)
+        self.assertEqual(client.post(url, {'issuing_company': [1]}, format='json').status_code, 400)
+        self.assertEqual(client.post(url, {'issuing_company': self.company.pk + 1000}, format='json').status_code, 404)
+        self.assertEqual(self.balances(), (10, 5))
+
+        response = client.post(url, {'issuing_company': self.company.pk}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['settled']), 1)
+
+
+class CompanyTransitionTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(user=make_user('reviewer', [KeycloakRoles.EXAMINER, KeycloakRoles.APPROVER]))
+        self.company = make_company()
+        self.url = f'/api/issuingCompany/issuing-companies/{self.company.pk}/'
+
+    def test_invalid_transition_and_stale_version(self):
+        response = self.client.post(f'{self.url}approve/', {'decision': 'approve'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(f'{self.url}examine/', {'version': 5}, format='json')
+        self.assertEqual(response.status_code, 409)
+        response = self.client.post(f'{self.url}examine/', {'version': 0}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+    def test_transition_is_rolled_back_with_its_event(self):
+        with mock.patch('issuingCompany.views.record_transition', side_effect=RuntimeError), \
+                self.assertRaises(RuntimeError):
+            self.client.post(f'{self.url}examine/', {}, format='json')
+        self.company.refresh_from_db()
+        self.assertEqual((self.company.status, self.company.version), (IssuingCompanyStatus.SUBMITTED, 0))
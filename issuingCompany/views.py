@@ -1,4 +1,4 @@
-from django.shortcuts import render
+from django.shortcuts import get_object_or_404, render
 from yaml import serialize
 from .serializers import (
     IssuingCompanySerializer,
@@ -17,21 +17,31 @@ from rest_framework.exceptions import PermissionDenied
 from django.db import transaction
 from shareholders.constants import KeycloakRoles
 from shareholders.views import HasKeycloakRole
-from django.utils import timezone
+from sharedapp.changefeed import ChangeFeedMixin
+from sharedapp.history import HistoryViewSetMixin, TimelineViewSetMixin
+from sharedapp.http import ConditionalGetMixin, DocumentBundleMixin
+from sharedapp.models import Announcement, Dividend
+from shareholders.models import LegalShareholder, PhysicalShareholder, Share
+from sharedapp.notifications import notify_status_change
+from sharedapp.workflow import (BulkTransitionMixin, WorkflowEventMixin,
+                               get_expected_version, record_transition)
 import logging
+import os
 from django.db.models import Q
 from .constants import IssuingCompanyStatus,TransactionStatus,SocialActType
+from .settlement import SettlementError, settle_pending_transactions, settle_transaction
 from simple_history.models import HistoricalRecords
 
 
 #gerer les entites de la societe emettrice
 logger = logging.getLogger(__name__)
-class IssuingCompanyViewSet(viewsets.ModelViewSet):
+class IssuingCompanyViewSet(ConditionalGetMixin, ChangeFeedMixin, HistoryViewSetMixin, TimelineViewSetMixin, WorkflowEventMixin, BulkTransitionMixin, DocumentBundleMixin, viewsets.ModelViewSet):
     queryset = IssuingCompany.objects.select_related(
         'head_office_address','created_by','examined_by','approved_by'
     ).all()
     serializer_class = IssuingCompanySerializer
     permission_classes = [IsAuthenticated]
+    conditional_related = ['head_office_address']
 
 
     #Gerer les permissions
@@ -40,6 +50,8 @@ class IssuingCompanyViewSet(viewsets.ModelViewSet):
             return [HasKeycloakRole(KeycloakRoles.EDITOR)]
         elif self.action in ['examine','approve']:
             return [HasKeycloakRole([KeycloakRoles.EXAMINER,KeycloakRoles.APPROVER])]
+        elif self.action in ['bulk_transition', 'documents_bundle', 'document_links']:
+            return [HasKeycloakRole(KeycloakRoles.ALL_ROLES)]
         return [HasKeycloakRole([KeycloakRoles.ADMIN,KeycloakRoles.EDITOR])]
     
     # Redéfinir get_queryset pour filtrer en fonction de l'utilisateur ou d'autres critères
@@ -116,26 +128,24 @@ class IssuingCompanyViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         with transaction.atomic():
-            company.status = 'SUBMITTED'
-            company.notes = f"{company.notes}\n[Submission {timezone.now()}]: {notes}".strip()
-            company.save()
+            record_transition(company, 'submit', company.status, request.user, notes)
+            notify_status_change(company, request.user, notes)
         serializer = self.get_serializer(company)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
     #Marquer une société émettrice comme examinée.
     @action(detail=True, methods=['POST'])
+    @transaction.atomic
     def examine(self, request, pk=None):
         company = self.get_object()
         if not request.user.keycloak_user.has_role(KeycloakRoles.EXAMINER):
             raise PermissionDenied("Only examiners can perform this action")
         notes = request.data.get('notes', '')
 
-        if company.transition_status(IssuingCompanyStatus.EXAMINED,request.user):
-            with transaction.atomic():
-                company.status = 'EXAMINED'
-                company.examined_by = request.user
-                company.notes = f"{company.notes}\n[Examination {timezone.now()}]: {notes}".strip()
-                company.save()
+        from_status = company.status
+        if company.transition_status(IssuingCompanyStatus.EXAMINED, request.user, get_expected_version(request)):
+            record_transition(company, 'examine', from_status, request.user, notes)
+            notify_status_change(company, request.user, notes)
             serializer = self.get_serializer(company)
             return Response(serializer.data, status=status.HTTP_200_OK)
         return Response(
@@ -146,6 +156,7 @@ class IssuingCompanyViewSet(viewsets.ModelViewSet):
     
     #Marquer une société émettrice comme approuvée.
     @action(detail=True, methods=['POST'])
+    @transaction.atomic
     def approve(self, request, pk=None):
         company = self.get_object()
         if not request.user.keycloak_user.has_role(KeycloakRoles.APPROVER):
@@ -158,27 +169,41 @@ class IssuingCompanyViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         new_status = IssuingCompanyStatus.APPROVED if decision == 'approve' else IssuingCompanyStatus.REJECTED
-        if company.transition_status(new_status,request.user):
-            with transaction.atomic():
-                company.status = new_status
-                company.approved_by = request.user
-                company.notes = f"{company.notes}\n[{new_status} {timezone.now()}]: {notes}".strip()
-                company.save()
+        from_status = company.status
+        if company.transition_status(new_status, request.user, get_expected_version(request)):
+            record_transition(company, decision, from_status, request.user, notes)
+            notify_status_change(company, request.user, notes)
             serializer = self.get_serializer(company)
             return Response(serializer.data, status=status.HTTP_200_OK)
         return Response(
             {"error": "Status transition failed"},
             status=status.HTTP_400_BAD_REQUEST
         )
-    @action(detail=True, methods=['GET'])
-    def history(self, request, pk=None):
+
+    def get_timeline_sources(self, company):
         """
-        Récupère l'historique des modifications de la societe
+        Tables historiques du journal d'audit d'une société, chacune filtrée
+        sur l'index (société, history_date)
         """
-        company = self.get_object()
-        return Response(company.history)
-
-class SocialActViewSet(viewsets.ModelViewSet):
+        sources = [(IssuingCompany, {'id': company.pk}), (Announcement, {'share': company.pk})]
+        sources += [
+            (model, {'issuing_company': company.pk})
+            for model in (SocialAct, Sociale, Share, PhysicalShareholder, LegalShareholder, Transaction, Dividend)
+        ]
+        return [(model._meta.label_lower, model.history.filter(**filters)) for model, filters in sources]
+
+    def get_bundle_files(self, company):
+        """
+        Documents réglementaires et logo de la société
+        """
+        return [
+            (f"{field_name}{os.path.splitext(getattr(company, field_name).name)[1]}",
+             getattr(company, field_name), company.created_at)
+            for field_name in ('status_document', 'internal_regulations_document',
+                               'registration_trade_register', 'organization_chart', 'logo')
+        ]
+
+class SocialActViewSet(ConditionalGetMixin, HistoryViewSetMixin, WorkflowEventMixin, BulkTransitionMixin, viewsets.ModelViewSet):
     """
     ViewSet pour gérer les actes sociaux.
     """
@@ -187,6 +212,7 @@ class SocialActViewSet(viewsets.ModelViewSet):
     ).all()
     serializer_class = SocialActSerializer
     permission_classes = [IsAuthenticated]
+    conditional_related = ['issuing_company', 'issuing_company__head_office_address']
 
     # Gérer les permissions
     def get_permissions(self):
@@ -194,6 +220,8 @@ class SocialActViewSet(viewsets.ModelViewSet):
             return [HasKeycloakRole(KeycloakRoles.EDITOR)]
         elif self.action in ['approve', 'calculate']:
             return [HasKeycloakRole([KeycloakRoles.APPROVER, KeycloakRoles.EXAMINER])]
+        elif self.action == 'bulk_transition':
+            return [HasKeycloakRole(KeycloakRoles.ALL_ROLES)]
         return [HasKeycloakRole([KeycloakRoles.ADMIN, KeycloakRoles.EDITOR])]
     
         # Méthode pour valider et gérer les erreurs 400
@@ -226,6 +254,7 @@ class SocialActViewSet(viewsets.ModelViewSet):
 
  # Approuver ou rejeter un acte social
     @action(detail=True, methods=['POST'])
+    @transaction.atomic
     def approve(self, request, pk=None):
         """
         Approuve ou rejette un acte social.
@@ -245,12 +274,10 @@ class SocialActViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         new_status = SocialActType.APPROVED if decision == 'approve' else SocialActType.REJECTED
-        if social_act.transition_status(new_status,request.user):
-            with transaction.atomic():
-                social_act.status = 'APPROVED' if decision == 'approve' else 'REJECTED'
-                social_act.approved_by = request.user
-                social_act.notes = f"{social_act.notes}\n[{social_act.status} {timezone.now()}]: {notes}".strip()
-                social_act.save()
+        from_status = social_act.status
+        if social_act.transition_status(new_status, request.user, get_expected_version(request)):
+            record_transition(social_act, decision, from_status, request.user, notes)
+            notify_status_change(social_act, request.user, notes)
             serializer = self.get_serializer(social_act)
             return Response(serializer.data, status=status.HTTP_200_OK)
         return Response(
@@ -258,18 +285,17 @@ class SocialActViewSet(viewsets.ModelViewSet):
             status=status.HTTP_400_BAD_REQUEST
         )
     @action(detail=True, methods=['POST'])
+    @transaction.atomic
     def examine(self, request, pk=None):
         social_act = self.get_object()
         if not request.user.keycloak_user.has_role(KeycloakRoles.EXAMINER):
             raise PermissionDenied("Only examiners can perform this action")
         notes = request.data.get('notes', '')
 
-        if social_act.transition_status(SocialActType.EXAMINED,request.user):
-            with transaction.atomic():
-                social_act.status = 'EXAMINED'
-                social_act.examined_by = request.user
-                social_act.notes = f"{social_act.notes}\n[Examination {timezone.now()}]: {notes}".strip()
-                social_act.save()
+        from_status = social_act.status
+        if social_act.transition_status(SocialActType.EXAMINED, request.user, get_expected_version(request)):
+            record_transition(social_act, 'examine', from_status, request.user, notes)
+            notify_status_change(social_act, request.user, notes)
             serializer = self.get_serializer(social_act)
             return Response(serializer.data, status=status.HTTP_200_OK)
         return Response(
@@ -277,16 +303,6 @@ class SocialActViewSet(viewsets.ModelViewSet):
             status=status.HTTP_400_BAD_REQUEST
         )
 
-    # Historique des modifications d'un acte social
-    @action(detail=True, methods=['GET'])
-    def history(self, request, pk=None):
-        """
-        Récupère l'historique des modifications d'un acte social.
-        """
-        social_act = self.get_object()
-        history_data = social_act.history  # Vous devez implémenter un système d'historique, ex: django-simple-history
-        return Response(history_data, status=status.HTTP_200_OK)
-
     # Soumettre un acte social pour approbation
     @action(detail=True, methods=['POST'])
     def submit(self, request, pk=None):
@@ -305,21 +321,21 @@ class SocialActViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         with transaction.atomic():
-            social_act.status = 'SUBMITTED'
-            social_act.notes = f"{social_act.notes}\n[Submission {timezone.now()}]: {notes}".strip()
-            social_act.save()
+            record_transition(social_act, 'submit', social_act.status, request.user, notes)
+            notify_status_change(social_act, request.user, notes)
 
         serializer = self.get_serializer(social_act)
         return Response(serializer.data, status=status.HTTP_200_OK)
     
 
-class ActeSocialAugmentationViewSet(viewsets.ModelViewSet):
+class ActeSocialAugmentationViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     """
     ViewSet pour gérer les actes sociaux augmentés.
     """
     queryset = ActeSocialAugmentation.objects.select_related('issuing_company').all()
     serializer_class = ActeSocialAugmentationSerializer
     permission_classes = [IsAuthenticated]
+    conditional_related = ['issuing_company', 'issuing_company__head_office_address']
 
     # Gérer les permissions
     def get_permissions(self):
@@ -342,13 +358,14 @@ class ActeSocialAugmentationViewSet(viewsets.ModelViewSet):
         return Response(serializer.data, status=status.HTTP_200_OK)
     
 
-class ActeSocialReductionViewSet(viewsets.ModelViewSet):
+class ActeSocialReductionViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     """
     ViewSet pour gérer les réductions de capital.
     """
     queryset = ActeSocialReduction.objects.select_related('issuing_company').all()
     serializer_class = ActeSocialReductionSerializer
     permission_classes = [IsAuthenticated]
+    conditional_related = ['issuing_company', 'issuing_company__head_office_address']
 
     def get_permissions(self):
         if self.action in ['create', 'update', 'partial_update', 'destroy']:
@@ -370,7 +387,7 @@ class ActeSocialReductionViewSet(viewsets.ModelViewSet):
         return Response(serializer.data, status=status.HTTP_200_OK)
     
 
-class SocialeViewSet(viewsets.ModelViewSet):
+class SocialeViewSet(HistoryViewSetMixin, viewsets.ModelViewSet):
     """
     ViewSet pour gérer les informations sociales.
     """
@@ -383,18 +400,10 @@ class SocialeViewSet(viewsets.ModelViewSet):
             return [HasKeycloakRole(KeycloakRoles.EDITOR)]
         return [HasKeycloakRole([KeycloakRoles.ADMIN, KeycloakRoles.EDITOR])]
 
-    @action(detail=True, methods=['GET'])
-    def history(self, request, pk=None):
-        """
-        Récupère l'historique des modifications.
-        """
-        instance = self.get_object()
-        history_data = instance.history
-        return Response(history_data, status=status.HTTP_200_OK)
     
 
 #La view de la transaction
-class TransactionViewSet(viewsets.ModelViewSet):
+class TransactionViewSet(ConditionalGetMixin, ChangeFeedMixin, WorkflowEventMixin, viewsets.ModelViewSet):
     """
     ViewSet pour gérer les transactions.
     """
@@ -404,6 +413,7 @@ class TransactionViewSet(viewsets.ModelViewSet):
 
     serializer_class = TransactionSerializer
     permission_classes = [IsAuthenticated]
+    conditional_related = ['issuing_company', 'issuing_company__head_office_address']
 
     def get_permissions(self):
         if self.action in ['create', 'update', 'partial_update', 'destroy']:
@@ -442,9 +452,11 @@ class TransactionViewSet(viewsets.ModelViewSet):
         if error_message:
             return error_message
         with transaction.atomic():
+            from_status = transactions.status
             transactions.status = 'SUBMITTED'
-            transactions.notes = f"{transactions.notes}\n[Submission {timezone.now()}]: {notes}".strip()
-            transactions.save()
+            transactions.save(update_fields=['status', 'updated_at'])
+            record_transition(transactions, 'submit', from_status, request.user, notes)
+            notify_status_change(transactions, request.user, notes, roles=[KeycloakRoles.EDITOR])
         serializer = self.get_serializer(transactions)
         return Response(serializer.data, status=status.HTTP_200_OK)
     
@@ -462,26 +474,42 @@ class TransactionViewSet(viewsets.ModelViewSet):
                 {"error": "Only transactions with 'PENDING' status can be validated."},
                 status = status.HTTP_400_BAD_REQUEST
             )
-        #Verification de la conformite
-        if not transaction_instance.seller or not transaction_instance.buyer:
-            return Response(
-                {"error": "Seller and buyer must be set."},
-                status = status.HTTP_400_BAD_REQUEST
-            )
-        
-        if transaction_instance.total_amount <= 0:
-            return Response(
-                {"error": "Total amount must be greater than zero."},
-                status = status.HTTP_400_BAD_REQUEST
-            )
-        with transaction.atomic():
-            transaction_instance.status = 'VALIDATED'
-            transaction_instance.notes = f"{transaction_instance.notes}\n[Validation {timezone.now()}]: {notes}".strip()
-            transaction_instance.save()
+        try:
+            transaction_instance = settle_transaction(transaction_instance.pk, request.user, notes)
+        except SettlementError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        notify_status_change(transaction_instance, request.user, notes)
 
         serializer = self.get_serializer(transaction_instance)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
+    #Regler en lot les transactions en attente d'une societe
+    @action(detail=False, methods=['POST'])
+    def settle_pending(self, request):
+        """
+        Règle en lot les transactions en attente d'une société émettrice,
+        avec compensation des mouvements par actionnaire
+        """
+        error_message = self.verify_request_data(request.data, ['issuing_company'])
+        if error_message:
+            return error_message
+        try:
+            company_id = int(request.data['issuing_company'])
+        except (TypeError, ValueError):
+            return Response({"error": "issuing_company must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = min(int(request.data.get('limit', 500)), 1000)
+        except (TypeError, ValueError):
+            return Response({"error": "limit must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+        if limit < 1:
+            return Response({"error": "limit must be positive"}, status=status.HTTP_400_BAD_REQUEST)
+        company = get_object_or_404(IssuingCompany, pk=company_id)
+        settled, failed = settle_pending_transactions(company.pk, request.user, limit)
+        return Response({
+            'settled': [str(item.pk) for item in settled],
+            'failed': [{'id': pk, 'error': error} for pk, error in failed.items()],
+        }, status=status.HTTP_200_OK)
+
 
 
 
@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class SharedappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'sharedapp'
+
+    def ready(self):
+        from .responsecache import connect_response_cache_signals
+        from .search import connect_search_index_signals
+        from .storage import connect_blob_reference_signals
+        connect_blob_reference_signals()
+        connect_search_index_signals()
+        connect_response_cache_signals()
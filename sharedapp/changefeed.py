@@ -0,0 +1,123 @@
+# changefeed.py
+import base64
+from datetime import timedelta
+
+from django.db.models import Max, Min, Q
+from django.utils import timezone
+
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+
+def encode_cursor(history_id, gaps=()):
+    """
+    Curseur opaque: dernier history_id livré et identifiants manquants au-dessous (lignes
+    d'une transaction encore ouverte lors de la lecture, ou annulée)
+    """
+    value = f"v2:{history_id}:{'.'.join(str(gap) for gap in sorted(gaps))}"
+    return base64.urlsafe_b64encode(value.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    (history_id, identifiants manquants); les curseurs v1 n'en portent pas
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        version, history_id, *rest = base64.urlsafe_b64decode(padded.encode()).decode().split(':')
+        if version == 'v1' and not rest:
+            return int(history_id), set()
+        if version != 'v2' or len(rest) != 1:
+            raise ValueError(version)
+        return int(history_id), {int(gap) for gap in rest[0].split('.') if gap}
+    except (ValueError, UnicodeDecodeError):
+        raise ValidationError({"cursor": "Invalid cursor"})
+
+
+class ChangeFeedMixin:
+    """
+    Mixin ajoutant l'action `changes` à un ViewSet dont le modèle est historisé
+    (simple_history): liste des enregistrements créés, modifiés et supprimés
+    depuis un curseur opaque, pour un rafraîchissement incrémental du client.
+    Les history_id sont attribués à l'insertion, pas à la validation: une ligne d'id
+    inférieur peut apparaître après une ligne d'id supérieur. Les ids manquants sous le
+    curseur sont donc relus aux appels suivants, jusqu'à ce que les lignes qui les suivent
+    aient plus de `change_feed_settle_seconds` secondes (transaction alors tenue pour annulée).
+    """
+    change_feed_page_size = 200
+    change_feed_max_page_size = 1000
+    change_feed_settle_seconds = 300
+    change_feed_max_gaps = 200
+
+    @action(detail=False, methods=['GET'])
+    def changes(self, request):
+        """
+        Sans curseur, retourne seulement le curseur courant (à conserver après un chargement complet).
+        Avec `cursor`, retourne les changements suivants; `deleted` contient aussi les
+        enregistrements qui ne sont plus visibles pour l'utilisateur.
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        history_model = queryset.model.history.model
+
+        cursor = request.query_params.get('cursor')
+        if not cursor:
+            latest = history_model.objects.order_by('-history_id').values_list('history_id', flat=True).first()
+            return Response({'cursor': encode_cursor(latest or 0), 'created': [], 'updated': [],
+                             'deleted': [], 'has_more': False})
+
+        history_id, gaps = decode_cursor(cursor)
+        try:
+            page_size = min(int(request.query_params.get('page_size', self.change_feed_page_size)),
+                            self.change_feed_max_page_size)
+        except ValueError:
+            raise ValidationError({"page_size": "Must be an integer"})
+
+        rows = list(
+            history_model.objects.filter(Q(history_id__gt=history_id) | Q(history_id__in=gaps))
+            .order_by('history_id')
+            .values_list('history_id', 'id', 'history_type')[:page_size]
+        )
+        next_id, gaps = self.next_change_cursor(history_model, history_id, gaps, [row[0] for row in rows])
+
+        # Dernier type de changement par objet, et objets créés dans la page
+        last_change, created_ids = {}, set()
+        for _, object_id, history_type in rows:
+            last_change[object_id] = history_type
+            if history_type == '+':
+                created_ids.add(object_id)
+
+        changed_ids = [object_id for object_id, history_type in last_change.items() if history_type != '-']
+        visible = list(queryset.filter(pk__in=changed_ids))
+        visible_ids = {instance.pk for instance in visible}
+        data = self.get_serializer(visible, many=True).data
+
+        return Response({
+            'cursor': encode_cursor(next_id, gaps),
+            'created': [item for instance, item in zip(visible, data) if instance.pk in created_ids],
+            'updated': [item for instance, item in zip(visible, data) if instance.pk not in created_ids],
+            'deleted': [object_id for object_id in last_change if object_id not in visible_ids],
+            'has_more': len(rows) == page_size,
+        })
+
+    def next_change_cursor(self, history_model, history_id, gaps, read_ids):
+        """
+        (dernier history_id livré, ids manquants à relire) après une page: les ids sautés
+        entre l'ancien et le nouveau curseur s'ajoutent aux manques, ceux enfin lus en sortent.
+        Un manque suivi d'une ligne enregistrée il y a plus de change_feed_settle_seconds est
+        abandonné.
+        """
+        read = set(read_ids)
+        next_id = max([history_id, *read])
+        gaps = (gaps - read) | set(range(history_id + 1, next_id)) - read
+        if gaps:
+            # Dernière ligne ancienne: celle qui précède la plus ancienne ligne récente (deux
+            # lectures d'index, sans parcourir tout l'historique)
+            cutoff = timezone.now() - timedelta(seconds=self.change_feed_settle_seconds)
+            first_recent = history_model.objects.filter(history_date__gt=cutoff).aggregate(
+                first=Min('history_id')
+            )['first']
+            old = history_model.objects.filter(history_id__lt=first_recent) if first_recent else history_model.objects
+            settled = old.aggregate(settled=Max('history_id'))['settled'] or 0
+            gaps = sorted(gap for gap in gaps if gap > settled)[-self.change_feed_max_gaps:]
+        return next_id, set(gaps)
@@ -37,3 +37,37 @@ class AnnouncementType:
         (PURCHASE, 'Purchase'),
         (SALE, 'Sale')
     ]
+
+# Upload session status (chunked, resumable uploads)
+class UploadStatus:
+    OPEN = 'OPEN'
+    COMPLETED = 'COMPLETED'
+    FAILED = 'FAILED'
+
+    CHOICES = [
+        (OPEN, 'Open'),
+        (COMPLETED, 'Completed'),
+        (FAILED, 'Failed')
+    ]
+
+# Search index term kinds (normalized word or trigram of a word)
+class SearchTermKind:
+    WORD = 'W'
+    TRIGRAM = 'T'
+
+    CHOICES = [
+        (WORD, 'Word'),
+        (TRIGRAM, 'Trigram')
+    ]
+
+# Review status of a suspected duplicate pair of shareholders
+class DuplicateStatus:
+    PENDING = 'PENDING'
+    CONFIRMED = 'CONFIRMED'
+    DISMISSED = 'DISMISSED'
+
+    CHOICES = [
+        (PENDING, 'Pending'),
+        (CONFIRMED, 'Confirmed'),
+        (DISMISSED, 'Dismissed')
+    ]
@@ -0,0 +1,256 @@
+# duplicates.py
+"""
+Détection des actionnaires saisis deux fois avec des orthographes différentes. Les fiches
+sont lues une seule fois, en flux, et rangées par clés de blocage (identifiant normalisé,
+clé phonétique du nom, date de naissance): seules les fiches d'un même bloc sont comparées,
+au lieu des n² paires de toute la base. Les paires dont le score dépasse le seuil sont
+enregistrées (DuplicateCandidate) pour revue.
+"""
+from collections import defaultdict, namedtuple
+from difflib import SequenceMatcher
+from itertools import combinations
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.utils import timezone
+
+from .constants import DuplicateStatus
+from .models import DuplicateCandidate
+from .search import normalize
+
+# {modèle: {critère: champs ou chemins de relation}}
+DUPLICATE_RULES = {
+    'shareholders.PhysicalShareholder': {
+        'identifier': ['national_id'],
+        'name': ['contact_person__last_name', 'contact_person__first_name'],
+        'birth_date': ['date_of_birth'],
+        'contact': ['contact_person__email', 'contact_person__phone'],
+    },
+    'shareholders.LegalShareholder': {
+        'identifier': ['registration_number', 'tax_id'],
+        'name': ['company_name'],
+        'contact': ['representative_email', 'representative_phone'],
+    },
+}
+# Poids de chaque critère, rapportés à la somme des poids des critères du modèle
+CRITERIA_WEIGHTS = {'identifier': 0.4, 'name': 0.35, 'birth_date': 0.15, 'contact': 0.1}
+# Score minimal d'une paire dont un identifiant est identique une fois normalisé
+SAME_IDENTIFIER_SCORE = 0.95
+# Formes juridiques et mots vides ignorés dans les noms
+NAME_STOPWORDS = {
+    'sa', 'sas', 'sasu', 'sarl', 'suarl', 'gie', 'snc', 'ste', 'societe', 'ets', 'etablissements',
+    'de', 'du', 'des', 'la', 'le', 'les', 'et',
+}
+# Les numéros de téléphone sont comparés sans indicatif
+PHONE_DIGITS = 9
+
+SOUNDEX_CODES = {
+    **dict.fromkeys('bfpv', '1'), **dict.fromkeys('cgjkqsxz', '2'), **dict.fromkeys('dt', '3'),
+    'l': '4', **dict.fromkeys('mn', '5'), 'r': '6',
+}
+PHONETIC_REWRITES = (('ph', 'f'), ('qu', 'k'), ('ck', 'k'))
+
+Record = namedtuple('Record', ['pk', 'identifiers', 'name', 'birth_date', 'contacts', 'keys'])
+
+
+def phonetic_key(word):
+    """
+    Clé phonétique d'un mot (Soundex adapté): l'initiale est codée comme les autres lettres,
+    de sorte que Coulibaly et Koulibaly ou Fall et Phall partagent la clé; voyelles, h, w
+    et y ne comptent qu'à l'initiale (« V »)
+    """
+    word = ''.join(char for char in normalize(word) if char.isalpha())
+    for source, target in PHONETIC_REWRITES:
+        word = word.replace(source, target)
+    if not word:
+        return ''
+    key = previous = SOUNDEX_CODES.get(word[0], 'V')
+    for char in word[1:]:
+        code = SOUNDEX_CODES.get(char, '')
+        if code and code != previous:
+            key += code
+        if char not in 'hwy':
+            previous = code
+    return (key + '000')[:4]
+
+
+def name_words(values):
+    return sorted({
+        word for value in values if value
+        for word in normalize(value).split() if len(word) > 1 and word not in NAME_STOPWORDS
+    })
+
+
+def compact(value):
+    """
+    Identifiant ou contact sans casse, accents ni séparateurs (« SN-DKR 2024 » -> « sndkr2024 »)
+    """
+    value = ''.join(normalize(value).split()) if value else ''
+    return value[-PHONE_DIGITS:] if value.isdigit() else value
+
+
+def make_record(pk, rules, values):
+    """
+    Fiche normalisée et ses clés de blocage, à partir des valeurs {champ: valeur}
+    """
+    identifiers = tuple(sorted({compact(values[field]) for field in rules.get('identifier', [])} - {''}))
+    words = name_words(values[field] for field in rules.get('name', []))
+    birth_date = next((values[field] for field in rules.get('birth_date', []) if values[field]), None)
+    contacts = frozenset({compact(values[field]) for field in rules.get('contact', [])} - {''})
+
+    keys = [f'id:{identifier}' for identifier in identifiers]
+    phonetics = sorted({phonetic_key(word) for word in words} - {''})
+    if phonetics:
+        keys.append(f"name:{' '.join(phonetics)}")
+    if birth_date:
+        # Date de naissance et un mot du nom: une faute dans l'autre mot reste détectée
+        keys.extend(f'birth:{birth_date}:{phonetic}' for phonetic in phonetics or [''])
+    return Record(str(pk), identifiers, ' '.join(words), birth_date, contacts, tuple(keys))
+
+
+def iter_records(model, batch_size):
+    rules = DUPLICATE_RULES[model._meta.label]
+    fields = [field for criterion in rules.values() for field in criterion]
+    rows = model._base_manager.order_by('pk').values('pk', *fields)
+    for values in rows.iterator(chunk_size=batch_size):
+        yield make_record(values['pk'], rules, values)
+
+
+def _ratio(a, b):
+    if not a or not b:
+        return 0.0
+    return 1.0 if a == b else SequenceMatcher(None, a, b).ratio()
+
+
+def _ratio_bound(a, b):
+    """
+    Majorant de _ratio(a, b) tiré des seules longueurs: 2 * min / total, et moins de 1
+    pour deux chaînes différentes
+    """
+    if not a or not b:
+        return 0.0
+    if a == b:
+        return 1.0
+    total = len(a) + len(b)
+    return min(2 * min(len(a), len(b)), total - 1) / total
+
+
+def similarity(a, b, criteria, threshold=0.0):
+    """
+    (score entre 0 et 1, {critère: similarité}) d'une paire de fiches, ou None dès qu'un
+    majorant du score reste sous `threshold`: les chaînes ne sont comparées (nom d'abord,
+    le plus discriminant) que tant que la paire peut encore atteindre le seuil
+    """
+    scores = {}
+    if 'birth_date' in criteria:
+        scores['birth_date'] = float(bool(a.birth_date) and a.birth_date == b.birth_date)
+    if 'contact' in criteria:
+        scores['contact'] = float(not a.contacts.isdisjoint(b.contacts))
+    fuzzy = {}
+    if 'name' in criteria:
+        fuzzy['name'] = [(a.name, b.name)]
+    if 'identifier' in criteria:
+        fuzzy['identifier'] = [(x, y) for x in a.identifiers for y in b.identifiers]
+    total = sum(CRITERIA_WEIGHTS[criterion] for criterion in criteria)
+    minimum = -1.0 if not set(a.identifiers).isdisjoint(b.identifiers) else threshold * total
+
+    bounds = {
+        criterion: max((_ratio_bound(x, y) for x, y in pairs), default=0.0) for criterion, pairs in fuzzy.items()
+    }
+    bound = sum(CRITERIA_WEIGHTS[criterion] * value for criterion, value in {**scores, **bounds}.items())
+    if bound < minimum:
+        return None
+    for criterion, pairs in fuzzy.items():
+        scores[criterion] = max((_ratio(x, y) for x, y in pairs), default=0.0)
+        bound -= CRITERIA_WEIGHTS[criterion] * (bounds[criterion] - scores[criterion])
+        if bound < minimum:
+            return None
+    score = bound / total
+    if minimum < 0:
+        score = max(score, SAME_IDENTIFIER_SCORE)
+    return round(score, 3), {criterion: round(value, 3) for criterion, value in scores.items()}
+
+
+def candidate_pairs(records, max_block_size, window):
+    """
+    Paires (i, j) d'indices de fiches à comparer, chacune une seule fois: dans le plus petit
+    (ordre des clés) des blocs partagés de taille raisonnable, sinon dans une fenêtre glissante
+    de `window` fiches des blocs trop grands (noms très courants, dates de naissance par défaut)
+    triés par nom
+    """
+    blocks = defaultdict(list)
+    for index, record in enumerate(records):
+        for key in record.keys:
+            blocks[key].append(index)
+    oversized = {key for key, members in blocks.items() if len(members) > max_block_size}
+
+    seen = set()
+    for key, members in blocks.items():
+        if len(members) < 2:
+            continue
+        if key not in oversized:
+            for i, j in combinations(members, 2):
+                shared = set(records[i].keys).intersection(records[j].keys) - oversized
+                if min(shared) == key:
+                    yield i, j
+            continue
+        members = sorted(members, key=lambda index: (records[index].name, records[index].identifiers))
+        for position, i in enumerate(members):
+            for j in members[position + 1:position + 1 + window]:
+                pair = (min(i, j), max(i, j))
+                if pair in seen or not oversized.issuperset(set(records[i].keys).intersection(records[j].keys)):
+                    continue
+                seen.add(pair)
+                yield pair
+
+
+def detect_duplicates(model, threshold=None):
+    """
+    Compare les fiches du modèle bloc par bloc et enregistre les paires dont le score atteint
+    le seuil: nouvelles paires en attente de revue, score mis à jour pour les paires connues
+    (leur décision est conservée); les paires en attente qui ne sont plus détectées (fiche
+    corrigée ou supprimée) sont retirées. Retourne (fiches, paires comparées, paires retenues).
+    """
+    config = settings.DUPLICATE_DETECTION
+    threshold = config['THRESHOLD'] if threshold is None else threshold
+    criteria = list(DUPLICATE_RULES[model._meta.label])
+    content_type = ContentType.objects.get_for_model(model)
+    started = timezone.now()
+    records = list(iter_records(model, config['BATCH_SIZE']))
+
+    compared, found = 0, []
+    for i, j in candidate_pairs(records, config['MAX_BLOCK_SIZE'], config['WINDOW']):
+        compared += 1
+        a, b = sorted((records[i], records[j]))
+        result = similarity(a, b, criteria, threshold)
+        if result is None or result[0] < threshold:
+            continue
+        score, scores = result
+        found.append(DuplicateCandidate(
+            content_type=content_type, first_id=a.pk, second_id=b.pk, score=score, detected_at=started,
+            reasons={'criteria': scores, 'keys': sorted(set(a.keys).intersection(b.keys))},
+        ))
+
+    DuplicateCandidate.objects.bulk_create(
+        found, batch_size=config['BATCH_SIZE'], update_conflicts=True,
+        unique_fields=['first_id', 'second_id', 'content_type'], update_fields=['score', 'reasons', 'detected_at'],
+    )
+    DuplicateCandidate.objects.filter(
+        content_type=content_type, status=DuplicateStatus.PENDING, detected_at__lt=started
+    ).delete()
+    return len(records), compared, len(found)
+
+
+def pair_objects(candidates):
+    """
+    {(content_type_id, object_id): fiche} des deux fiches de chaque paire, une requête par type
+    """
+    ids = defaultdict(set)
+    for candidate in candidates:
+        ids[candidate.content_type_id].update((candidate.first_id, candidate.second_id))
+    objects = {}
+    for content_type_id, object_ids in ids.items():
+        model = ContentType.objects.get_for_id(content_type_id).model_class()
+        for instance in model._base_manager.filter(pk__in=object_ids):
+            objects[(content_type_id, str(instance.pk))] = instance
+    return objects
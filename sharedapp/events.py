@@ -0,0 +1,225 @@
+# events.py
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max, Min, Q
+from django.utils import timezone
+
+from .models import StreamEvent
+
+logger = logging.getLogger(__name__)
+
+
+def stream_settings():
+    return {
+        'HEARTBEAT_SECONDS': 15,
+        'POLL_SECONDS': 2,
+        'RETRY_MILLISECONDS': 3000,
+        'BATCH_SIZE': 100,
+        'RETENTION_HOURS': 24,
+        'SETTLE_SECONDS': 30,
+        'MAX_GAPS': 1000,
+        **getattr(settings, 'EVENT_STREAM', {}),
+    }
+
+
+class EventBroker:
+    """
+    Pub/sub en mémoire du processus: réveille les connexions SSE d'un utilisateur.
+    Les événements eux-mêmes sont lus en base à partir du curseur de chaque connexion,
+    le broker ne transporte que le signal de réveil.
+    Les ids sont attribués à l'insertion, pas à la validation: le broker suit aussi les ids
+    sautés (transaction encore ouverte, ou annulée) pour que les connexions ne lisent que
+    sous le premier d'entre eux (stable_id); un id sauté depuis plus de SETTLE_SECONDS est
+    tenu pour annulé.
+    """
+
+    def __init__(self):
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+        self._pollers = {}
+        self._advance_lock = threading.Lock()
+        self._last_seen_id = None
+        self._gaps = {}  # {id sauté: instant où il l'a été}
+        self._held = {}  # {id: destinataire} des événements lus au-dessus du premier id sauté
+
+    def subscribe(self, user_id):
+        loop = asyncio.get_running_loop()
+        waker = (loop, asyncio.Event())
+        with self._lock:
+            self._subscribers[user_id].add(waker)
+            if loop not in self._pollers:
+                self._pollers[loop] = loop.create_task(self._poll(loop))
+        return waker[1]
+
+    def unsubscribe(self, user_id, event):
+        with self._lock:
+            wakers = self._subscribers.get(user_id, set())
+            wakers.difference_update({waker for waker in wakers if waker[1] is event})
+            if not wakers:
+                self._subscribers.pop(user_id, None)
+
+    def publish(self, user_ids):
+        """
+        Réveille les connexions des utilisateurs donnés; appelable depuis n'importe quel thread
+        """
+        with self._lock:
+            wakers = [waker for user_id in user_ids for waker in self._subscribers.get(user_id, ())]
+        for loop, event in wakers:
+            loop.call_soon_threadsafe(event.set)
+
+    async def _poll(self, loop):
+        """
+        Une seule requête par processus et par intervalle pour détecter les événements
+        publiés par les autres processus, quel que soit le nombre de connexions
+        """
+        interval = stream_settings()['POLL_SECONDS']
+        while True:
+            await asyncio.sleep(interval)
+            with self._lock:
+                if not any(waker[0] is loop for wakers in self._subscribers.values() for waker in wakers):
+                    self._pollers.pop(loop, None)
+                    return
+            try:
+                user_ids = await sync_to_async(self._recipients_since_last_poll)()
+            except Exception as e:
+                logger.error(f"Event stream poll failed: {str(e)}")
+                continue
+            if user_ids:
+                self.publish(user_ids)
+
+    def _recipients_since_last_poll(self):
+        with self._advance_lock:
+            return self._advance()
+
+    def stable_id(self):
+        """
+        Plus grand id sous lequel tous les événements sont validés ou tenus pour annulés:
+        un curseur qui ne le dépasse pas ne saute aucun événement validé en retard
+        """
+        with self._advance_lock:
+            user_ids = self._advance()
+            stable = self._stable()
+        # Evénements libérés par ce passage: leurs destinataires relisent à partir de leur curseur
+        self.publish(user_ids)
+        return stable
+
+    def _stable(self):
+        return min(self._gaps) - 1 if self._gaps else self._last_seen_id
+
+    def _advance(self):
+        """
+        Lit les événements apparus depuis le dernier passage (nouveaux ids et ids sautés
+        enfin validés), met à jour les ids sautés et retourne les destinataires des événements
+        devenus lisibles (sous le premier id sauté)
+        """
+        options = stream_settings()
+        if self._last_seen_id is None:
+            # Départ sous les événements récents: leurs ids sautés sont suivis dès le premier passage
+            cutoff = timezone.now() - timedelta(seconds=options['SETTLE_SECONDS'])
+            first_recent = StreamEvent.objects.filter(created_at__gt=cutoff).aggregate(first=Min('id'))['first']
+            old = StreamEvent.objects.filter(id__lt=first_recent) if first_recent else StreamEvent.objects
+            self._last_seen_id = old.aggregate(last=Max('id'))['last'] or 0
+        rows = list(
+            StreamEvent.objects.filter(Q(id__gt=self._last_seen_id) | Q(id__in=list(self._gaps)))
+            .order_by().values_list('id', 'recipient_id')
+        )
+        read = {row[0] for row in rows}
+        now = time.monotonic()
+        next_id = max([self._last_seen_id, *read])
+        for gap in set(range(self._last_seen_id + 1, next_id)) - read:
+            self._gaps[gap] = now
+        self._gaps = {
+            gap: skipped_at for gap, skipped_at in self._gaps.items()
+            if gap not in read and now - skipped_at < options['SETTLE_SECONDS']
+        }
+        if len(self._gaps) > options['MAX_GAPS']:
+            self._gaps = {gap: self._gaps[gap] for gap in sorted(self._gaps)[-options['MAX_GAPS']:]}
+        self._last_seen_id = next_id
+        self._held.update(rows)
+        stable = self._stable()
+        released = {recipient_id for event_id, recipient_id in self._held.items() if event_id <= stable}
+        self._held = {event_id: recipient_id for event_id, recipient_id in self._held.items() if event_id > stable}
+        return released
+
+
+broker = EventBroker()
+
+
+def publish_events(event, payloads):
+    """
+    Enregistre un événement par utilisateur ({user_id: payload}) en un seul INSERT
+    puis réveille les connexions locales après validation de la transaction
+    """
+    if not payloads:
+        return
+    StreamEvent.objects.bulk_create(
+        [StreamEvent(recipient_id=user_id, event=event, payload=payload) for user_id, payload in payloads.items()],
+        batch_size=500
+    )
+    user_ids = set(payloads)
+    transaction.on_commit(lambda: broker.publish(user_ids))
+
+
+def fetch_events(user_id, cursor, limit=None):
+    """
+    Evénements d'un utilisateur postérieurs au curseur, dans l'ordre de publication, jusqu'au
+    premier id encore susceptible d'être validé en retard (voir EventBroker.stable_id)
+    """
+    limit = limit or stream_settings()['BATCH_SIZE']
+    return list(
+        StreamEvent.objects.filter(recipient_id=user_id, id__gt=cursor, id__lte=broker.stable_id())
+        .order_by('id')[:limit]
+    )
+
+
+def purge_stream_events():
+    """
+    Supprime les événements plus anciens que la rétention, par plage de clé primaire
+    """
+    cutoff = timezone.now() - timedelta(hours=stream_settings()['RETENTION_HOURS'])
+    last_id = StreamEvent.objects.filter(created_at__lt=cutoff).aggregate(last=Max('id'))['last']
+    if last_id is None:
+        return 0
+    deleted, _ = StreamEvent.objects.filter(id__lte=last_id).delete()
+    return deleted
+
+
+def format_event(stream_event):
+    data = json.dumps(stream_event.payload, default=str)
+    return f"id: {stream_event.id}\nevent: {stream_event.event}\ndata: {data}\n\n"
+
+
+async def event_stream(user_id, cursor):
+    """
+    Flux SSE: rejoue les événements manqués depuis le curseur, puis ne relit la base
+    qu'après un réveil du broker; une connexion inactive ne reçoit que le heartbeat,
+    sans requête
+    """
+    options = stream_settings()
+    wakeup = broker.subscribe(user_id)
+    try:
+        yield f"retry: {options['RETRY_MILLISECONDS']}\n\n"
+        while True:
+            wakeup.clear()
+            events = await sync_to_async(fetch_events)(user_id, cursor)
+            for stream_event in events:
+                cursor = stream_event.id
+                yield format_event(stream_event)
+            if len(events) == options['BATCH_SIZE']:
+                continue
+            while not wakeup.is_set():
+                try:
+                    await asyncio.wait_for(wakeup.wait(), timeout=options['HEARTBEAT_SECONDS'])
+                except asyncio.TimeoutError:
+                    yield ": heartbeat\n\n"
+    finally:
+        broker.unsubscribe(user_id, wakeup)
@@ -0,0 +1,23 @@
+# historical.py
+from django.db import models
+from simple_history.models import HistoricalRecords
+
+
+class IndexedHistoricalRecords(HistoricalRecords):
+    """
+    HistoricalRecords with additional composite indexes on the historical table,
+    e.g. IndexedHistoricalRecords(indexes=[('issuing_company', 'history_date')])
+    """
+
+    def __init__(self, *args, indexes=(), **kwargs):
+        self.extra_indexes = [tuple(fields) for fields in indexes]
+        super().__init__(*args, **kwargs)
+
+    def get_meta_options(self, model):
+        meta_fields = super().get_meta_options(model)
+        # New Index instances for each model, as inherit=True reuses this descriptor
+        meta_fields["indexes"] = [
+            *meta_fields.get("indexes", ()),
+            *(models.Index(fields=list(fields)) for fields in self.extra_indexes),
+        ]
+        return meta_fields
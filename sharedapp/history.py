@@ -0,0 +1,250 @@
+# history.py
+import base64
+import heapq
+import json
+from datetime import datetime
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+
+HISTORY_TYPES = {'+': 'created', '~': 'updated', '-': 'deleted'}
+
+
+def parse_positive_int(params, name, default=None, maximum=None):
+    value = params.get(name)
+    if value in (None, ''):
+        return default
+    try:
+        value = int(value)
+    except ValueError:
+        raise ValidationError({name: "Must be an integer"})
+    if value < 1:
+        raise ValidationError({name: "Must be positive"})
+    return min(value, maximum) if maximum else value
+
+
+def parse_datetime_param(params, name):
+    value = params.get(name)
+    if not value:
+        return None
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise ValidationError({name: "Invalid datetime"})
+    return timezone.make_aware(parsed) if timezone.is_naive(parsed) else parsed
+
+
+def resolve_history_users(versions):
+    """
+    {user_id: {'id', 'username'}} pour les auteurs des versions, en une seule requête
+    """
+    user_ids = {version['history_user_id'] for version in versions if version['history_user_id']}
+    users = get_user_model().objects.only('id', 'username').in_bulk(user_ids)
+    return {pk: {'id': user.pk, 'username': user.username} for pk, user in users.items()}
+
+
+def diff_versions(fields, version, previous):
+    """
+    Champs modifiés entre deux versions consécutives (dictionnaires de valeurs);
+    sans version précédente, seuls les champs renseignés sont retournés
+    """
+    if previous is None:
+        return [
+            {'field': field, 'old': None, 'new': version[field]}
+            for field in fields if version[field] not in (None, '')
+        ]
+    return [
+        {'field': field, 'old': previous[field], 'new': version[field]}
+        for field in fields if version[field] != previous[field]
+    ]
+
+
+class HistoryViewSetMixin:
+    """
+    Mixin ajoutant l'action `history` à un ViewSet dont le modèle est historisé
+    (simple_history): versions de l'objet de la plus récente à la plus ancienne,
+    avec les champs modifiés par chaque version, paginées par `before` (history_id).
+    """
+    history_page_size = 20
+    history_max_page_size = 100
+    history_excluded_fields = ('updated_at',)
+
+    def get_history_fields(self, history_model):
+        return [
+            field.attname for field in history_model.tracked_fields
+            if field.attname not in self.history_excluded_fields
+        ]
+
+    @action(detail=True, methods=['GET'])
+    def history(self, request, pk=None):
+        """
+        Récupère l'historique des modifications, page par page
+        """
+        instance = self.get_object()
+        history_model = instance.history.model
+        page_size = parse_positive_int(
+            request.query_params, 'page_size', self.history_page_size, self.history_max_page_size
+        )
+        before = parse_positive_int(request.query_params, 'before')
+
+        fields = self.get_history_fields(history_model)
+        versions = history_model.objects.filter(id=instance.pk)
+        if before:
+            versions = versions.filter(history_id__lt=before)
+        # Une version de plus que la page: elle sert de référence au diff de la dernière
+        versions = list(
+            versions.order_by('-history_id').values(
+                'history_id', 'history_type', 'history_date', 'history_user_id',
+                'history_change_reason', *fields
+            )[:page_size + 1]
+        )
+
+        page = versions[:page_size]
+        users = resolve_history_users(page)
+
+        results = []
+        for index, version in enumerate(page):
+            previous = versions[index + 1] if index + 1 < len(versions) else None
+            results.append({
+                'history_id': version['history_id'],
+                'type': HISTORY_TYPES.get(version['history_type'], version['history_type']),
+                'date': version['history_date'],
+                'user': users.get(version['history_user_id']),
+                'reason': version['history_change_reason'],
+                'changes': diff_versions(fields, version, previous),
+            })
+
+        return Response({
+            'results': results,
+            'next': page[-1]['history_id'] if len(versions) > page_size else None,
+        })
+
+
+TIMELINE_FIELDS = ('history_id', 'history_date', 'history_type', 'history_user_id', 'history_change_reason', 'id')
+
+
+def encode_timeline_cursor(history_date, source, history_id):
+    raw = json.dumps([history_date.isoformat(), source, history_id])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_timeline_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        history_date, source, history_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(history_date), str(source), int(history_id)
+    except (ValueError, TypeError, UnicodeDecodeError):
+        raise ValidationError({"cursor": "Invalid cursor"})
+
+
+def _after_cursor(source, cursor):
+    """
+    Condition des lignes d'une source qui suivent le curseur dans l'ordre
+    décroissant (history_date, source, history_id)
+    """
+    history_date, cursor_source, history_id = cursor
+    if source < cursor_source:
+        return Q(history_date__lte=history_date)
+    if source == cursor_source:
+        return Q(history_date__lt=history_date) | Q(history_date=history_date, history_id__lt=history_id)
+    return Q(history_date__lt=history_date)
+
+
+def _tagged(source, rows):
+    for row in rows:
+        yield source, row
+
+
+def merge_timeline(sources, page_size, cursor=None, since=None, until=None):
+    """
+    Fusion ordonnée (k-way) des versions de plusieurs tables historiques, de la plus
+    récente à la plus ancienne. `sources` est une liste de (libellé, queryset historique);
+    chaque source est lue paresseusement et au plus sur page_size + 1 lignes.
+    Retourne (lignes de la page, curseur suivant ou None).
+    """
+    streams = []
+    for source, queryset in sources:
+        if since:
+            queryset = queryset.filter(history_date__gte=since)
+        if until:
+            queryset = queryset.filter(history_date__lt=until)
+        if cursor:
+            queryset = queryset.filter(_after_cursor(source, cursor))
+        rows = queryset.order_by('-history_date', '-history_id').values(*TIMELINE_FIELDS)[:page_size + 1]
+        streams.append(_tagged(source, rows.iterator(chunk_size=page_size + 1)))
+
+    merged = heapq.merge(
+        *streams,
+        key=lambda entry: (entry[1]['history_date'], entry[0], entry[1]['history_id']),
+        reverse=True
+    )
+    page = list(islice(merged, page_size + 1))
+    next_cursor = None
+    if len(page) > page_size:
+        page = page[:page_size]
+        source, row = page[-1]
+        next_cursor = encode_timeline_cursor(row['history_date'], source, row['history_id'])
+    return page, next_cursor
+
+
+class TimelineViewSetMixin:
+    """
+    Mixin ajoutant l'action `timeline`: journal d'audit fusionné de plusieurs tables
+    historiques liées à l'objet, défini par get_timeline_sources().
+    """
+    timeline_page_size = 50
+    timeline_max_page_size = 200
+
+    def get_timeline_sources(self, instance):
+        """
+        Sources du journal: [(libellé, queryset historique)]. Par défaut, l'historique
+        de l'objet seul; à surcharger pour y fusionner les tables des objets liés
+        """
+        model = type(instance)
+        history = getattr(model, 'history', None)
+        if history is None:
+            raise ImproperlyConfigured(
+                f"{type(self).__name__}: {model._meta.label} is not historised, override get_timeline_sources()"
+            )
+        return [(model._meta.label_lower, history.filter(id=instance.pk))]
+
+    @action(detail=True, methods=['GET'])
+    def timeline(self, request, pk=None):
+        """
+        Récupère le journal d'audit fusionné, filtré par `since`/`until` et paginé par `cursor`
+        """
+        instance = self.get_object()
+        params = request.query_params
+        page_size = parse_positive_int(params, 'page_size', self.timeline_page_size, self.timeline_max_page_size)
+        cursor = decode_timeline_cursor(params['cursor']) if params.get('cursor') else None
+
+        page, next_cursor = merge_timeline(
+            self.get_timeline_sources(instance),
+            page_size,
+            cursor=cursor,
+            since=parse_datetime_param(params, 'since'),
+            until=parse_datetime_param(params, 'until'),
+        )
+        users = resolve_history_users([row for _, row in page])
+        return Response({
+            'results': [
+                {
+                    'date': row['history_date'],
+                    'model': source,
+                    'object_id': row['id'],
+                    'history_id': row['history_id'],
+                    'type': HISTORY_TYPES.get(row['history_type'], row['history_type']),
+                    'user': users.get(row['history_user_id']),
+                    'reason': row['history_change_reason'],
+                }
+                for source, row in page
+            ],
+            'next': next_cursor,
+        })
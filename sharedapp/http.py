@@ -0,0 +1,444 @@
+# http.py
+import bisect
+import hashlib
+import mimetypes
+import os
+import re
+import struct
+import time
+import zlib
+from datetime import datetime, timezone as dt_timezone
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.core.files.storage import default_storage
+from django.core.signing import BadSignature, Signer
+from django.db.models import Count, FileField, Max
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import content_disposition_header, http_date, parse_http_date_safe
+from rest_framework.decorators import action
+from rest_framework.response import Response
+
+from .storage import CHUNK_SIZE, is_blob
+
+ZIP64_LIMIT = 0xFFFFFFFF
+ZIP_FLAGS = 0x0800  # noms encodés en UTF-8
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+MEDIA_SIGNING_SALT = 'sharedapp.media'
+
+
+def _dos_datetime(value):
+    value = timezone.localtime(value) if timezone.is_aware(value) else value
+    value = max(value, datetime(1980, 1, 1, tzinfo=value.tzinfo))
+    return (
+        value.hour << 11 | value.minute << 5 | value.second // 2,
+        (value.year - 1980) << 9 | value.month << 5 | value.day,
+    )
+
+
+class ZipEntry:
+    """
+    Fichier de l'archive: nom dans l'archive, nom dans le stockage, taille, CRC-32 et date
+    """
+
+    def __init__(self, arcname, name, size, crc32, modified):
+        self.arcname = arcname
+        self.name = name
+        self.size = size
+        self.crc32 = crc32
+        self.modified = modified
+
+
+def file_crc32(name, storage=default_storage):
+    """
+    CRC-32 d'un fichier du stockage: celui enregistré pour les blobs, sinon calculé
+    (puis enregistré pour les blobs antérieurs à son ajout)
+    """
+    from .models import StoredBlob
+
+    if is_blob(name):
+        crc32 = StoredBlob.objects.filter(name=name).values_list('crc32', flat=True).first()
+        if crc32 is not None:
+            return crc32
+    crc32 = 0
+    with storage.open(name) as content:
+        for chunk in content.chunks(CHUNK_SIZE):
+            crc32 = zlib.crc32(chunk, crc32)
+    if is_blob(name):
+        StoredBlob.objects.filter(name=name).update(crc32=crc32)
+    return crc32
+
+
+class ZipStream:
+    """
+    Archive ZIP construite à la volée, entrées stockées sans compression: la taille et la
+    position de chaque octet sont connues d'avance, ce qui permet de servir n'importe quelle
+    plage (Range) en mémoire constante. ZIP64 est utilisé au-delà de 4 Go ou 65535 entrées.
+    """
+
+    def __init__(self, entries, storage=default_storage):
+        self.storage = storage
+        self.segments = []  # (début, longueur, octets ou nom de fichier)
+        self.size = 0
+        central = []
+        for entry in entries:
+            arcname = entry.arcname.encode('utf-8')
+            dos_time, dos_date = _dos_datetime(entry.modified)
+            offset = self.size
+            large = entry.size >= ZIP64_LIMIT
+            extra = struct.pack('<HHQQ', 0x0001, 16, entry.size, entry.size) if large else b''
+            size32 = ZIP64_LIMIT if large else entry.size
+            version = 45 if large else 20
+            self._append(struct.pack(
+                '<IHHHHHIIIHH', 0x04034b50, version, ZIP_FLAGS, 0, dos_time, dos_date,
+                entry.crc32, size32, size32, len(arcname), len(extra)
+            ) + arcname + extra)
+            self._append(entry.name, entry.size)
+
+            central_extra = b''
+            if large or offset >= ZIP64_LIMIT:
+                values = (entry.size, entry.size) if large else ()
+                values += (offset,) if offset >= ZIP64_LIMIT else ()
+                central_extra = struct.pack(f'<HH{len(values)}Q', 0x0001, 8 * len(values), *values)
+                version = 45
+            central.append(struct.pack(
+                '<IHHHHHHIIIHHHHHII', 0x02014b50, version, version, ZIP_FLAGS, 0, dos_time, dos_date,
+                entry.crc32, size32, size32, len(arcname), len(central_extra), 0, 0, 0, 0,
+                min(offset, ZIP64_LIMIT)
+            ) + arcname + central_extra)
+
+        directory = b''.join(central)
+        directory_offset, count = self.size, len(central)
+        end = b''
+        if count >= 0xFFFF or directory_offset >= ZIP64_LIMIT or len(directory) >= ZIP64_LIMIT:
+            zip64_offset = directory_offset + len(directory)
+            end += struct.pack(
+                '<IQHHIIQQQQ', 0x06064b50, 44, 45, 45, 0, 0, count, count, len(directory), directory_offset
+            )
+            end += struct.pack('<IIQI', 0x07064b50, 0, zip64_offset, 1)
+        end += struct.pack(
+            '<IHHHHIIH', 0x06054b50, 0, 0, min(count, 0xFFFF), min(count, 0xFFFF),
+            min(len(directory), ZIP64_LIMIT), min(directory_offset, ZIP64_LIMIT), 0
+        )
+        self._append(directory + end)
+        self.starts = [start for start, _, _ in self.segments]
+        # Le répertoire central décrit tout le contenu (noms, tailles, CRC, dates)
+        self.etag = f'"{hashlib.sha1(directory).hexdigest()}"'
+
+    def _append(self, data, length=None):
+        length = len(data) if length is None else length
+        if length:
+            self.segments.append((self.size, length, data))
+            self.size += length
+
+    def iter_range(self, start=0, end=None):
+        """
+        Octets [start, end] de l'archive, par blocs de taille fixe
+        """
+        end = self.size - 1 if end is None else end
+        index = max(bisect.bisect_right(self.starts, start) - 1, 0)
+        position = start
+        for segment_start, length, data in self.segments[index:]:
+            if position > end:
+                break
+            offset = position - segment_start
+            stop = min(length, end - segment_start + 1)
+            if isinstance(data, bytes):
+                yield data[offset:stop]
+            else:
+                with self.storage.open(data) as content:
+                    content.seek(offset)
+                    remaining = stop - offset
+                    while remaining > 0:
+                        chunk = content.read(min(CHUNK_SIZE, remaining))
+                        if not chunk:
+                            raise IOError(f"{data} is shorter than expected")
+                        remaining -= len(chunk)
+                        yield chunk
+            position = segment_start + stop
+
+
+def parse_range(header, size):
+    """
+    Plage (début, fin incluse) demandée par l'en-tête Range; None pour tout le fichier
+    (en-tête absent, invalide ou multi-plages), False si la plage n'est pas satisfiable
+    """
+    match = RANGE_RE.match(header or '')
+    if not match or not any(match.groups()):
+        return None
+    first, last = match.groups()
+    if not first:
+        length = int(last)
+        return (max(size - length, 0), size - 1) if length else False
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def iter_file(name, start, end, storage=default_storage):
+    """
+    Octets [start, end] d'un fichier du stockage, par blocs de taille fixe
+    """
+    with storage.open(name) as content:
+        content.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = content.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def _opaque_tag(etag):
+    # Comparaison faible (If-None-Match): W/"x" et "x" désignent la même version
+    return etag.strip().removeprefix('W/')
+
+
+def _not_modified(request, etag, last_modified=None):
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match:
+        return if_none_match.strip() == '*' or _opaque_tag(etag) in [_opaque_tag(tag) for tag in if_none_match.split(',')]
+    if last_modified is not None:
+        since = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+        return since is not None and int(last_modified.timestamp()) <= since
+    return False
+
+
+def ranged_response(request, size, iter_bytes, content_type, headers, last_modified=None):
+    """
+    Réponse en flux avec ETag/If-None-Match, Last-Modified/If-Modified-Since et
+    Range/If-Range (une seule plage; sinon le contenu complet).
+    `iter_bytes(start, end)` produit les octets de la plage.
+    """
+    headers = {'Accept-Ranges': 'bytes', **headers}
+    if last_modified is not None:
+        headers['Last-Modified'] = http_date(last_modified.timestamp())
+    if _not_modified(request, headers['ETag'], last_modified):
+        return HttpResponse(status=304, headers=headers)
+
+    byte_range = parse_range(request.headers.get('Range'), size)
+    if_range = request.headers.get('If-Range')
+    if if_range and if_range != headers['ETag']:
+        byte_range = None
+    if byte_range is False:
+        return HttpResponse(status=416, headers={**headers, 'Content-Range': f'bytes */{size}'})
+
+    start, end = byte_range or (0, size - 1)
+    response = StreamingHttpResponse(
+        iter_bytes(start, end) if size else iter(()), status=206 if byte_range else 200,
+        content_type=content_type, headers=headers
+    )
+    response['Content-Length'] = end - start + 1
+    if byte_range:
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    return response
+
+
+def zip_response(request, archive, filename):
+    """
+    Réponse en flux de l'archive, avec prise en charge de Range/If-Range pour la reprise
+    """
+    return ranged_response(request, archive.size, archive.iter_range, 'application/zip', {
+        'ETag': archive.etag,
+        'Content-Disposition': content_disposition_header(True, filename),
+    })
+
+
+def file_response(request, name, filename, storage=default_storage):
+    """
+    Sert un fichier du stockage: transfert délégué au serveur web frontal
+    (X-Accel-Redirect pour nginx, X-Sendfile pour Apache) ou, à défaut, en Python
+    avec ETag, Last-Modified et Range. Les blobs, immuables, ont pour ETag leur SHA-256.
+    """
+    backend = settings.MEDIA_SERVING['BACKEND']
+    content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    headers = {'Content-Disposition': content_disposition_header(False, filename)}
+    if backend == 'x-accel':
+        headers['X-Accel-Redirect'] = settings.MEDIA_SERVING['INTERNAL_PREFIX'] + quote(name)
+        return HttpResponse(content_type=content_type, headers=headers)
+    if backend == 'x-sendfile':
+        headers['X-Sendfile'] = storage.path(name)
+        return HttpResponse(content_type=content_type, headers=headers)
+
+    size, last_modified = storage.size(name), storage.get_modified_time(name)
+    if is_blob(name):
+        headers['ETag'] = f'"{os.path.basename(name).split(".")[0]}"'
+    else:
+        headers['ETag'] = f'"{int(last_modified.timestamp()):x}-{size:x}"'
+    return ranged_response(
+        request, size, lambda start, end: iter_file(name, start, end, storage),
+        content_type, headers, last_modified
+    )
+
+
+def sign_media_url(request, name, filename):
+    """
+    URL signée de téléchargement d'un fichier, valable sans authentification ni accès à la base.
+    L'expiration est arrondie à une fenêtre de SIGNED_URL_SECONDS: l'URL reste identique
+    pendant la fenêtre et peut donc être mise en cache. Retourne (url, expiration).
+    """
+    lifetime = settings.MEDIA_SERVING['SIGNED_URL_SECONDS']
+    expires = (int(time.time()) // lifetime + 2) * lifetime
+    token = Signer(salt=MEDIA_SIGNING_SALT).sign_object({'n': name, 'f': filename, 'e': expires})
+    url = request.build_absolute_uri(reverse('sharedapp:signed-media', args=[token]))
+    return url, datetime.fromtimestamp(expires, tz=dt_timezone.utc)
+
+
+def signed_media_response(request, token):
+    """
+    Sert le fichier désigné par une URL signée encore valide
+    """
+    try:
+        payload = Signer(salt=MEDIA_SIGNING_SALT).unsign_object(token)
+    except BadSignature:
+        raise Http404
+    remaining = payload['e'] - int(time.time())
+    if remaining <= 0:
+        return HttpResponse(status=410)
+    response = file_response(request, payload['n'], payload['f'])
+    response['Cache-Control'] = f'private, max-age={remaining}'
+    return response
+
+
+class DocumentBundleMixin:
+    """
+    Mixin ajoutant les actions `documents-bundle` (archive ZIP en flux de tous les documents
+    de l'objet) et `document-links` (URLs signées de chaque document); les documents
+    sont définis par get_bundle_files() comme [(nom dans l'archive, FieldFile, date)]
+    """
+
+    def get_bundle_files(self, instance):
+        """
+        Documents de l'objet: par défaut, chacun de ses champs fichier, daté de la dernière
+        modification de l'objet; à surcharger pour des documents liés
+        """
+        field_names = [field.name for field in instance._meta.concrete_fields if isinstance(field, FileField)]
+        if not field_names:
+            raise ImproperlyConfigured(
+                f"{type(self).__name__}: {instance._meta.label} has no file field, override get_bundle_files()"
+            )
+        modified = getattr(instance, 'updated_at', None) or getattr(instance, 'created_at', None) or timezone.now()
+        return [
+            (f"{field_name}{os.path.splitext(getattr(instance, field_name).name)[1]}",
+             getattr(instance, field_name), modified)
+            for field_name in field_names
+        ]
+
+    def get_bundle_filename(self, instance):
+        return f"{instance._meta.model_name}-{instance.pk}.zip"
+
+    @action(detail=True, methods=['GET'], url_path='documents-bundle')
+    def documents_bundle(self, request, pk=None):
+        """
+        Télécharge tous les documents de l'objet dans une archive ZIP (reprise via Range)
+        """
+        instance = self.get_object()
+        entries = [
+            ZipEntry(arcname, field_file.name, field_file.size, file_crc32(field_file.name, field_file.storage), modified)
+            for arcname, field_file, modified in self.get_bundle_files(instance)
+            if field_file and field_file.storage.exists(field_file.name)
+        ]
+        return zip_response(request, ZipStream(entries), self.get_bundle_filename(instance))
+
+    @action(detail=True, methods=['GET'], url_path='document-links')
+    def document_links(self, request, pk=None):
+        """
+        URLs signées et temporaires des documents de l'objet, après contrôle d'accès
+        """
+        instance = self.get_object()
+        links, expires_at = [], None
+        for arcname, field_file, _ in self.get_bundle_files(instance):
+            if field_file:
+                url, expires_at = sign_media_url(request, field_file.name, os.path.basename(arcname))
+                links.append({'name': arcname, 'url': url})
+        return Response({'results': links, 'expires_at': expires_at})
+
+
+class ConditionalGetMixin:
+    """
+    Mixin de ViewSet: GET conditionnel sur le détail (ETag fort) et la liste (ETag faible).
+    Les validateurs sont lus en une requête groupée: nombre de lignes, date maximale de
+    `updated_at` (et `version` si le modèle en a une) de l'objet et des relations imbriquées
+    listées dans `conditional_related` (avec leur nombre, pour les relations multiples),
+    plus les valeurs de get_list_validator_values() pour une liste (dernier événement de
+    workflow). If-None-Match ou If-Modified-Since donnent un 304 avant toute sérialisation.
+    Une relation imbriquée absente de `conditional_related` ne change pas les validateurs.
+    """
+    conditional_related = ()
+
+    def get_validator_aggregates(self):
+        model = self.queryset.model
+        aggregates = {'count': Count('pk', distinct=True), 'updated_at': Max('updated_at')}
+        for relation in self.conditional_related:
+            aggregates[f'{relation}__updated_at'] = Max(f'{relation}__updated_at')
+            aggregates[f'{relation}__count'] = Count(relation, distinct=True)
+        if any(field.name == 'version' for field in model._meta.concrete_fields):
+            aggregates['version'] = Max('version')
+        return aggregates
+
+    def get_list_validator_values(self):
+        """
+        Valeurs supplémentaires des validateurs de liste, ajoutées par les autres mixins
+        """
+        parent = getattr(super(), 'get_list_validator_values', None)
+        return parent() if parent is not None else []
+
+    def get_validator_queryset(self):
+        # Mêmes restrictions de visibilité que la vue, sans jointures d'affichage
+        return self.filter_queryset(self.get_queryset()).select_related(None).prefetch_related(None).order_by()
+
+    def make_validators(self, values, weak=False):
+        """
+        (ETag, Last-Modified) à partir des valeurs lues; la représentation dépend aussi
+        du format négocié. Last-Modified n'a qu'une précision d'une seconde: il n'est donné
+        qu'une fois cette seconde écoulée, pour qu'une modification faite dans la même
+        seconde ne soit pas masquée par If-Modified-Since.
+        """
+        key = repr([self.queryset.model._meta.label, self.request.accepted_renderer.format, *values])
+        etag = f'"{hashlib.sha1(key.encode()).hexdigest()}"'
+        dates = [value for value in values if isinstance(value, datetime)]
+        last_modified = max(dates) if dates else None
+        if last_modified is not None and int(last_modified.timestamp()) >= int(time.time()):
+            last_modified = None
+        return (f'W/{etag}' if weak else etag), last_modified
+
+    def conditional_response(self, request, validators, respond, *args, **kwargs):
+        etag, last_modified = validators
+        headers = {'ETag': etag, 'Cache-Control': 'private, no-cache'}
+        if last_modified is not None:
+            headers['Last-Modified'] = http_date(last_modified.timestamp())
+        if _not_modified(request, etag, last_modified):
+            return Response(status=304, headers=headers)
+        response = respond(request, *args, **kwargs)
+        if response.status_code == 200:
+            for header, value in headers.items():
+                response[header] = value
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup = self.kwargs[self.lookup_url_kwarg or self.lookup_field]
+        try:
+            values = self.get_validator_queryset().filter(**{self.lookup_field: lookup}).aggregate(
+                **self.get_validator_aggregates()
+            )
+        except (TypeError, ValueError, ValidationError):
+            values = {'count': 0}
+        if not values['count']:
+            # 404 et identifiant invalide: traitement habituel
+            return super().retrieve(request, *args, **kwargs)
+        validators = self.make_validators([lookup, *values.values()])
+        return self.conditional_response(request, validators, super().retrieve, *args, **kwargs)
+
+    def list(self, request, *args, **kwargs):
+        values = self.get_validator_queryset().aggregate(**self.get_validator_aggregates())
+        # Liste propre aux droits de l'utilisateur et aux paramètres (filtres, tri, page)
+        validators = self.make_validators(
+            [request.user.pk, request.GET.urlencode(), *values.values(), *self.get_list_validator_values()], weak=True
+        )
+        return self.conditional_response(request, validators, super().list, *args, **kwargs)
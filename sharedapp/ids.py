@@ -0,0 +1,193 @@
+# ids.py
+import os
+import threading
+import time
+import uuid
+from datetime import date, datetime, time as datetime_time, timezone as datetime_timezone
+
+from django.db import connections, models
+from django.db.models import Case, Q, Value, When
+from django.utils import timezone
+
+_lock = threading.Lock()
+_last_ms = 0
+_counter = 0
+
+
+def _build_uuid7(unix_ms, counter):
+    """
+    Layout RFC 9562: 48 bits d'horodatage (ms), version 7, 12 bits de compteur,
+    variante RFC 4122 et 62 bits aléatoires
+    """
+    tail = int.from_bytes(os.urandom(8), 'big') & ((1 << 62) - 1)
+    value = (unix_ms & ((1 << 48) - 1)) << 80 | 0x7 << 76 | (counter & 0xFFF) << 64 | 0b10 << 62 | tail
+    return uuid.UUID(int=value)
+
+
+def uuid7(timestamp=None):
+    """
+    UUID ordonné dans le temps (UUIDv7), utilisé comme clé primaire par défaut:
+    les insertions arrivent en fin d'index au lieu de fragmenter l'index clusterisé.
+    Les clés générées par un même processus sont strictement croissantes.
+    `timestamp` (datetime) permet de dater une clé a posteriori (reprise de données).
+    """
+    global _last_ms, _counter
+    if timestamp is not None:
+        return _build_uuid7(int(timestamp.timestamp() * 1000), int.from_bytes(os.urandom(2), 'big'))
+
+    with _lock:
+        unix_ms = time.time_ns() // 1_000_000
+        if unix_ms > _last_ms:
+            # Compteur initialisé dans la moitié basse pour laisser de la place aux incréments
+            _last_ms, _counter = unix_ms, int.from_bytes(os.urandom(2), 'big') & 0x7FF
+        else:
+            # Même milliseconde (ou horloge reculée): on incrémente sans jamais revenir en arrière
+            _counter += 1
+            if _counter > 0xFFF:
+                _last_ms, _counter = _last_ms + 1, 0
+        return _build_uuid7(_last_ms, _counter)
+
+
+def uuid7_datetime(value):
+    """
+    Horodatage encodé dans un UUIDv7
+    """
+    return datetime.fromtimestamp((value.int >> 80) / 1000, tz=datetime_timezone.utc)
+
+
+# Références génériques (content type + identifiant) vers des clés UUID
+GENERIC_REFERENCES = (
+    ('issuingCompany', 'Transaction', 'seller_content_type', 'seller_object_id'),
+    ('issuingCompany', 'Transaction', 'buyer_content_type', 'buyer_object_id'),
+    ('shareholders', 'FileDocument', 'content_type', 'object_id'),
+    ('sharedapp', 'WorkflowEvent', 'content_type', 'object_id'),
+)
+
+
+def _creation_field(model):
+    for field in model._meta.concrete_fields:
+        if getattr(field, 'auto_now_add', False):
+            return field.attname
+    return None
+
+
+def _as_datetime(value):
+    if value is None:
+        return timezone.now()
+    if not isinstance(value, datetime) and isinstance(value, date):
+        value = datetime.combine(value, datetime_time.min)
+    return timezone.make_aware(value, datetime_timezone.utc) if timezone.is_naive(value) else value
+
+
+def _remap(queryset, column, mapping, field):
+    """
+    Un seul UPDATE ... SET column = CASE ... pour un lot de clés
+    """
+    if isinstance(field, models.ForeignKey):
+        field = field.target_field
+    if isinstance(field, models.UUIDField):
+        values = mapping
+    else:
+        values = {str(old): str(new) for old, new in mapping.items()}
+    queryset.filter(**{f'{column}__in': list(values)}).update(**{
+        column: Case(
+            *(When(**{column: old}, then=Value(new)) for old, new in values.items()),
+            output_field=field
+        )
+    })
+
+
+def _historical_model(apps, model):
+    try:
+        return apps.get_model(model._meta.app_label, f'Historical{model._meta.object_name}')
+    except LookupError:
+        return None
+
+
+def _generic_references(apps, model):
+    ContentType = apps.get_model('contenttypes', 'ContentType')
+    content_type = ContentType.objects.filter(
+        app_label=model._meta.app_label, model=model._meta.model_name
+    ).first()
+    if content_type is None:
+        return []
+    references = []
+    for app_label, model_name, content_type_field, id_field in GENERIC_REFERENCES:
+        source = apps.get_model(app_label, model_name)
+        for referencing in (source, _historical_model(apps, source)):
+            if referencing is not None:
+                references.append((referencing, content_type_field, id_field, content_type.pk))
+    return references
+
+
+def _keyset_batches(queryset, created_field, batch_size):
+    """
+    Lots de (pk, date de création) dans l'ordre (création, pk), lus par pagination sur
+    clé: chaque lot est relu après la réécriture du précédent et seul un lot est en mémoire.
+    Une clé réécrite peut reparaître plus loin (même date, nouvelle clé): elle est alors
+    en version 7 et ignorée.
+    """
+    order = [created_field, 'pk'] if created_field else ['pk']
+    queryset = queryset.order_by(*order).values_list('pk', created_field or 'pk')
+    last = None
+    while True:
+        batch = queryset
+        if last is not None:
+            pk, created = last
+            if created_field:
+                batch = batch.filter(Q(**{f'{created_field}__gt': created}) | Q(**{created_field: created, 'pk__gt': pk}))
+            else:
+                batch = batch.filter(pk__gt=pk)
+        rows = list(batch[:batch_size])
+        if not rows:
+            return
+        yield rows
+        last = rows[-1]
+
+
+def rewrite_uuid_keys(apps, model_labels, using='default', batch_size=200):
+    """
+    Remplace les clés UUIDv4 existantes des modèles `model_labels` ('app_label.Model')
+    par des UUIDv7 datés de la création de chaque ligne, en mettant à jour dans le même
+    lot les clés étrangères (y compris tables M2M et tables historiques) et les
+    références génériques. Les clés déjà en version 7 sont conservées (relançable).
+    """
+    connection = connections[using]
+    rewritten = {}
+    with connection.constraint_checks_disabled():
+        for label in model_labels:
+            model = apps.get_model(label)
+            pk_field = model._meta.pk
+            created_field = _creation_field(model)
+
+            # Relations inverses, y compris cachées (tables M2M, clés des tables historiques)
+            references = [
+                (rel.related_model, rel.field.attname, rel.field)
+                for rel in model._meta.get_fields(include_hidden=True)
+                if rel.auto_created and not rel.concrete
+                and isinstance(rel.field, models.ForeignKey) and rel.field.target_field.primary_key
+            ]
+            historical = _historical_model(apps, model)
+            if historical is not None:
+                references.append((historical, 'id', historical._meta.get_field('id')))
+            generic = _generic_references(apps, model)
+
+            count = 0
+            for rows in _keyset_batches(model._base_manager.using(using), created_field, batch_size):
+                mapping = {
+                    pk: uuid7(_as_datetime(created if created_field else None))
+                    for pk, created in rows if pk.version != 7
+                }
+                if not mapping:
+                    continue
+                count += len(mapping)
+                _remap(model._base_manager.using(using), pk_field.attname, mapping, pk_field)
+                for related_model, column, field in references:
+                    _remap(related_model._base_manager.using(using), column, mapping, field)
+                for related_model, content_type_field, column, content_type_id in generic:
+                    _remap(
+                        related_model._base_manager.using(using).filter(**{f'{content_type_field}_id': content_type_id}),
+                        column, mapping, related_model._meta.get_field(column)
+                    )
+            rewritten[label] = count
+    return rewritten
@@ -0,0 +1,162 @@
+# images.py
+import io
+import os
+import logging
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+FORMAT_EXTENSIONS = {'JPEG': '.jpg', 'PNG': '.png', 'WEBP': '.webp'}
+SAVE_OPTIONS = {
+    'JPEG': {'quality': 85, 'optimize': True, 'progressive': True},
+    'PNG': {'optimize': True},
+    'WEBP': {'quality': 80, 'method': 6},
+}
+
+
+def variant_name(name, variant):
+    """
+    Nom d'une variante, rangée à côté de l'original: logo.png -> logo.small.png, logo.webp.webp.
+    Les originaux étant adressés par contenu, une variante ne devient jamais obsolète.
+    """
+    root, extension = os.path.splitext(name)
+    image_format = settings.IMAGE_VARIANTS[variant].get('format')
+    return f"{root}.{variant}{FORMAT_EXTENSIONS.get(image_format, extension.lower())}"
+
+
+def render_variant(name, variant, storage=default_storage):
+    """
+    Redimensionne l'original (proportions conservées, jamais agrandi) dans le format
+    de la variante, puis l'écrit de façon atomique à côté de l'original
+    """
+    spec = settings.IMAGE_VARIANTS[variant]
+    with storage.open(name) as source, Image.open(source) as image:
+        image_format = spec.get('format') or image.format
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((spec['size'], spec['size']), Image.Resampling.LANCZOS)
+        if image_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        buffer = io.BytesIO()
+        image.save(buffer, image_format, **SAVE_OPTIONS.get(image_format, {}))
+
+    target = storage.path(variant_name(name, variant))
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=os.path.dirname(target), delete=False) as temporary:
+        temporary.write(buffer.getvalue())
+    os.replace(temporary.name, target)
+    if storage.file_permissions_mode is not None:
+        os.chmod(target, storage.file_permissions_mode)
+    variant_index.invalidate(name)
+
+
+def ensure_variant(name, variant):
+    """
+    Nom de la variante, générée si elle n'existe pas encore; None si l'original est absent
+    ou n'est pas une image lisible (fichier corrompu, tronqué, trop grand)
+    """
+    if not default_storage.exists(variant_name(name, variant)):
+        try:
+            render_variant(name, variant)
+        except (OSError, ValueError, Image.DecompressionBombError) as e:
+            logger.warning(f"Image variant {variant} of {name} not generated: {e}")
+            return None
+    return variant_name(name, variant)
+
+
+def generate_variants(name):
+    """
+    Génère les variantes manquantes d'une image; retourne le nombre de variantes disponibles
+    """
+    return sum(1 for variant in settings.IMAGE_VARIANTS if ensure_variant(name, variant))
+
+
+class VariantIndex:
+    """
+    Index par processus (LRU borné à IMAGE_VARIANT_INDEX['MAX_SIZE'] images) des variantes
+    existantes, pour ne pas interroger le stockage à chaque sérialisation. Une écriture ou
+    une suppression de variante dans le processus invalide l'image; une image aux variantes
+    incomplètes, qu'un autre processus peut générer, est revérifiée après MISSING_SECONDS.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, name):
+        config = settings.IMAGE_VARIANT_INDEX
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is not None:
+                variants, checked_at = entry
+                if len(variants) == len(settings.IMAGE_VARIANTS) or \
+                        time.monotonic() - checked_at < config['MISSING_SECONDS']:
+                    self._entries.move_to_end(name)
+                    return variants
+        variants = {
+            variant: variant_name(name, variant) for variant in settings.IMAGE_VARIANTS
+            if default_storage.exists(variant_name(name, variant))
+        }
+        with self._lock:
+            self._entries[name] = (variants, time.monotonic())
+            self._entries.move_to_end(name)
+            while len(self._entries) > config['MAX_SIZE']:
+                self._entries.popitem(last=False)
+        return variants
+
+    def invalidate(self, name):
+        with self._lock:
+            self._entries.pop(name, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+variant_index = VariantIndex()
+
+
+def existing_variants(name):
+    """
+    {variante: nom} des variantes déjà générées (aucune image n'est décodée), lues dans
+    l'index des variantes
+    """
+    return variant_index.get(name)
+
+
+class ImageVariantsMixin:
+    """
+    Mixin de serializer: ajoute `<champ>_variants` ({variante: URL}) pour chaque champ de
+    `Meta.image_variant_fields`. Les variantes sont générées après l'enregistrement d'une
+    nouvelle image (commande generate_image_variants pour les images existantes); la
+    sérialisation ne liste que celles qui existent, sans jamais décoder d'image.
+    """
+
+    def save(self, **kwargs):
+        instance = super().save(**kwargs)
+        for field in self.Meta.image_variant_fields:
+            image = getattr(instance, field)
+            if image:
+                transaction.on_commit(lambda name=image.name: generate_variants(name))
+        return instance
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        request = self.context.get('request')
+        for field in self.Meta.image_variant_fields:
+            image = getattr(instance, field)
+            available = existing_variants(image.name) if image else {}
+            variants = {}
+            for variant in settings.IMAGE_VARIANTS:
+                name = available.get(variant)
+                url = image.storage.url(name) if name else None
+                variants[variant] = request.build_absolute_uri(url) if url and request else url
+            data[f'{field}_variants'] = variants
+        return data
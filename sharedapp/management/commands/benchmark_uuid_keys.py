@@ -0,0 +1,93 @@
+import time
+import uuid
+
+from django.apps.registry import Apps
+from django.core.management.base import BaseCommand
+from django.db import connection, models, transaction
+
+from sharedapp.ids import uuid7
+
+KEY_GENERATORS = {'uuid4': uuid.uuid4, 'uuid7': uuid7}
+
+
+def benchmark_model(name):
+    """
+    Table jetable avec une clé UUID, un index secondaire et une charge utile
+    comparable à une ligne de Transaction
+    """
+    attrs = {
+        '__module__': __name__,
+        'id': models.UUIDField(primary_key=True),
+        'reference': models.UUIDField(db_index=True),
+        'payload': models.CharField(max_length=200),
+        'created_at': models.DateTimeField(auto_now_add=True),
+        'Meta': type('Meta', (), {
+            'apps': Apps(), 'app_label': 'sharedapp', 'db_table': f'sharedapp_keybenchmark_{name}',
+        }),
+    }
+    return type(f'KeyBenchmark{name.title()}', (models.Model,), attrs)
+
+
+def table_sizes(table):
+    """
+    (taille des données, taille des index) en octets, si le moteur sait la donner
+    """
+    with connection.cursor() as cursor:
+        if connection.vendor == 'mysql':
+            cursor.execute(f'ANALYZE TABLE {connection.ops.quote_name(table)}')
+            cursor.fetchall()
+            cursor.execute(
+                'SELECT data_length, index_length FROM information_schema.tables '
+                'WHERE table_schema = DATABASE() AND table_name = %s', [table]
+            )
+            return cursor.fetchone()
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT pg_relation_size(%s), pg_indexes_size(%s)', [table, table])
+            return cursor.fetchone()
+    return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare le débit d'insertion et la taille des index avec des clés UUIDv4 (aléatoires) "
+        "et UUIDv7 (ordonnées dans le temps) sur des tables jetables. "
+        "A lancer sur une base de recette du même moteur que la production."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=200000)
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        rows, batch_size = options['rows'], options['batch_size']
+        for name, generate in KEY_GENERATORS.items():
+            model = benchmark_model(name)
+            with connection.schema_editor() as schema_editor:
+                schema_editor.create_model(model)
+            try:
+                started = time.perf_counter()
+                for start in range(0, rows, batch_size):
+                    # Une transaction par lot, comme les insertions applicatives
+                    with transaction.atomic():
+                        model.objects.bulk_create([
+                            model(id=generate(), reference=uuid.uuid4(), payload='x' * 120)
+                            for _ in range(min(batch_size, rows - start))
+                        ])
+                elapsed = time.perf_counter() - started
+
+                started = time.perf_counter()
+                list(model.objects.order_by('-id').values_list('id', flat=True)[:1000])
+                scan = time.perf_counter() - started
+
+                sizes = table_sizes(model._meta.db_table)
+                size_text = (
+                    f"données {sizes[0] / 1048576:.1f} Mo, index {sizes[1] / 1048576:.1f} Mo"
+                    if sizes else "tailles non disponibles pour ce moteur"
+                )
+                self.stdout.write(
+                    f"{name}: {rows / elapsed:.0f} insertions/s, "
+                    f"1000 dernières clés en {scan * 1000:.1f} ms, {size_text}"
+                )
+            finally:
+                with connection.schema_editor() as schema_editor:
+                    schema_editor.delete_model(model)
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from sharedapp.mediagc import collect_orphans, file_columns, purge_quarantine
+
+
+class Command(BaseCommand):
+    help = (
+        "Parcourt MEDIA_ROOT par tranches depuis le curseur enregistré, met en quarantaine "
+        "les fichiers qui ne sont plus référencés et supprime ceux en quarantaine depuis "
+        "MEDIA_GC['QUARANTINE_DAYS'] jours. A planifier périodiquement (cron), par exemple chaque nuit."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, help="Nombre maximal de fichiers parcourus")
+        parser.add_argument('--dry-run', action='store_true', help="Compte les orphelins sans rien déplacer")
+
+    def handle(self, *args, **options):
+        sweep, scanned, orphans = collect_orphans(limit=options['limit'], dry_run=options['dry_run'])
+        if options['dry_run']:
+            self.stdout.write(f"{scanned} fichier(s) parcouru(s), {orphans} orphelin(s)")
+            return
+
+        deleted, restored = purge_quarantine(file_columns())
+        sweep.deleted += deleted
+        sweep.save(update_fields=['deleted', 'updated_at'])
+        position = f"reprise après {sweep.cursor}" if sweep.cursor else "parcours terminé"
+        self.stdout.write(self.style.SUCCESS(
+            f"{scanned} fichier(s) parcouru(s), {orphans} mis en quarantaine, {deleted} supprimé(s), "
+            f"{restored} restauré(s) ({position})"
+        ))
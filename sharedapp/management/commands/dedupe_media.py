@@ -0,0 +1,92 @@
+import os
+from collections import Counter, defaultdict
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import F
+
+from sharedapp.models import StoredBlob
+from sharedapp.storage import (ContentAddressedStorage, adjust_blob_references, file_digest, is_blob,
+                              pop_claim, tracked_models)
+
+
+def historical_model(model):
+    history = getattr(model, 'history', None)
+    return history.model if history is not None else None
+
+
+class Command(BaseCommand):
+    help = (
+        "Migre les fichiers référencés par les FileField vers le stockage adressé par contenu: "
+        "chaque contenu n'est conservé qu'une fois, les références (lignes courantes et historiques) "
+        "sont réécrites et les anciennes copies supprimées."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Calcule seulement le gain attendu")
+
+    def handle(self, *args, **options):
+        if not isinstance(default_storage, ContentAddressedStorage):
+            raise CommandError("STORAGES['default'] must be sharedapp.storage.ContentAddressedStorage")
+
+        # {ancien nom: [(modèle, champ)]} des fichiers hors blobs encore référencés
+        references = defaultdict(list)
+        for model, fields in tracked_models().items():
+            for field in fields:
+                names = (
+                    model._base_manager.exclude(**{field.attname: ''})
+                    .order_by().values_list(field.attname, flat=True).distinct()
+                )
+                for name in names.iterator():
+                    if not is_blob(name):
+                        references[name].append((model, field))
+
+        if options['dry_run']:
+            self.report_dry_run(references)
+            return
+
+        migrated, missing, freed = 0, 0, 0
+        for name, targets in references.items():
+            if not default_storage.exists(name):
+                missing += 1
+                continue
+            size = default_storage.size(name)
+            with default_storage.open(name) as content:
+                new_name = default_storage.store(content, os.path.splitext(name)[1])
+
+            with transaction.atomic():
+                count = 0
+                for model, field in targets:
+                    count += model._base_manager.filter(**{field.attname: name}).update(**{field.attname: new_name})
+                    history = historical_model(model)
+                    if history is not None:
+                        history.objects.filter(**{field.attname: name}).update(**{field.attname: new_name})
+                StoredBlob.objects.filter(name=new_name).update(ref_count=F('ref_count') + count)
+                # Référence prise par store(), remplacée par celles des lignes réécrites
+                if pop_claim(new_name):
+                    adjust_blob_references(Counter(), Counter({new_name: 1}), default_storage)
+            default_storage.delete(name)
+            migrated += 1
+            freed += size
+
+        blobs = StoredBlob.objects.count()
+        self.stdout.write(self.style.SUCCESS(
+            f"{migrated} fichier(s) migré(s) vers {blobs} blob(s), {freed / 1048576:.1f} Mo d'anciennes copies "
+            f"supprimées, {missing} fichier(s) référencé(s) introuvable(s)"
+        ))
+
+    def report_dry_run(self, references):
+        by_digest, total = {}, 0
+        for name in references:
+            if not default_storage.exists(name):
+                continue
+            with default_storage.open(name) as content:
+                digest, size, _ = file_digest(content)
+            by_digest[digest] = size
+            total += size
+        unique = sum(by_digest.values())
+        self.stdout.write(
+            f"{len(references)} fichier(s) référencé(s), {len(by_digest)} contenu(s) distinct(s): "
+            f"{total / 1048576:.1f} Mo -> {unique / 1048576:.1f} Mo"
+        )
@@ -0,0 +1,27 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+
+from sharedapp.duplicates import DUPLICATE_RULES, detect_duplicates
+
+
+class Command(BaseCommand):
+    help = (
+        "Recherche les actionnaires saisis en double (identifiants, noms proches, même date de "
+        "naissance) en ne comparant que les fiches d'un même bloc, et met à jour la file de revue "
+        "(/api/sharedapp/duplicates/). A planifier périodiquement (cron), par exemple chaque nuit."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', action='append', help="Modèle à analyser, ex. shareholders.LegalShareholder")
+        parser.add_argument('--threshold', type=float, help="Score minimal d'une paire (DUPLICATE_DETECTION['THRESHOLD'])")
+
+    def handle(self, *args, **options):
+        labels = options['model'] or list(DUPLICATE_RULES)
+        unknown = set(labels) - set(DUPLICATE_RULES)
+        if unknown:
+            raise CommandError(f"No duplicate rules for: {', '.join(sorted(unknown))}")
+        for label in labels:
+            records, compared, found = detect_duplicates(apps.get_model(label), options['threshold'])
+            self.stdout.write(self.style.SUCCESS(
+                f"{label}: {records} fiche(s), {compared} paire(s) comparée(s), {found} doublon(s) probable(s)"
+            ))
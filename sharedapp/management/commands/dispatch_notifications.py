@@ -0,0 +1,28 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from sharedapp.notifications import dispatch_notification_jobs
+
+
+class Command(BaseCommand):
+    help = (
+        "Diffuse les notifications de transitions mises en file (destinataires, notifications, "
+        "événements temps réel). A lancer en continu avec --loop, ou à planifier périodiquement "
+        "(cron), par exemple chaque minute."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int)
+        parser.add_argument('--loop', action='store_true', help="Interroge la file en continu (NOTIFICATION_QUEUE['POLL_SECONDS'])")
+
+    def handle(self, *args, **options):
+        while True:
+            done, failed = dispatch_notification_jobs(batch_size=options['batch_size'])
+            if done or failed or not options['loop']:
+                self.stdout.write(self.style.SUCCESS(f"{done} diffusion(s) effectuée(s), {failed} échec(s)"))
+            if not options['loop']:
+                return
+            if not done:
+                time.sleep(settings.NOTIFICATION_QUEUE['POLL_SECONDS'])
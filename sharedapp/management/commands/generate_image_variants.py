@@ -0,0 +1,32 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.db import models
+from simple_history.models import HistoricalChanges
+
+from sharedapp.images import generate_variants
+
+
+class Command(BaseCommand):
+    help = (
+        "Génère les variantes manquantes (IMAGE_VARIANTS) des images déjà enregistrées; à lancer "
+        "après un ajout de variante ou pour les images antérieures à leur génération à l'upload."
+    )
+
+    def handle(self, *args, **options):
+        for model in apps.get_models():
+            if issubclass(model, HistoricalChanges):
+                continue
+            for field in model._meta.concrete_fields:
+                if not isinstance(field, models.ImageField):
+                    continue
+                names = (
+                    model._base_manager.exclude(**{field.attname: ''}).exclude(**{f'{field.attname}__isnull': True})
+                    .order_by().values_list(field.attname, flat=True).distinct()
+                )
+                images = generated = 0
+                for name in names.iterator():
+                    images += 1
+                    generated += generate_variants(name)
+                self.stdout.write(self.style.SUCCESS(
+                    f"{model._meta.label}.{field.name}: {images} image(s), {generated} variante(s) disponible(s)"
+                ))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from sharedapp.events import purge_stream_events
+
+
+class Command(BaseCommand):
+    help = (
+        "Supprime les événements SSE plus anciens que EVENT_STREAM['RETENTION_HOURS']. "
+        "A planifier périodiquement (cron)."
+    )
+
+    def handle(self, *args, **options):
+        deleted = purge_stream_events()
+        self.stdout.write(self.style.SUCCESS(f"{deleted} événement(s) supprimé(s)"))
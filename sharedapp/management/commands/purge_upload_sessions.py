@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from sharedapp.uploads import purge_upload_sessions
+
+
+class Command(BaseCommand):
+    help = (
+        "Supprime les sessions d'upload expirées, leurs fichiers de staging et les blobs "
+        "jamais rattachés. A planifier périodiquement (cron)."
+    )
+
+    def handle(self, *args, **options):
+        deleted = purge_upload_sessions()
+        self.stdout.write(self.style.SUCCESS(f"{deleted} session(s) supprimée(s)"))
@@ -0,0 +1,35 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+
+from sharedapp.search import SEARCH_INDEXES, index_objects
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconstruit l'index de recherche (table SearchTerm) par lots; à lancer après "
+        "la migration qui crée l'index ou après une modification de SEARCH_INDEXES."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', action='append', help="Modèle à réindexer, ex. shareholders.PhysicalShareholder")
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        labels = options['model'] or list(SEARCH_INDEXES)
+        unknown = set(labels) - set(SEARCH_INDEXES)
+        if unknown:
+            raise CommandError(f"Not indexed: {', '.join(sorted(unknown))}")
+        for label in labels:
+            model = apps.get_model(label)
+            pks = model._base_manager.order_by('pk').values_list('pk', flat=True)
+            batch, count = [], 0
+            for pk in pks.iterator(chunk_size=options['batch_size']):
+                batch.append(pk)
+                if len(batch) >= options['batch_size']:
+                    index_objects(model, batch)
+                    count += len(batch)
+                    batch = []
+            if batch:
+                index_objects(model, batch)
+                count += len(batch)
+            self.stdout.write(self.style.SUCCESS(f"{label}: {count} objet(s) indexé(s)"))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from sharedapp.notifications import reconcile_unread_counters
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcule les compteurs de notifications non lues qui ont dérivé. "
+        "A planifier périodiquement (cron), par exemple toutes les heures."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        fixed = reconcile_unread_counters(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"{fixed} compteur(s) corrigé(s)"))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from sharedapp.responsecache import cache_statistics
+
+
+class Command(BaseCommand):
+    help = (
+        "Affiche le taux de succès du cache des réponses par endpoint, cumulé par tous les workers "
+        "depuis le démarrage du cache partagé. A planifier périodiquement (cron) pour le suivi."
+    )
+
+    def handle(self, *args, **options):
+        statistics = cache_statistics()
+        if not statistics:
+            self.stdout.write("Aucune réponse mise en cache")
+        for endpoint, counts in statistics.items():
+            ratio = '-' if counts['hit_ratio'] is None else f"{counts['hit_ratio']:.1%}"
+            self.stdout.write(f"{endpoint}: {counts['hits']} succès, {counts['misses']} échec(s), taux {ratio}")
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from sharedapp.notifications import flush_notification_digests
+
+
+class Command(BaseCommand):
+    help = (
+        "Envoie les digests de notifications dont la fenêtre est close. "
+        "A planifier fréquemment (cron), par exemple chaque minute."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200)
+
+    def handle(self, *args, **options):
+        sent = flush_notification_digests(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"{sent} digest(s) envoyé(s)"))
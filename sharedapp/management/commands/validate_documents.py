@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from sharedapp.validation import validate_pending_documents
+
+
+class Command(BaseCommand):
+    help = (
+        "Vérifie le contenu des documents en attente (signature, décodage des images, structure "
+        "des PDF, suppression des EXIF) dans un pool de processus. A planifier fréquemment (cron)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, help="Nombre de processus (0: sans pool)")
+        parser.add_argument('--batch-size', type=int)
+
+    def handle(self, *args, **options):
+        valid, rejected = validate_pending_documents(
+            workers=options['workers'], batch_size=options['batch_size']
+        )
+        self.stdout.write(self.style.SUCCESS(f"{valid} document(s) valide(s), {rejected} rejeté(s)"))
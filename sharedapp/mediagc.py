@@ -0,0 +1,255 @@
+# mediagc.py
+"""
+Ramasse-miettes incrémental des fichiers orphelins de MEDIA_ROOT: parcours trié reprenant
+au curseur enregistré, vérification des références par lots (requêtes `__in` sur chaque
+colonne fichier, toutes indexées, tables historiques comprises) sans jamais charger la liste complète des fichiers ni des références,
+puis mise en quarantaine des orphelins et suppression définitive après un délai.
+"""
+import os
+import time
+import uuid
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import models, transaction
+from django.utils import timezone
+from simple_history.models import HistoricalChanges
+
+from .constants import UploadStatus
+from .images import variant_name
+from .models import MediaSweep, StoredBlob, UploadSession
+from .storage import BLOB_PREFIX, is_blob
+
+STAGING_PREFIX = f"{BLOB_PREFIX}/tmp/"
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+
+
+def file_columns():
+    """
+    [(modèle, nom de colonne)] de tous les FileField/ImageField, tables historiques comprises:
+    un fichier encore cité par une version historique n'est pas orphelin (les blobs supprimés
+    à leur dernière référence courante ne sont, eux, pas retenus par l'historique)
+    """
+    columns = []
+    for model in apps.get_models():
+        if issubclass(model, HistoricalChanges):
+            continue
+        names = [field.attname for field in model._meta.concrete_fields if isinstance(field, models.FileField)]
+        columns.extend((model, name) for name in names)
+        # Les tables historiques stockent les noms de fichiers dans des CharField
+        # (SIMPLE_HISTORY_FILEFIELD_TO_CHARFIELD), indexés comme la colonne d'origine
+        history = getattr(model, 'history', None)
+        if history is not None:
+            columns.extend((history.model, name) for name in names)
+    return columns
+
+
+def iter_media_files(root, after='', skip=()):
+    """
+    Chemins relatifs (séparateur '/') des fichiers sous root strictement après `after`, dans
+    l'ordre lexicographique des chemins: un répertoire est trié comme « nom/ », de sorte que
+    le parcours en profondeur suit l'ordre des chaînes et que le curseur permet la reprise.
+    Seul le contenu d'un répertoire à la fois est en mémoire.
+    """
+    def walk(directory, prefix):
+        try:
+            with os.scandir(directory) as scanner:
+                entries = sorted(
+                    (entry.name + '/' if entry.is_dir(follow_symlinks=False) else entry.name, entry)
+                    for entry in scanner
+                )
+        except FileNotFoundError:
+            return
+        for key, entry in entries:
+            path = prefix + key
+            if key.endswith('/'):
+                if path in skip:
+                    continue
+                # Sous-arbre entièrement avant le curseur
+                if after >= path and not after.startswith(path):
+                    continue
+                yield from walk(entry.path, path)
+            elif path > after:
+                yield path
+
+    yield from walk(root, '')
+
+
+def referenced_names(names, columns):
+    """
+    Sous-ensemble des noms encore référencés par une colonne fichier ou par une session
+    d'upload terminée et non expirée
+    """
+    referenced = set()
+    for model, column in columns:
+        referenced.update(
+            model._base_manager.filter(**{f'{column}__in': names}).values_list(column, flat=True)
+        )
+    referenced.update(UploadSession.objects.filter(
+        blob_name__in=names, status=UploadStatus.COMPLETED, expires_at__gt=timezone.now()
+    ).values_list('blob_name', flat=True))
+    referenced.update(
+        StoredBlob.objects.filter(name__in=names, ref_count__gt=0).values_list('name', flat=True)
+    )
+    return referenced
+
+
+def owner_candidates(name):
+    """
+    Fichiers dont l'existence justifie celle de `name`: les originaux possibles d'une
+    variante d'image (l'extension d'origine est inconnue pour un changement de format),
+    le fichier lui-même sinon
+    """
+    root, extension = os.path.splitext(name)
+    candidates = [name]
+    for variant, spec in settings.IMAGE_VARIANTS.items():
+        if root.endswith(f'.{variant}'):
+            original_root = root[:-len(variant) - 1]
+            extensions = IMAGE_EXTENSIONS if spec.get('format') else (extension, extension.upper())
+            candidates.extend(
+                original_root + original for original in extensions
+                if variant_name(original_root + original, variant) == name
+            )
+    return candidates
+
+
+def _staging_session_id(name):
+    """
+    Identifiant de la session d'upload d'un fichier de staging (blobs/tmp/uploads/<id>.part)
+    """
+    if not name.startswith(f"{STAGING_PREFIX}uploads/") or not name.endswith('.part'):
+        return None
+    try:
+        return uuid.UUID(os.path.basename(name)[:-len('.part')])
+    except ValueError:
+        return None
+
+
+def find_orphans(names, columns):
+    """
+    Noms orphelins parmi un lot de fichiers. Les fichiers de staging ne sont conservés
+    que pour une session d'upload encore ouverte.
+    """
+    staging = {name: _staging_session_id(name) for name in names if name.startswith(STAGING_PREFIX)}
+    open_sessions = set(UploadSession.objects.filter(
+        pk__in=[pk for pk in staging.values() if pk], status=UploadStatus.OPEN
+    ).values_list('pk', flat=True))
+    orphans = [name for name, pk in staging.items() if pk not in open_sessions]
+
+    candidates = {name: owner_candidates(name) for name in names if name not in staging}
+    referenced = referenced_names(
+        list({owner for owners in candidates.values() for owner in owners}), columns
+    )
+    orphans.extend(name for name, owners in candidates.items() if referenced.isdisjoint(owners))
+    return orphans
+
+
+def _quarantine_root():
+    return os.path.join(settings.MEDIA_ROOT, settings.MEDIA_GC['QUARANTINE_DIR'])
+
+
+def quarantine(name):
+    """
+    Déplace un orphelin dans la quarantaine en conservant son chemin relatif. Pour un blob,
+    le verrou de sa ligne StoredBlob exclut une publication simultanée du même contenu.
+    """
+    target = os.path.join(_quarantine_root(), name)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    with transaction.atomic():
+        if is_blob(name) and StoredBlob.objects.select_for_update().filter(name=name, ref_count__gt=0).exists():
+            return False
+        os.replace(default_storage.path(name), target)
+    os.utime(target)  # date d'entrée en quarantaine
+    return True
+
+
+def purge_quarantine(columns):
+    """
+    Supprime les fichiers en quarantaine depuis plus de QUARANTINE_DAYS; un fichier de
+    nouveau référencé entre-temps est restauré. Retourne (supprimés, restaurés).
+    """
+    root = _quarantine_root()
+    deadline = time.time() - settings.MEDIA_GC['QUARANTINE_DAYS'] * 86400
+    deleted = restored = 0
+    batch = []
+
+    def flush():
+        nonlocal deleted, restored
+        candidates = {name: owner_candidates(name) for name in batch}
+        referenced = referenced_names(
+            list({owner for owners in candidates.values() for owner in owners}), columns
+        )
+        for name, owners in candidates.items():
+            path = os.path.join(root, name)
+            if not referenced.isdisjoint(owners):
+                target = default_storage.path(name)
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                os.replace(path, target)
+                restored += 1
+                continue
+            os.remove(path)
+            deleted += 1
+            if is_blob(name):
+                with transaction.atomic():
+                    blob = StoredBlob.objects.select_for_update().filter(name=name, ref_count=0).first()
+                    # Contenu republié entre-temps: la ligne décrit le nouveau fichier
+                    if blob is not None and not default_storage.exists(name):
+                        blob.delete()
+        batch.clear()
+
+    for name in iter_media_files(root):
+        if os.path.getmtime(os.path.join(root, name)) < deadline:
+            batch.append(name)
+            if len(batch) >= settings.MEDIA_GC['BATCH_SIZE']:
+                flush()
+    if batch:
+        flush()
+    return deleted, restored
+
+
+def collect_orphans(limit=None, dry_run=False):
+    """
+    Avance le parcours de MEDIA_ROOT d'au plus `limit` fichiers depuis le curseur enregistré
+    et met les orphelins en quarantaine lot par lot (fichiers plus récents que GRACE_HOURS
+    ignorés). Le curseur revient au début une fois le parcours terminé.
+    Retourne (état du parcours, fichiers parcourus, orphelins).
+    """
+    config = settings.MEDIA_GC
+    sweep, _ = MediaSweep.objects.get_or_create(name='media')
+    if not sweep.cursor:
+        sweep.pass_started_at = timezone.now()
+    columns = file_columns()
+    grace = time.time() - config['GRACE_HOURS'] * 3600
+    limit = limit or config['FILES_PER_RUN']
+    scanned = orphans = 0
+    batch = []
+
+    def flush():
+        nonlocal orphans
+        found = find_orphans(batch, columns)
+        orphans += len(found) if dry_run else sum(quarantine(name) for name in found)
+        batch.clear()
+
+    last = None
+    for last in iter_media_files(settings.MEDIA_ROOT, sweep.cursor, skip={config['QUARANTINE_DIR'] + '/'}):
+        scanned += 1
+        if os.path.getmtime(default_storage.path(last)) < grace:
+            batch.append(last)
+            if len(batch) >= config['BATCH_SIZE']:
+                flush()
+        if scanned >= limit:
+            break
+    if batch:
+        flush()
+
+    if not dry_run:
+        if scanned < limit:
+            sweep.cursor = ''
+            sweep.last_completed_at = timezone.now()
+        else:
+            sweep.cursor = last
+        sweep.scanned += scanned
+        sweep.quarantined += orphans
+        sweep.save()
+    return sweep, scanned, orphans
@@ -0,0 +1,53 @@
+# Generated by Django 5.1.3 on 2026-10-19 11:01
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sharedapp', '0002_notificationcounter'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationDigest',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('type', models.CharField(choices=[('SMS', 'SMS'), ('EMAIL', 'Email'), ('PHONE', 'Phone')], default='EMAIL', max_length=10)),
+                ('window_start', models.DateTimeField(auto_now_add=True)),
+                ('window_end', models.DateTimeField()),
+                ('notification_count', models.PositiveIntegerField(default=0)),
+                ('title', models.CharField(blank=True, max_length=200)),
+                ('description', models.TextField(blank=True)),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('SENT', 'Sent'), ('FAILED', 'Failed')], default='PENDING', max_length=20)),
+                ('date_sent', models.DateTimeField(blank=True, null=True)),
+                ('recipient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notification_digests', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-window_start'],
+            },
+        ),
+        migrations.AddField(
+            model_name='historicalnotification',
+            name='digest',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='sharedapp.notificationdigest'),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='digest',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='notifications', to='sharedapp.notificationdigest'),
+        ),
+        migrations.AddIndex(
+            model_name='notificationdigest',
+            index=models.Index(fields=['recipient', 'type', 'status', 'window_end'], name='sharedapp_n_recipie_11e6cc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notificationdigest',
+            index=models.Index(fields=['status', 'window_end'], name='sharedapp_n_status_c98158_idx'),
+        ),
+    ]
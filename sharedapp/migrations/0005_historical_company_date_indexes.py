@@ -0,0 +1,24 @@
+# Generated by Django 5.1.3 on 2026-10-19 11:06
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('issuingCompany', '0005_historical_company_date_indexes'),
+        ('sharedapp', '0004_streamevent'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='historicalannouncement',
+            index=models.Index(fields=['share', 'history_date'], name='sharedapp_h_share_i_2a4976_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='historicaldividend',
+            index=models.Index(fields=['issuing_company', 'history_date'], name='sharedapp_h_issuing_fff5c0_idx'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.1.3 on 2026-10-19 11:18
+
+import sharedapp.ids
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sharedapp', '0006_workflowevent'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='announcement',
+            name='id',
+            field=models.UUIDField(default=sharedapp.ids.uuid7, editable=False, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='dividend',
+            name='id',
+            field=models.UUIDField(default=sharedapp.ids.uuid7, editable=False, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='historicalannouncement',
+            name='id',
+            field=models.UUIDField(db_index=True, default=sharedapp.ids.uuid7, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='historicaldividend',
+            name='id',
+            field=models.UUIDField(db_index=True, default=sharedapp.ids.uuid7, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='historicalnotification',
+            name='id',
+            field=models.UUIDField(db_index=True, default=sharedapp.ids.uuid7, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='notification',
+            name='id',
+            field=models.UUIDField(default=sharedapp.ids.uuid7, editable=False, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='notificationdigest',
+            name='id',
+            field=models.UUIDField(default=sharedapp.ids.uuid7, editable=False, primary_key=True, serialize=False),
+        ),
+    ]
@@ -0,0 +1,35 @@
+from django.db import migrations
+
+from sharedapp.ids import rewrite_uuid_keys
+
+UUID_KEY_MODELS = [
+    'sharedapp.NotificationDigest',
+    'sharedapp.Notification',
+    'sharedapp.Announcement',
+    'sharedapp.Dividend',
+    'issuingCompany.Sociale',
+    'issuingCompany.Transaction',
+    'shareholders.PhysicalShareholder',
+    'shareholders.LegalShareholder',
+    'shareholders.Share',
+    'shareholders.FileDocument',
+]
+
+
+def rewrite_keys(apps, schema_editor):
+    rewrite_uuid_keys(apps, UUID_KEY_MODELS, using=schema_editor.connection.alias)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('issuingCompany', '0008_uuid7_keys'),
+        ('sharedapp', '0007_uuid7_keys'),
+        ('shareholders', '0007_uuid7_keys'),
+    ]
+
+    operations = [
+        # Les anciennes clés restent des UUID valides: pas de retour arrière nécessaire
+        migrations.RunPython(rewrite_keys, migrations.RunPython.noop),
+    ]
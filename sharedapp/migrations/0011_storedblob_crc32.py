@@ -0,0 +1,18 @@
+# Generated by Django 5.1.3 on 2026-10-19 11:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sharedapp', '0010_uploadsession'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='storedblob',
+            name='crc32',
+            field=models.PositiveBigIntegerField(blank=True, null=True),
+        ),
+    ]
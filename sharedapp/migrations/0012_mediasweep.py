@@ -0,0 +1,27 @@
+# Generated by Django 5.1.3 on 2026-10-19 11:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sharedapp', '0011_storedblob_crc32'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaSweep',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('cursor', models.CharField(blank=True, max_length=1024)),
+                ('pass_started_at', models.DateTimeField(blank=True, null=True)),
+                ('last_completed_at', models.DateTimeField(blank=True, null=True)),
+                ('scanned', models.PositiveBigIntegerField(default=0)),
+                ('quarantined', models.PositiveBigIntegerField(default=0)),
+                ('deleted', models.PositiveBigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
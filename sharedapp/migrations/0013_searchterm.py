@@ -0,0 +1,29 @@
+# Generated by Django 5.1.3 on 2026-10-19 11:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('sharedapp', '0012_mediasweep'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('object_id', models.CharField(max_length=64)),
+                ('kind', models.CharField(choices=[('W', 'Word'), ('T', 'Trigram')], max_length=1)),
+                ('token', models.CharField(max_length=64)),
+                ('weight', models.PositiveSmallIntegerField(default=1)),
+                ('content_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='contenttypes.contenttype')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['content_type', 'kind', 'token'], name='sharedapp_s_content_deb172_idx'), models.Index(fields=['content_type', 'object_id'], name='sharedapp_s_content_76c0ae_idx')],
+            },
+        ),
+    ]
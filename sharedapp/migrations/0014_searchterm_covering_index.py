@@ -0,0 +1,30 @@
+# Generated by Django 5.1.3 on 2026-10-19 11:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('sharedapp', '0013_searchterm'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='searchterm',
+            name='sharedapp_s_content_deb172_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='searchterm',
+            name='sharedapp_s_content_76c0ae_idx',
+        ),
+        migrations.AddIndex(
+            model_name='searchterm',
+            index=models.Index(fields=['kind', 'token', 'content_type', 'object_id', 'weight'], name='sharedapp_s_kind_2ec5eb_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='searchterm',
+            index=models.Index(fields=['object_id', 'content_type'], name='sharedapp_s_object__570685_idx'),
+        ),
+    ]
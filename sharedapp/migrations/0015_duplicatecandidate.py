@@ -0,0 +1,37 @@
+# Generated by Django 5.1.3 on 2026-10-19 12:15
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('sharedapp', '0014_searchterm_covering_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DuplicateCandidate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('first_id', models.CharField(max_length=64)),
+                ('second_id', models.CharField(max_length=64)),
+                ('score', models.FloatField()),
+                ('reasons', models.JSONField(default=dict)),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('CONFIRMED', 'Confirmed'), ('DISMISSED', 'Dismissed')], default='PENDING', max_length=10)),
+                ('reviewed_at', models.DateTimeField(blank=True, null=True)),
+                ('detected_at', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('content_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='contenttypes.contenttype')),
+                ('reviewed_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='reviewed_duplicates', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', '-score'], name='sharedapp_d_status_317e85_idx'), models.Index(fields=['second_id'], name='sharedapp_d_second__40cb8c_idx')],
+                'constraints': [models.UniqueConstraint(fields=('first_id', 'second_id', 'content_type'), name='unique_duplicate_pair')],
+            },
+        ),
+    ]
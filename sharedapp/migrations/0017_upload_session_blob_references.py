@@ -0,0 +1,35 @@
+from django.db import migrations, models
+
+
+def count_session_references(apps, schema_editor):
+    # Les sessions terminées gardent désormais une référence sur leur blob jusqu'à leur purge
+    UploadSession = apps.get_model('sharedapp', 'UploadSession')
+    StoredBlob = apps.get_model('sharedapp', 'StoredBlob')
+    counts = (
+        UploadSession.objects.filter(status='COMPLETED').exclude(blob_name='').order_by()
+        .values_list('blob_name').annotate(count=models.Count('id'))
+    )
+    for name, count in counts:
+        StoredBlob.objects.filter(name=name).update(ref_count=models.F('ref_count') + count)
+
+
+def uncount_session_references(apps, schema_editor):
+    UploadSession = apps.get_model('sharedapp', 'UploadSession')
+    StoredBlob = apps.get_model('sharedapp', 'StoredBlob')
+    counts = (
+        UploadSession.objects.filter(status='COMPLETED').exclude(blob_name='').order_by()
+        .values_list('blob_name').annotate(count=models.Count('id'))
+    )
+    for name, count in counts:
+        StoredBlob.objects.filter(name=name, ref_count__gte=count).update(ref_count=models.F('ref_count') - count)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sharedapp', '0016_notificationjob'),
+    ]
+
+    operations = [
+        migrations.RunPython(count_session_references, uncount_session_references),
+    ]
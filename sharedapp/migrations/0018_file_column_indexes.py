@@ -0,0 +1,23 @@
+# Generated by Django 5.1.3 on 2026-10-19 13:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sharedapp', '0017_upload_session_blob_references'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='dividend',
+            name='general_assembly_minutes',
+            field=models.FileField(db_index=True, upload_to='assembly_minutes/'),
+        ),
+        migrations.AlterField(
+            model_name='historicaldividend',
+            name='general_assembly_minutes',
+            field=models.CharField(db_index=True, max_length=100),
+        ),
+    ]
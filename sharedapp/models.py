@@ -1,20 +1,23 @@
 # Create your models here.
-import uuid
+import os
 from django.contrib.auth.models import User
+from django.contrib.contenttypes.fields import GenericForeignKey
 from django.core.validators import MinValueValidator
 from django.db import models
 from django.forms import ValidationError
 from simple_history.models import HistoricalRecords
 
-from sharedapp.constants import (AnnouncementType, NotificationStatus,
-                                 NotificationType)
+from sharedapp.constants import (AnnouncementType, DuplicateStatus, NotificationStatus,
+                                 NotificationType, SearchTermKind, UploadStatus)
+from sharedapp.historical import IndexedHistoricalRecords
+from sharedapp.ids import uuid7
 
 
 class Announcement(models.Model):
     """
     Model for share purchase/sale announcements
     """
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
     description = models.TextField()
     quantity = models.PositiveIntegerField(validators=[MinValueValidator(1)])
     price = models.DecimalField(max_digits=10, decimal_places=2)
@@ -30,7 +33,7 @@ class Announcement(models.Model):
     # Référence à l'action de la société émettrice
     share = models.ForeignKey('issuingCompany.IssuingCompany', on_delete=models.CASCADE, related_name='announcements')
 
-    history = HistoricalRecords()
+    history = IndexedHistoricalRecords(indexes=[('share', 'history_date')])
 
     def clean(self):
         if self.expiration_date <= self.announcement_date:
@@ -54,7 +57,7 @@ class Notification(models.Model):
     """
     Model for system notifications
     """
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
     title = models.CharField(max_length=200)
     description = models.TextField()
     date_created = models.DateTimeField(auto_now_add=True)
@@ -71,6 +74,14 @@ class Notification(models.Model):
         choices=NotificationStatus.CHOICES,
         default=NotificationStatus.PENDING
     )
+    # Digest regroupant l'envoi de cette notification (mode digest)
+    digest = models.ForeignKey(
+        'sharedapp.NotificationDigest',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='notifications'
+    )
 
     history = HistoricalRecords()
 
@@ -83,18 +94,208 @@ class Notification(models.Model):
         ordering = ['-date_created']
         indexes = [
         models.Index(fields=['date_created']),
+        models.Index(fields=['recipient', 'is_read', 'date_created']),
     ]
 
     def __str__(self):
         return f"{self.title} - {self.get_type_display()}"
 
+class NotificationDigest(models.Model):
+    """
+    Outbound message merging the notifications of one recipient and channel
+    received during a time window
+    """
+    id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
+    recipient = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notification_digests')
+    type = models.CharField(
+        max_length=10,
+        choices=NotificationType.CHOICES,
+        default=NotificationType.EMAIL
+    )
+    window_start = models.DateTimeField(auto_now_add=True)
+    window_end = models.DateTimeField()
+    notification_count = models.PositiveIntegerField(default=0)
+    title = models.CharField(max_length=200, blank=True)
+    description = models.TextField(blank=True)
+    status = models.CharField(
+        max_length=20,
+        choices=NotificationStatus.CHOICES,
+        default=NotificationStatus.PENDING
+    )
+    date_sent = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-window_start']
+        indexes = [
+            models.Index(fields=['recipient', 'type', 'status', 'window_end']),
+            models.Index(fields=['status', 'window_end']),
+        ]
+
+    def __str__(self):
+        return f"Digest {self.recipient} - {self.get_type_display()} ({self.notification_count})"
+
+class StreamEvent(models.Model):
+    """
+    Event pushed to connected clients; the auto-increment id is the stream cursor
+    """
+    recipient = models.ForeignKey(User, on_delete=models.CASCADE, related_name='stream_events')
+    event = models.CharField(max_length=30)
+    payload = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['recipient', 'id']),
+        ]
+
+    def __str__(self):
+        return f"{self.event} #{self.pk} - {self.recipient}"
+
+class NotificationJob(models.Model):
+    """
+    Queued fan-out of a workflow transition (recipients, notifications, stream events),
+    written in the transition's transaction and processed by dispatch_notifications
+    """
+    payload = models.JSONField()
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['attempts', 'id']),
+        ]
+
+    def __str__(self):
+        return f"Notification job #{self.pk} ({self.payload.get('title', '')})"
+
+class NotificationCounter(models.Model):
+    """
+    Per-user unread notification counter, maintained on every notification change
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='notification_counter')
+    unread_count = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.user} - {self.unread_count} unread"
+
+class WorkflowEvent(models.Model):
+    """
+    Append-only log of workflow transitions (submit, examine, approve, reject, validate)
+    """
+    content_type = models.ForeignKey('contenttypes.ContentType', on_delete=models.CASCADE)
+    object_id = models.CharField(max_length=64)  # UUID or integer primary key of the entity
+    entity = GenericForeignKey('content_type', 'object_id')
+    action = models.CharField(max_length=20)
+    from_status = models.CharField(max_length=20, blank=True)
+    to_status = models.CharField(max_length=20)
+    actor = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='workflow_events')
+    comment = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-id']
+        indexes = [
+            models.Index(fields=['content_type', 'object_id', 'id']),
+            models.Index(fields=['actor', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.action} {self.content_type_id}:{self.object_id} ({self.from_status} -> {self.to_status})"
+
+class StoredBlob(models.Model):
+    """
+    Unique file content kept once by ContentAddressedStorage, with the number of
+    file fields referencing it
+    """
+    name = models.CharField(max_length=255, unique=True)  # blobs/ab/cd/<sha256><ext>
+    sha256 = models.CharField(max_length=64, db_index=True)
+    size = models.PositiveBigIntegerField()
+    crc32 = models.PositiveBigIntegerField(null=True, blank=True)  # for streamed ZIP entries
+    ref_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['ref_count', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.ref_count} ref.)"
+
+class MediaSweep(models.Model):
+    """
+    Persisted progress of the incremental orphaned-media collector: the walk resumes
+    after `cursor` (a path relative to MEDIA_ROOT); an empty cursor starts a new pass
+    """
+    name = models.CharField(max_length=50, unique=True)
+    cursor = models.CharField(max_length=1024, blank=True)
+    pass_started_at = models.DateTimeField(null=True, blank=True)
+    last_completed_at = models.DateTimeField(null=True, blank=True)
+    scanned = models.PositiveBigIntegerField(default=0)
+    quarantined = models.PositiveBigIntegerField(default=0)
+    deleted = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} @ {self.cursor or '<start>'}"
+
+class SearchTerm(models.Model):
+    """
+    Normalized word or trigram of an indexed entity, weighted by its source field
+    (see sharedapp.search)
+    """
+    content_type = models.ForeignKey('contenttypes.ContentType', on_delete=models.CASCADE)
+    object_id = models.CharField(max_length=64)
+    kind = models.CharField(max_length=1, choices=SearchTermKind.CHOICES)
+    token = models.CharField(max_length=64)
+    weight = models.PositiveSmallIntegerField(default=1)
+
+    class Meta:
+        indexes = [
+            # Index couvrant: les recherches ne lisent jamais la table
+            models.Index(fields=['kind', 'token', 'content_type', 'object_id', 'weight']),
+            models.Index(fields=['object_id', 'content_type']),  # réindexation d'un objet
+        ]
+
+    def __str__(self):
+        return f"{self.token} ({self.kind}) -> {self.content_type_id}:{self.object_id}"
+
+class DuplicateCandidate(models.Model):
+    """
+    Pair of shareholders of the same type found similar by the duplicate detector
+    (see sharedapp.duplicates), queued for review; first_id < second_id
+    """
+    content_type = models.ForeignKey('contenttypes.ContentType', on_delete=models.CASCADE)
+    first_id = models.CharField(max_length=64)
+    second_id = models.CharField(max_length=64)
+    score = models.FloatField()
+    reasons = models.JSONField(default=dict)  # similarity per criterion and shared blocking keys
+    status = models.CharField(max_length=10, choices=DuplicateStatus.CHOICES, default=DuplicateStatus.PENDING)
+    reviewed_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='reviewed_duplicates')
+    reviewed_at = models.DateTimeField(null=True, blank=True)
+    detected_at = models.DateTimeField()  # last detection run that found the pair
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['first_id', 'second_id', 'content_type'], name='unique_duplicate_pair'),
+        ]
+        indexes = [
+            models.Index(fields=['status', '-score']),
+            models.Index(fields=['second_id']),  # paires d'un actionnaire (first_id: via la contrainte)
+        ]
+
+    def __str__(self):
+        return f"{self.first_id} ~ {self.second_id} ({self.score:.2f}, {self.status})"
+
 class Dividend(models.Model):
     """
     Model for shareholder dividends
     """
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
     general_assembly_date = models.DateField()
-    general_assembly_minutes = models.FileField(upload_to='assembly_minutes/')
+    general_assembly_minutes = models.FileField(upload_to='assembly_minutes/', db_index=True)
     total_dividend_amount = models.DecimalField(max_digits=15, decimal_places=2) # le montant total des dividends
     dividend_per_share = models.DecimalField(max_digits=10, decimal_places=2) # le dividende par action
     payment_date = models.DateField()
@@ -109,7 +310,7 @@ class Dividend(models.Model):
     issuing_company = models.ForeignKey('issuingCompany.IssuingCompany', on_delete=models.CASCADE, related_name='dividends') # la société emetteur
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
-    history = HistoricalRecords() 
+    history = IndexedHistoricalRecords(indexes=[('issuing_company', 'history_date')]) 
 
     def clean(self):
         if self.payment_date <= self.general_assembly_date:
@@ -129,3 +330,36 @@ class Dividend(models.Model):
 
     def __str__(self):
         return f"Dividend {self.general_assembly_date} - {self.total_dividend_amount}"
+
+class UploadSession(models.Model):
+    """
+    Resumable chunked upload: chunks are written in place into a staging file,
+    and the completed file is published to the blob store
+    """
+    id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='upload_sessions')
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    chunk_size = models.PositiveIntegerField()
+    chunks = models.JSONField(default=dict)  # {index: sha256 of the received chunk}
+    sha256 = models.CharField(max_length=64, blank=True)  # expected by the client, then computed
+    status = models.CharField(max_length=20, choices=UploadStatus.CHOICES, default=UploadStatus.OPEN)
+    blob_name = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'expires_at']),
+        ]
+
+    @property
+    def chunk_count(self):
+        return -(-self.size // self.chunk_size)
+
+    @property
+    def extension(self):
+        return os.path.splitext(self.filename)[1].lower()
+
+    def __str__(self):
+        return f"{self.filename} ({len(self.chunks)}/{self.chunk_count}) - {self.status}"
@@ -0,0 +1,351 @@
+# notifications.py
+import logging
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from shareholders.constants import KeycloakRoles
+from shareholders.models import KeycloakUser
+
+from .constants import NotificationStatus, NotificationType
+from .events import publish_events
+from .models import Notification, NotificationCounter, NotificationDigest, NotificationJob
+
+logger = logging.getLogger(__name__)
+
+
+# Rôle attendu pour l'étape suivante du workflow, selon le nouveau statut
+NEXT_ROLES = {
+    'SUBMITTED': [KeycloakRoles.EXAMINER],
+    'EXAMINED': [KeycloakRoles.APPROVER],
+}
+
+
+def create_notifications(recipient_ids, title, description, notification_type=NotificationType.EMAIL):
+    """
+    Crée une notification par destinataire en une seule requête INSERT
+    """
+    notifications = [
+        Notification(
+            recipient_id=recipient_id,
+            title=title,
+            description=description,
+            type=notification_type
+        )
+        for recipient_id in recipient_ids
+    ]
+    per_recipient = Counter(notification.recipient_id for notification in notifications)
+    with transaction.atomic():
+        if digest_settings()['ENABLED']:
+            digest_ids = attach_to_digests(per_recipient, notification_type)
+            for notification in notifications:
+                notification.digest_id = digest_ids[notification.recipient_id]
+        created = Notification.objects.bulk_create(notifications, batch_size=500)
+        increment_unread(per_recipient)
+        publish_events('notification', {
+            notification.recipient_id: {
+                'id': str(notification.id),
+                'title': notification.title,
+                'type': notification.type,
+            }
+            for notification in created
+        })
+    return created
+
+
+def _increment_grouped(queryset, field, counts):
+    """
+    Applique `field += n` pour chaque clé primaire de `counts` ({pk: n}),
+    en une requête UPDATE par valeur d'incrément distincte
+    """
+    by_increment = defaultdict(list)
+    for pk, count in counts.items():
+        by_increment[count].append(pk)
+    for count, pks in by_increment.items():
+        queryset.filter(pk__in=pks).update(**{field: F(field) + count})
+
+
+def increment_unread(counts):
+    """
+    Incrémente les compteurs de non lus, `counts` étant {user_id: nombre}
+    """
+    counts = {user_id: count for user_id, count in counts.items() if count}
+    if not counts:
+        return
+    NotificationCounter.objects.bulk_create(
+        [NotificationCounter(user_id=user_id) for user_id in counts],
+        ignore_conflicts=True
+    )
+    _increment_grouped(NotificationCounter.objects.all(), 'unread_count', counts)
+
+
+def decrement_unread(user_id, count=1):
+    """
+    Décrémente le compteur de non lus d'un utilisateur
+    """
+    if count:
+        NotificationCounter.objects.filter(user_id=user_id).update(
+            unread_count=F('unread_count') - count
+        )
+
+
+def get_unread_count(user_id):
+    """
+    Lecture du compteur par clé primaire
+    """
+    count = NotificationCounter.objects.filter(pk=user_id).values_list('unread_count', flat=True).first()
+    return max(count or 0, 0)
+
+
+def reconcile_unread_counters(batch_size=1000):
+    """
+    Recalcule les compteurs qui ont dérivé du nombre réel de notifications non lues.
+    La correction se fait par un UPDATE avec sous-requête pour ne pas écraser
+    un incrément concurrent. Retourne le nombre de compteurs corrigés.
+    """
+    actual = dict(
+        Notification.objects.filter(is_read=False).order_by()
+        .values_list('recipient').annotate(count=Count('id'))
+    )
+    stored = dict(NotificationCounter.objects.values_list('user_id', 'unread_count').iterator())
+
+    NotificationCounter.objects.bulk_create(
+        [NotificationCounter(user_id=user_id) for user_id in actual.keys() - stored.keys()],
+        batch_size=batch_size,
+        ignore_conflicts=True
+    )
+    drifted = [
+        user_id for user_id in actual.keys() | stored.keys()
+        if actual.get(user_id, 0) != stored.get(user_id)
+    ]
+    unread_subquery = Subquery(
+        Notification.objects.filter(recipient=OuterRef('user_id'), is_read=False).order_by()
+        .values('recipient').annotate(count=Count('id')).values('count'),
+        output_field=IntegerField()
+    )
+    for start in range(0, len(drifted), batch_size):
+        NotificationCounter.objects.filter(user_id__in=drifted[start:start + batch_size]).update(
+            unread_count=Coalesce(unread_subquery, Value(0))
+        )
+    return len(drifted)
+
+
+def digest_settings():
+    return {
+        'ENABLED': False,
+        'WINDOW_SECONDS': 300,
+        'MAX_LISTED': 20,
+        **getattr(settings, 'NOTIFICATION_DIGEST', {}),
+    }
+
+
+def attach_to_digests(per_recipient, notification_type):
+    """
+    Retourne {recipient_id: digest_id} en réutilisant le digest ouvert de chaque
+    destinataire pour ce canal, ou en ouvrant une nouvelle fenêtre
+    """
+    now = timezone.now()
+    digest_ids = dict(
+        NotificationDigest.objects.filter(
+            recipient_id__in=per_recipient,
+            type=notification_type,
+            status=NotificationStatus.PENDING,
+            window_end__gt=now
+        ).order_by('window_end').values_list('recipient_id', 'id')
+    )
+    window_end = now + timedelta(seconds=digest_settings()['WINDOW_SECONDS'])
+    new_digests = NotificationDigest.objects.bulk_create([
+        NotificationDigest(recipient_id=recipient_id, type=notification_type, window_end=window_end)
+        for recipient_id in per_recipient.keys() - digest_ids.keys()
+    ])
+    digest_ids.update((digest.recipient_id, digest.id) for digest in new_digests)
+    _increment_grouped(
+        NotificationDigest.objects.all(),
+        'notification_count',
+        {digest_ids[recipient_id]: count for recipient_id, count in per_recipient.items()}
+    )
+    return digest_ids
+
+
+def build_digest_message(digest, titles):
+    """
+    Fusionne les titres des notifications d'un digest en un seul message
+    """
+    count = digest.notification_count
+    title = f"{count} nouvelle(s) notification(s)"
+    lines = [f"- {notification_title}" for notification_title in titles]
+    if count > len(titles):
+        lines.append(f"... et {count - len(titles)} autre(s)")
+    return title, "\n".join(lines)
+
+
+def flush_notification_digests(now=None, batch_size=200):
+    """
+    Envoie les digests dont la fenêtre est close: un message par digest,
+    et passe les notifications regroupées au statut SENT.
+    Retourne le nombre de digests envoyés.
+    """
+    now = now or timezone.now()
+    max_listed = digest_settings()['MAX_LISTED']
+    sent = 0
+    while True:
+        digests = list(
+            NotificationDigest.objects.filter(
+                status=NotificationStatus.PENDING, window_end__lte=now
+            ).order_by('window_end')[:batch_size]
+        )
+        if not digests:
+            return sent
+
+        titles = defaultdict(list)
+        notifications = (
+            Notification.objects.filter(digest__in=digests)
+            .order_by('digest_id', 'date_created')
+            .values_list('digest_id', 'title')
+        )
+        for digest_id, title in notifications.iterator():
+            if len(titles[digest_id]) < max_listed:
+                titles[digest_id].append(title)
+
+        with transaction.atomic():
+            for digest in digests:
+                digest.title, digest.description = build_digest_message(digest, titles[digest.id])
+                digest.status = NotificationStatus.SENT
+                digest.date_sent = now
+                logger.info(f"Digest {digest.id} sent to user {digest.recipient_id} via {digest.type}")
+            NotificationDigest.objects.bulk_update(digests, ['title', 'description', 'status', 'date_sent'])
+            Notification.objects.filter(digest__in=digests, status=NotificationStatus.PENDING).update(
+                status=NotificationStatus.SENT, date_sent=now
+            )
+        sent += len(digests)
+
+
+def _recipient_ids(roles, creator_ids, actor_id):
+    recipient_ids = set(KeycloakUser.user_ids_with_roles(roles)) if roles else set()
+    recipient_ids.update(creator_id for creator_id in creator_ids if creator_id)
+    recipient_ids.discard(actor_id)
+    return recipient_ids
+
+
+def get_transition_recipients(instance, actor, roles=None):
+    """
+    Destinataires d'une transition: les utilisateurs du rôle suivant et le créateur,
+    sans l'auteur de l'action
+    """
+    if roles is None:
+        roles = NEXT_ROLES.get(instance.status, [])
+    return _recipient_ids(roles, [getattr(instance, 'created_by_id', None)], actor.pk)
+
+
+def enqueue_fan_out(title, description, roles, creator_ids, actor, status_event):
+    """
+    Met en file la diffusion d'une transition, dans la transaction de celle-ci: la requête
+    n'attend ni la résolution des destinataires ni la création des notifications, et une
+    transition annulée n'est pas diffusée
+    """
+    NotificationJob.objects.create(payload={
+        'title': title,
+        'description': description,
+        'roles': list(roles),
+        'creator_ids': sorted({creator_id for creator_id in creator_ids if creator_id}),
+        'actor_id': actor.pk,
+        'status_event': status_event,
+    })
+
+
+def fan_out(payload):
+    """
+    Diffuse une transition mise en file: notifications des destinataires et événement de
+    statut pour eux et pour l'auteur
+    """
+    recipient_ids = _recipient_ids(payload['roles'], payload['creator_ids'], payload['actor_id'])
+    if recipient_ids:
+        create_notifications(recipient_ids, payload['title'], payload['description'])
+    publish_events('status', {
+        user_id: payload['status_event'] for user_id in recipient_ids | {payload['actor_id']}
+    })
+
+
+def dispatch_notification_jobs(batch_size=None):
+    """
+    Traite les diffusions en file par lots, dans l'ordre d'enregistrement. Les lots sont
+    verrouillés (SKIP LOCKED) pour que plusieurs workers se les partagent; un travail en
+    échec est conservé avec son erreur et retenté au passage suivant.
+    Retourne (diffusions effectuées, échecs).
+    """
+    config = settings.NOTIFICATION_QUEUE
+    batch_size = batch_size or config['BATCH_SIZE']
+    done = failed = 0
+    last_id = 0
+    while True:
+        with transaction.atomic():
+            jobs = list(
+                NotificationJob.objects.select_for_update(skip_locked=True)
+                .filter(attempts__lt=config['MAX_ATTEMPTS'], id__gt=last_id).order_by('id')[:batch_size]
+            )
+            if not jobs:
+                return done, failed
+            last_id = jobs[-1].pk
+            errors = []
+            for job in jobs:
+                try:
+                    with transaction.atomic():
+                        fan_out(job.payload)
+                except Exception as e:
+                    logger.error(f"Notification job {job.pk} failed: {str(e)}")
+                    job.attempts += 1
+                    job.last_error = str(e)
+                    errors.append(job)
+            NotificationJob.objects.filter(pk__in=[job.pk for job in jobs if job not in errors]).delete()
+            NotificationJob.objects.bulk_update(errors, ['attempts', 'last_error'])
+        done += len(jobs) - len(errors)
+        failed += len(errors)
+
+
+def notify_status_change(instance, actor, comments='', roles=None):
+    """
+    Met en file la notification d'un changement de statut (voir enqueue_fan_out)
+    """
+    model_name = str(instance._meta.verbose_name).capitalize()
+    status_label = instance.get_status_display()
+    title = f"{model_name} : {status_label}"[:200]
+    description = f"{instance} est passé au statut {status_label} par {actor.username}."
+    if comments:
+        description = f"{description}\n{comments}"
+
+    status_event = {
+        'model': instance._meta.label_lower,
+        'id': str(instance.pk),
+        'status': instance.status,
+    }
+    if roles is None:
+        roles = NEXT_ROLES.get(instance.status, [])
+    enqueue_fan_out(title, description, roles, [getattr(instance, 'created_by_id', None)], actor, status_event)
+
+
+def notify_bulk_status_change(instances, actor, comments=''):
+    """
+    Met en file la notification d'une transition groupée: une seule notification par
+    destinataire pour l'ensemble des objets
+    """
+    if not instances:
+        return
+    first = instances[0]
+    status_label = first.get_status_display()
+    title = f"{str(first._meta.verbose_name_plural).capitalize()} : {len(instances)} {status_label}"[:200]
+    description = f"{len(instances)} élément(s) sont passés au statut {status_label} par {actor.username}."
+    if comments:
+        description = f"{description}\n{comments}"
+
+    status_event = {
+        'model': first._meta.label_lower,
+        'ids': [str(instance.pk) for instance in instances],
+        'status': first.status,
+    }
+    creator_ids = [getattr(instance, 'created_by_id', None) for instance in instances]
+    enqueue_fan_out(title, description, NEXT_ROLES.get(first.status, []), creator_ids, actor, status_event)
@@ -0,0 +1,315 @@
+# responsecache.py
+"""
+Cache des réponses des actions coûteuses (statistiques, échéanciers). Une réponse est rangée
+sous une clé (endpoint, paramètres, empreinte de visibilité de l'utilisateur) avec les
+versions de ses étiquettes lors du calcul; chaque enregistrement ou suppression d'un modèle
+étiqueté (ou mise à jour par queryset.update() signalée par invalidate_updated) remplace la version de ses étiquettes (modèle, et modèle pour la société émettrice)
+dans un cache partagé par tous les processus, ce qui périme les réponses concernées.
+Une réponse manquante ou périmée n'est calculée qu'une fois pour toutes les requêtes
+identiques simultanées (single-flight).
+"""
+import copy
+import functools
+import hashlib
+import json
+import threading
+import time
+import uuid
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import EmptyResultSet, ImproperlyConfigured
+from django.db import connection, transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+from .singleflight import SingleFlight, shared_flight
+
+# Modèles dont l'enregistrement ou la suppression invalide les réponses étiquetées
+CACHE_TAG_MODELS = [
+    'shareholders.PhysicalShareholder',
+    'shareholders.LegalShareholder',
+    'sharedapp.Dividend',
+]
+COMPANY_FIELD = 'issuing_company_id'
+TAG_PREFIX = 'response-tag:'
+STATS_PREFIX = 'response-stats:'
+STATS_ENDPOINTS = f'{STATS_PREFIX}endpoints'
+# '' (aucun regroupement), 'process' (dans chaque worker) ou 'cache' (entre workers, via VERSIONS_CACHE)
+SINGLE_FLIGHT_MODES = ('', 'process', 'cache')
+
+# Calculs de réponses en cours dans ce processus
+flights = SingleFlight()
+
+
+def _versions_cache():
+    return caches[settings.RESPONSE_CACHE['VERSIONS_CACHE']]
+
+
+def model_tags(label, company_id=None):
+    """
+    Etiquettes d'une réponse portant sur un modèle, éventuellement restreinte à une société
+    """
+    return [f'company:{label}:{company_id}'] if company_id else [f'model:{label}']
+
+
+def tag_versions(tags):
+    """
+    Versions courantes des étiquettes, lues en un seul aller-retour; une étiquette
+    inconnue reçoit une version (add: la première écriture concurrente l'emporte)
+    """
+    store = _versions_cache()
+    keys = [TAG_PREFIX + tag for tag in tags]
+    versions = store.get_many(keys)
+    for key in set(keys) - set(versions):
+        store.add(key, uuid.uuid4().hex, None)
+        versions[key] = store.get(key)
+    return [versions[key] for key in keys]
+
+
+def invalidate_tags(tags):
+    """
+    Remplace la version des étiquettes par une valeur nouvelle (et non incrémentée:
+    deux invalidations simultanées ne peuvent pas écrire la même version)
+    """
+    _versions_cache().set_many({TAG_PREFIX + tag: uuid.uuid4().hex for tag in tags}, None)
+
+
+def visibility_fingerprint(view):
+    """
+    Empreinte de ce que l'utilisateur voit: la requête SQL du queryset de la vue, où
+    figurent les filtres dus à ses rôles (et son identifiant s'ils en dépendent)
+    """
+    try:
+        sql, params = view.get_queryset().query.sql_with_params()
+    except EmptyResultSet:
+        return 'none'
+    return hashlib.sha1(repr((sql, params)).encode()).hexdigest()
+
+
+def record_lookup(endpoint, hit):
+    """
+    Compteurs partagés de succès et d'échecs par endpoint (approximatifs: incr n'est pas
+    atomique sur tous les backends)
+    """
+    store = _versions_cache()
+    key = f"{STATS_PREFIX}{endpoint}:{'hits' if hit else 'misses'}"
+    if store.add(key, 1, None):
+        endpoints = store.get(STATS_ENDPOINTS, set())
+        if endpoint not in endpoints:
+            store.set(STATS_ENDPOINTS, endpoints | {endpoint}, None)
+        return
+    try:
+        store.incr(key)
+    except ValueError:  # clé expirée entre add et incr
+        store.add(key, 1, None)
+
+
+def cache_statistics():
+    """
+    {endpoint: {'hits', 'misses', 'hit_ratio'}} depuis le démarrage du cache partagé
+    """
+    store = _versions_cache()
+    statistics = {}
+    for endpoint in sorted(store.get(STATS_ENDPOINTS, set())):
+        hits = store.get(f'{STATS_PREFIX}{endpoint}:hits', 0)
+        misses = store.get(f'{STATS_PREFIX}{endpoint}:misses', 0)
+        statistics[endpoint] = {
+            'hits': hits, 'misses': misses,
+            'hit_ratio': round(hits / (hits + misses), 3) if hits + misses else None,
+        }
+    return statistics
+
+
+def cache_key(view, request):
+    params = sorted((name, sorted(values)) for name, values in request.query_params.lists())
+    key = json.dumps([params, request.accepted_renderer.format, visibility_fingerprint(view)])
+    return f'response:{view.basename}.{view.action}:{hashlib.sha1(key.encode()).hexdigest()}'
+
+
+def _compute_entry(method, view, request, args, kwargs, key, versions):
+    """
+    Exécute l'action et range sa réponse, si elle est valide, avec les versions lues avant le
+    calcul: une invalidation survenue pendant le calcul rend l'entrée aussitôt périmée
+    """
+    config = settings.RESPONSE_CACHE
+    response = method(view, request, *args, **kwargs)
+    # Querysets et décimaux évalués une fois: réponse fraîche identique à la réponse en cache
+    data = json.loads(json.dumps(response.data, cls=JSONEncoder))
+    entry = {'versions': versions, 'data': data, 'status': response.status_code, 'computed_at': time.time()}
+    if response.status_code == 200:
+        caches[config['CACHE']].set(key, entry, config['TIMEOUT'])
+    return entry
+
+
+def _single_flight_mode():
+    mode = settings.RESPONSE_CACHE['SINGLE_FLIGHT']
+    if mode not in SINGLE_FLIGHT_MODES:
+        raise ImproperlyConfigured(f"RESPONSE_CACHE['SINGLE_FLIGHT'] must be one of {SINGLE_FLIGHT_MODES}")
+    return mode
+
+
+def _flight(mode, flight_key, compute):
+    """
+    (entrée, calculée par cet appelant): calcul partagé entre les processus si SINGLE_FLIGHT
+    vaut 'cache', local sinon
+    """
+    config = settings.RESPONSE_CACHE
+    if mode == 'cache':
+        return shared_flight(_versions_cache(), flight_key, compute, config['WAIT_TIMEOUT'], config['POLL_INTERVAL'])
+    return compute(), True
+
+
+def _store_shared(key, entry, computed):
+    if not computed and entry['status'] == 200:
+        # Entrée calculée par un autre processus: rangée aussi dans le cache de celui-ci
+        config = settings.RESPONSE_CACHE
+        caches[config['CACHE']].set(key, entry, config['TIMEOUT'])
+
+
+def _coalesced(key, flight_key, compute):
+    """
+    (entrée, calculée par cet appelant): une seule exécution à la fois par clé dans le
+    processus, et entre les processus si SINGLE_FLIGHT vaut 'cache'
+    """
+    mode = _single_flight_mode()
+    if not mode:
+        return compute(), True
+    (entry, computed), leader = flights.do(
+        flight_key, lambda: _flight(mode, flight_key, compute), settings.RESPONSE_CACHE['WAIT_TIMEOUT']
+    )
+    _store_shared(key, entry, computed)
+    return entry, leader and computed
+
+
+def _detached(view, request):
+    """
+    Vue et requête neuves, reconstruites depuis celles de la requête en cours, pour un calcul
+    qui se poursuit après sa réponse: l'utilisateur déjà authentifié, les paramètres et le
+    format négocié sont repris, sans réutiliser les objets de la requête terminée
+    """
+    http_request = copy.copy(request._request)
+    http_request.GET = request._request.GET.copy()
+    fresh_view = copy.copy(view)
+    fresh_view.args, fresh_view.kwargs, fresh_view.headers = view.args, dict(view.kwargs), {}
+    fresh_request = fresh_view.initialize_request(http_request, *view.args, **view.kwargs)
+    fresh_request.user, fresh_request.auth = request.user, request.auth
+    fresh_request.accepted_renderer = request.accepted_renderer
+    fresh_request.accepted_media_type = request.accepted_media_type
+    fresh_view.request = fresh_request
+    return fresh_view, fresh_request
+
+
+def _refresh_in_background(key, flight_key, compute, view, request):
+    """
+    Recalcule une entrée périmée dans un thread, sur une copie de la vue et de la requête.
+    La clé est réservée avant le lancement du thread: un seul recalcul à la fois par clé
+    dans le processus, auquel se joignent les requêtes identiques non servies périmées.
+    """
+    mode = _single_flight_mode()
+    recompute = functools.partial(compute, *_detached(view, request))
+    flight = flights.claim(flight_key)
+    if flight is None:
+        return
+
+    def refresh():
+        try:
+            entry, computed = flights.run(flight_key, flight, lambda: _flight(mode, flight_key, recompute))
+            _store_shared(key, entry, computed)
+        finally:
+            connection.close()
+
+    threading.Thread(target=refresh, daemon=True).start()
+
+
+def cached_response(*labels, company_param=None):
+    """
+    Décorateur d'action GET de ViewSet (sous @action): réponse mise en cache et étiquetée par
+    les modèles `labels` (par défaut celui de la vue). Si l'action filtre sur la société
+    émettrice passée dans le paramètre `company_param`, la réponse n'est étiquetée que pour
+    cette société et n'est pas invalidée par les changements des autres.
+    Les requêtes identiques simultanées partagent un seul calcul; une réponse invalidée depuis
+    moins de STALE_SECONDS est servie pendant son recalcul en arrière-plan.
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(view, request, *args, **kwargs):
+            config = settings.RESPONSE_CACHE
+            if not config['ENABLED']:
+                return method(view, request, *args, **kwargs)
+            models = labels or [view.queryset.model._meta.label]
+            if set(models) - set(CACHE_TAG_MODELS):
+                raise ImproperlyConfigured(f"Add {', '.join(models)} to CACHE_TAG_MODELS to cache {method.__name__}")
+            company_id = request.query_params.get(company_param) if company_param else None
+            tags = [tag for label in models for tag in model_tags(label, company_id)]
+
+            endpoint = f'{view.basename}.{view.action}'
+            key = cache_key(view, request)
+            versions = tag_versions(tags)
+            entry = caches[config['CACHE']].get(key)
+            fresh = entry is not None and entry['versions'] == versions
+            stale = not fresh and entry is not None and time.time() - entry['computed_at'] < config['STALE_SECONDS']
+            record_lookup(endpoint, hit=fresh or stale)
+            if fresh:
+                return Response(entry['data'], headers={'X-Cache': 'HIT'})
+
+            flight_key = f"{key}:{hashlib.sha1(json.dumps(versions).encode()).hexdigest()}"
+
+            def compute(view, request):
+                return _compute_entry(method, view, request, args, kwargs, key, versions)
+
+            if stale:
+                _refresh_in_background(key, flight_key, compute, view, request)
+                return Response(entry['data'], headers={'X-Cache': 'STALE'})
+            entry, computed = _coalesced(key, flight_key, lambda: compute(view, request))
+            return Response(entry['data'], status=entry['status'], headers={'X-Cache': 'MISS' if computed else 'SHARED'})
+        return wrapper
+    return decorator
+
+
+def _instance_tags(instance, company_ids):
+    label = instance._meta.label
+    return [f'model:{label}'] + [f'company:{label}:{company_id}' for company_id in company_ids if company_id]
+
+
+def invalidate_updated(model, company_ids=()):
+    """
+    Invalidation, après validation de la transaction, des réponses étiquetées par un modèle
+    modifié par queryset.update() (qui n'émet pas post_save) pour les sociétés company_ids
+    """
+    if model._meta.label not in CACHE_TAG_MODELS:
+        return
+    tags = _instance_tags(model, set(company_ids))
+    transaction.on_commit(lambda: invalidate_tags(tags))
+
+
+def _remember_company(sender, instance, raw=False, **kwargs):
+    # Société avant modification: une fiche qui change de société invalide les deux
+    if not raw and not instance._state.adding and hasattr(instance, COMPANY_FIELD):
+        instance._cached_company_id = sender._base_manager.filter(pk=instance.pk).values_list(
+            COMPANY_FIELD, flat=True
+        ).first()
+
+
+def _invalidate_on_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    company_ids = {getattr(instance, COMPANY_FIELD, None), getattr(instance, '_cached_company_id', None)}
+    tags = _instance_tags(instance, company_ids)
+    transaction.on_commit(lambda: invalidate_tags(tags))
+
+
+def _invalidate_on_delete(sender, instance, **kwargs):
+    tags = _instance_tags(instance, {getattr(instance, COMPANY_FIELD, None)})
+    transaction.on_commit(lambda: invalidate_tags(tags))
+
+
+def connect_response_cache_signals():
+    for label in CACHE_TAG_MODELS:
+        model = apps.get_model(label)
+        uid = f'response_cache_{model._meta.label_lower}'
+        pre_save.connect(_remember_company, sender=model, dispatch_uid=uid)
+        post_save.connect(_invalidate_on_save, sender=model, dispatch_uid=uid)
+        post_delete.connect(_invalidate_on_delete, sender=model, dispatch_uid=uid)
@@ -0,0 +1,309 @@
+# search.py
+"""
+Index de recherche dans une table annexe (SearchTerm): chaque entité indexée y est décrite
+par ses mots normalisés (sans accents ni ponctuation, en minuscules) et leurs trigrammes,
+pondérés selon le champ d'origine. Les recherches exacte et par préfixe sont des lectures
+par plage d'un index couvrant (kind, token, ...) et fonctionnent sur MySQL comme sur SQLite;
+les trigrammes servent à la recherche approchée (fautes de frappe).
+"""
+import math
+import unicodedata
+from collections import defaultdict
+
+from django.apps import apps
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.db.models.signals import post_delete, post_save
+from rest_framework import filters
+
+from .constants import SearchTermKind
+from .models import SearchTerm
+
+MAX_TOKEN_LENGTH = 64
+# Les mots plus courts de la requête ne sont cherchés qu'à l'identique: un préfixe de deux
+# lettres couvre une grande part des références et identifiants
+MIN_PREFIX_LENGTH = 3
+# Lignes de l'index lues au plus par terme de la requête (mot exact, préfixe ou trigramme)
+MAX_TERMS_PER_TOKEN = 2000
+# Part minimale des trigrammes de la requête présents dans une entité (recherche approchée)
+FUZZY_THRESHOLD = 0.5
+INDEX_BATCH_SIZE = 500
+# Entrées du classement filtrées par page pour trouver les résultats visibles
+RANKING_PAGE_SIZE = 200
+
+# {modèle indexé: {champ ou chemin de relation: poids}}
+SEARCH_INDEXES = {
+    'shareholders.PhysicalShareholder': {
+        'reference_number': 5,
+        'national_id': 5,
+        'contact_person__last_name': 4,
+        'contact_person__first_name': 4,
+        'contact_person__email': 3,
+        'activity_sector': 1,
+    },
+    'shareholders.LegalShareholder': {
+        'company_name': 5,
+        'reference_number': 5,
+        'registration_number': 5,
+        'tax_id': 5,
+        'legal_representative': 3,
+        'representative_email': 3,
+        'activity_sector': 1,
+    },
+    'issuingCompany.IssuingCompany': {
+        'name': 5,
+        'ninea': 5,
+        'legal': 1,
+    },
+    'shareholders.ContactPerson': {
+        'last_name': 4,
+        'first_name': 4,
+        'email': 3,
+        'phone': 3,
+    },
+}
+
+# {modèle lié: {modèle indexé: champ pointant vers le modèle lié}}: réindexation en cascade
+SEARCH_DEPENDENCIES = {
+    'shareholders.ContactPerson': {
+        'shareholders.PhysicalShareholder': 'contact_person',
+    },
+}
+
+
+def normalize(text):
+    """
+    Minuscules sans accents; tout caractère non alphanumérique devient un espace
+    """
+    text = unicodedata.normalize('NFKD', str(text)).encode('ascii', 'ignore').decode('ascii').lower()
+    return ''.join(char if char.isalnum() else ' ' for char in text)
+
+
+def tokenize(text):
+    """
+    Mots normalisés d'un texte; un identifiant composé (« SN-DKR-2024-B-123 ») donne aussi
+    sa forme compacte (« sndkr2024b123 ») pour les numéros saisis sans séparateurs
+    """
+    words = [word[:MAX_TOKEN_LENGTH] for word in normalize(text).split()]
+    if len(words) > 1 and any(char.isdigit() for char in text):
+        words.append(''.join(words)[:MAX_TOKEN_LENGTH])
+    return words
+
+
+def trigrams(word):
+    """
+    Trigrammes du mot entouré d'espaces (comme pg_trgm), pour que début et fin de mot comptent
+    """
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def index_terms(values):
+    """
+    {(kind, token): poids} pour des valeurs [(texte, poids)]; un token présent dans
+    plusieurs champs garde le poids le plus fort
+    """
+    terms = {}
+    for text, weight in values:
+        if not text:
+            continue
+        for word in tokenize(text):
+            for key in [(SearchTermKind.WORD, word)] + [(SearchTermKind.TRIGRAM, gram) for gram in trigrams(word)]:
+                terms[key] = max(terms.get(key, 0), weight)
+    return terms
+
+
+def index_objects(model, pks):
+    """
+    (Ré)indexe les objets donnés du modèle: suppression puis réinsertion de leurs termes
+    """
+    fields = SEARCH_INDEXES[model._meta.label]
+    content_type = ContentType.objects.get_for_model(model)
+    pks = list(pks)
+    for start in range(0, len(pks), INDEX_BATCH_SIZE):
+        chunk = pks[start:start + INDEX_BATCH_SIZE]
+        rows = []
+        for values in model._base_manager.filter(pk__in=chunk).values('pk', *fields):
+            terms = index_terms((values[field], weight) for field, weight in fields.items())
+            rows.extend(
+                SearchTerm(content_type=content_type, object_id=str(values['pk']), kind=kind, token=token, weight=weight)
+                for (kind, token), weight in terms.items()
+            )
+        with transaction.atomic():
+            SearchTerm.objects.filter(content_type=content_type, object_id__in=[str(pk) for pk in chunk]).delete()
+            SearchTerm.objects.bulk_create(rows, batch_size=1000)
+
+
+def remove_objects(model, pks):
+    SearchTerm.objects.filter(
+        content_type=ContentType.objects.get_for_model(model), object_id__in=[str(pk) for pk in pks]
+    ).delete()
+
+
+def _prefix_range(word):
+    # Les tokens ne contiennent que [a-z0-9]: la borne haute est le préfixe « incrémenté »
+    return Q(token__gte=word, token__lt=word[:-1] + chr(ord(word[-1]) + 1))
+
+
+def _capped(terms):
+    """
+    Au plus MAX_TERMS_PER_TOKEN lignes (content_type, object_id, token, poids), lues dans
+    l'ordre de l'index couvrant: une lecture par plage qui s'arrête à la limite
+    """
+    return terms.order_by('token', 'content_type', 'object_id').values_list(
+        'content_type', 'object_id', 'token', 'weight'
+    )[:MAX_TERMS_PER_TOKEN]
+
+
+def _word_scores(terms, words):
+    """
+    {(content_type, object_id): score} des mots exacts (poids doublé) et des préfixes (poids
+    simple), sommés sur les tokens trouvés
+    """
+    rows = set()
+    for word in words:
+        rows.update(_capped(terms.filter(kind=SearchTermKind.WORD, token=word)))
+        if len(word) >= MIN_PREFIX_LENGTH:
+            rows.update(_capped(terms.filter(Q(kind=SearchTermKind.WORD) & _prefix_range(word)).exclude(token=word)))
+    scores = defaultdict(int)
+    for content_type, object_id, token, weight in rows:
+        scores[(content_type, object_id)] += weight * 2 if token in words else weight
+    return scores
+
+
+def _fuzzy_scores(terms, words):
+    """
+    {(content_type, object_id): similarité} de la recherche approchée: part des trigrammes de
+    la requête présents dans l'entité (entre 0 et 1), au moins FUZZY_THRESHOLD
+    """
+    grams = set().union(*(trigrams(word) for word in words))
+    minimum = math.ceil(len(grams) * FUZZY_THRESHOLD)
+    hits = defaultdict(int)
+    for gram in grams:
+        for content_type, object_id, _, _ in _capped(terms.filter(kind=SearchTermKind.TRIGRAM, token=gram)):
+            hits[(content_type, object_id)] += 1
+    return {key: round(count / len(grams), 3) for key, count in hits.items() if count >= minimum}
+
+
+def _ranking(models, query):
+    """
+    [(modèle, object_id, score)] par (score décroissant, type de contenu, object_id)
+    """
+    words = list(dict.fromkeys(tokenize(query)))
+    if not words:
+        return []
+    content_types = ContentType.objects.get_for_models(*models)
+    models_by_id = {content_type.pk: model for model, content_type in content_types.items()}
+    terms = SearchTerm.objects.filter(content_type__in=list(models_by_id))
+    # Score de similarité (<= 1), toujours inférieur à celui d'un mot trouvé (>= poids 1)
+    scores = _word_scores(terms, words) or _fuzzy_scores(terms, words)
+    ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+    return [(models_by_id[content_type], object_id, score) for (content_type, object_id), score in ranked]
+
+
+def search_entities(models, query, limit=20, after=None):
+    """
+    Entités des modèles donnés correspondant à la requête, classées ensemble par pertinence
+    décroissante: [(modèle, object_id, score)]. Mots exacts puis préfixes, pondérés par le
+    champ où ils sont trouvés (score >= 1); si aucun mot ne correspond, recherche approchée
+    par trigrammes (score de similarité entre 0 et 1). Chaque terme ne fournit qu'au plus
+    MAX_TERMS_PER_TOKEN entités: un mot présent partout (« sn » des références) ne fait pas
+    lire toute la table. `after` (dernier résultat d'une page) lit la page suivante.
+    """
+    def key(hit):
+        model, object_id, score = hit
+        return -score, ContentType.objects.get_for_model(model).pk, object_id
+
+    ranking = _ranking(models, query)
+    if after is not None:
+        ranking = [hit for hit in ranking if key(hit) > key(after)]
+    return ranking[:limit]
+
+
+def search_index(model, query, limit=20):
+    """
+    [(object_id, score)] des objets du modèle correspondant à la requête (voir search_entities)
+    """
+    return [(object_id, score) for _, object_id, score in search_entities([model], query, limit)]
+
+
+def search_visible(querysets, query, limit=20):
+    """
+    Comme search_entities, restreint aux objets des querysets de visibilité {modèle: queryset}:
+    le classement, calculé une fois, est filtré par ces querysets page par page jusqu'à
+    `limit` résultats visibles
+    """
+    ranking = _ranking(list(querysets), query)
+    page_size = max(limit, RANKING_PAGE_SIZE)
+    results = []
+    for start in range(0, len(ranking), page_size):
+        page = ranking[start:start + page_size]
+        ids = defaultdict(list)
+        for model, object_id, _ in page:
+            ids[model].append(object_id)
+        visible = {
+            (model, str(pk))
+            for model, object_ids in ids.items()
+            for pk in querysets[model].filter(pk__in=object_ids).values_list('pk', flat=True)
+        }
+        results.extend(hit for hit in page if hit[:2] in visible)
+        if len(results) >= limit:
+            break
+    return results[:limit]
+
+
+class SearchIndexFilter(filters.BaseFilterBackend):
+    """
+    Remplace SearchFilter: le paramètre `search` interroge l'index (mots, préfixes,
+    recherche approchée) au lieu de LIKE '%terme%' sur chaque colonne; résultats par pertinence,
+    parmi les objets du queryset de la vue (les `max_results` premiers visibles)
+    """
+    search_param = 'search'
+    max_results = 500
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '').strip()
+        if not query:
+            return queryset
+        ranking = search_visible({queryset.model: queryset}, query, limit=self.max_results)
+        ids = [object_id for _, object_id, _ in ranking]
+        return queryset.filter(pk__in=ids).order_by(
+            Case(*[When(pk=object_id, then=Value(position)) for position, object_id in enumerate(ids)],
+                 output_field=IntegerField())
+        )
+
+
+def _reindex_on_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        transaction.on_commit(lambda: index_objects(sender, [instance.pk]))
+
+
+def _remove_on_delete(sender, instance, **kwargs):
+    # La clé est lue tout de suite: Django la remet à None après la suppression
+    pk = instance.pk
+    transaction.on_commit(lambda: remove_objects(sender, [pk]))
+
+
+def _reindex_dependents(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    for label, field in SEARCH_DEPENDENCIES[sender._meta.label].items():
+        model = apps.get_model(label)
+        pks = list(model._base_manager.filter(**{field: instance.pk}).values_list('pk', flat=True))
+        if pks:
+            transaction.on_commit(lambda model=model, pks=pks: index_objects(model, pks))
+
+
+def connect_search_index_signals():
+    """
+    Maintient l'index à jour à chaque enregistrement ou suppression
+    """
+    for label in SEARCH_INDEXES:
+        model = apps.get_model(label)
+        uid = f'search_index_{model._meta.label_lower}'
+        post_save.connect(_reindex_on_save, sender=model, dispatch_uid=uid)
+        post_delete.connect(_remove_on_delete, sender=model, dispatch_uid=uid)
+    for label in SEARCH_DEPENDENCIES:
+        model = apps.get_model(label)
+        post_save.connect(_reindex_dependents, sender=model, dispatch_uid=f'search_dependents_{model._meta.label_lower}')
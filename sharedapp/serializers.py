@@ -1,7 +1,11 @@
+import os
+import re
+
+from django.conf import settings
 from rest_framework import serializers
 
 from shareholders.serializers import UserSerializer
-from .models import Announcement, Notification, Dividend
+from .models import Announcement, Notification, Dividend, DuplicateCandidate, UploadSession
 from django.contrib.auth.models import User
 
 # Serializer pour les annonces
@@ -35,9 +39,9 @@ class NotificationSerializer(serializers.ModelSerializer):
         model = Notification
         fields = [
             'id', 'title', 'description', 'date_created',
-            'date_sent', 'type', 'recipient', 'is_read', 'status'
+            'date_sent', 'type', 'recipient', 'is_read', 'status', 'digest'
         ]
-        read_only_fields = ['date_created', 'date_sent']
+        read_only_fields = ['date_created', 'date_sent', 'digest']
 
     def validate(self, data):
         if data.get('date_sent') and data.get('date_created') and \
@@ -75,4 +79,65 @@ class DividendSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError(
                 "Total dividend amount must be greater than zero"
             )
-        return data
\ No newline at end of file
+        return data
+
+# Serializer pour les sessions d'upload par blocs
+class UploadSessionSerializer(serializers.ModelSerializer):
+    chunk_count = serializers.IntegerField(read_only=True)
+    received = serializers.SerializerMethodField()
+
+    class Meta:
+        model = UploadSession
+        fields = [
+            'id', 'filename', 'size', 'sha256', 'chunk_size', 'chunk_count',
+            'received', 'status', 'expires_at'
+        ]
+        read_only_fields = ['chunk_size', 'status', 'expires_at']
+
+    def get_received(self, session):
+        return sorted(int(index) for index in session.chunks)
+
+    def validate_filename(self, value):
+        from .uploads import FILE_SIGNATURES
+        if os.path.splitext(value)[1].lower() not in FILE_SIGNATURES:
+            raise serializers.ValidationError("Unsupported file type")
+        return value
+
+    def validate_size(self, value):
+        if not 0 < value <= settings.UPLOADS['MAX_SIZE']:
+            raise serializers.ValidationError(f"Must be between 1 and {settings.UPLOADS['MAX_SIZE']} bytes")
+        return value
+
+    def validate_sha256(self, value):
+        if value and not re.fullmatch(r'[0-9a-fA-F]{64}', value):
+            raise serializers.ValidationError("Must be a hex SHA-256 digest")
+        return value
+
+# Serializer pour la file de revue des doublons d'actionnaires
+class DuplicateCandidateSerializer(serializers.ModelSerializer):
+    type = serializers.SerializerMethodField()
+    first = serializers.SerializerMethodField()
+    second = serializers.SerializerMethodField()
+    reviewed_by = UserSerializer(read_only=True)
+
+    class Meta:
+        model = DuplicateCandidate
+        fields = [
+            'id', 'type', 'first_id', 'first', 'second_id', 'second', 'score', 'reasons',
+            'status', 'reviewed_by', 'reviewed_at', 'detected_at'
+        ]
+        read_only_fields = fields
+
+    def get_type(self, candidate):
+        return self.context['types'].get(candidate.content_type_id)
+
+    def get_first(self, candidate):
+        return self.shareholder_label(candidate, candidate.first_id)
+
+    def get_second(self, candidate):
+        return self.shareholder_label(candidate, candidate.second_id)
+
+    def shareholder_label(self, candidate, object_id):
+        # Fiches chargées en une requête par type (voir DuplicateCandidateViewSet); None si supprimée
+        instance = self.context['shareholders'].get((candidate.content_type_id, object_id))
+        return str(instance) if instance is not None else None
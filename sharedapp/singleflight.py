@@ -0,0 +1,103 @@
+# singleflight.py
+"""
+Regroupement des calculs identiques simultanés (single-flight): le premier appelant d'une clé
+calcule, les suivants attendent son résultat au lieu de refaire le même travail. Dans un
+processus, l'attente se fait sur un Event; entre processus, par un verrou (cache.add) dans un
+cache partagé où le premier appelant publie le résultat.
+"""
+import threading
+import time
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.failed = False
+
+
+class SingleFlight:
+    """
+    Calculs en cours dans le processus, par clé
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+
+    def in_flight(self, key):
+        return key in self._flights
+
+    def _join(self, key):
+        # (flight de la clé, créé par cet appelant)
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+        return flight, leader
+
+    def claim(self, key):
+        """
+        Réserve `key` pour l'appelant: flight à terminer par run(), ou None si un calcul
+        de cette clé est déjà en cours
+        """
+        flight, leader = self._join(key)
+        return flight if leader else None
+
+    def run(self, key, flight, compute):
+        """
+        Exécute le calcul d'un flight réservé par claim(), transmet son résultat (ou son
+        échec) aux appelants en attente et libère la clé
+        """
+        try:
+            flight.result = compute()
+        except BaseException:
+            flight.failed = True
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+        return flight.result
+
+    def do(self, key, compute, timeout):
+        """
+        (résultat, calculé par cet appelant). Un appelant qui attend plus de `timeout`
+        secondes, ou dont le calcul attendu a échoué, calcule lui-même.
+        """
+        flight, leader = self._join(key)
+        if leader:
+            return self.run(key, flight, compute), True
+        if flight.done.wait(timeout) and not flight.failed:
+            return flight.result, False
+        return compute(), True
+
+
+def shared_flight(store, key, compute, timeout, poll_interval):
+    """
+    Single-flight entre processus: le détenteur du verrou `key` dans `store` calcule et publie
+    le résultat (picklable) pendant `timeout` secondes; les autres interrogent le cache jusqu'à
+    sa publication. Verrou libéré sans résultat (échec) ou attente trop longue: calcul local.
+    """
+    lock, published = f'flight-lock:{key}', f'flight-result:{key}'
+    if store.add(lock, 1, timeout):
+        try:
+            result = compute()
+            store.set(published, result, timeout)
+        finally:
+            store.delete(lock)
+        return result, True
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        time.sleep(poll_interval)
+        result = store.get(published)
+        if result is not None:
+            return result, False
+        if not store.has_key(lock):
+            # Résultat publié juste avant la libération, ou calcul échoué
+            result = store.get(published)
+            if result is not None:
+                return result, False
+            break
+    return compute(), True
@@ -0,0 +1,307 @@
+# storage.py
+import hashlib
+import os
+import tempfile
+import threading
+import zlib
+from collections import Counter
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.db import models, transaction
+from django.core.signals import request_finished
+from django.db.models import F, Q
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.utils.deconstruct import deconstructible
+from simple_history.models import HistoricalChanges
+
+BLOB_PREFIX = 'blobs'
+CHUNK_SIZE = 64 * 1024
+
+# Références prises par publish() dans ce thread, pas encore reprises par un enregistrement
+_claims = threading.local()
+
+
+def blob_name(digest, extension):
+    """
+    Chemin d'un blob, réparti sur deux niveaux de répertoires: blobs/ab/cd/abcd...<ext>
+    """
+    return f"{BLOB_PREFIX}/{digest[:2]}/{digest[2:4]}/{digest}{extension.lower()}"
+
+
+def is_blob(name):
+    return bool(name) and name.startswith(f"{BLOB_PREFIX}/")
+
+
+def file_digest(content):
+    """
+    (sha256, taille, crc32) d'un fichier lu par blocs
+    """
+    digest, size, crc32 = hashlib.sha256(), 0, 0
+    for chunk in content.chunks(CHUNK_SIZE):
+        digest.update(chunk)
+        crc32 = zlib.crc32(chunk, crc32)
+        size += len(chunk)
+    return digest.hexdigest(), size, crc32
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Stockage adressé par contenu: chaque fichier est haché (SHA-256) pendant son écriture
+    et n'est conservé qu'une fois sous blobs/ab/cd/<sha256><ext>, quel que soit le nom envoyé.
+    Les références des FileField sont comptées dans StoredBlob; un blob n'est supprimé
+    que lorsqu'il n'est plus référencé, ni par une ligne courante ni par une version
+    historique (le ramasse-miettes le reprend après la purge de l'historique).
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # Le nom final dépend du contenu: inutile de chercher un nom libre
+        return name
+
+    def _save(self, name, content):
+        return self.store(content, os.path.splitext(name)[1])
+
+    def store(self, content, extension=''):
+        """
+        Ecrit le contenu dans un fichier temporaire en le hachant, puis le publie
+        sous son nom de blob. Retourne le nom du blob.
+        """
+        directory = self.path(os.path.join(BLOB_PREFIX, 'tmp'))
+        os.makedirs(directory, exist_ok=True)
+        digest, size, crc32 = hashlib.sha256(), 0, 0
+        with tempfile.NamedTemporaryFile(dir=directory, delete=False) as temporary:
+            try:
+                for chunk in content.chunks(CHUNK_SIZE):
+                    digest.update(chunk)
+                    crc32 = zlib.crc32(chunk, crc32)
+                    size += len(chunk)
+                    temporary.write(chunk)
+            except BaseException:
+                os.remove(temporary.name)
+                raise
+        return self.publish(temporary.name, digest.hexdigest(), size, extension, crc32)
+
+    def publish(self, path, digest, size, extension='', crc32=None):
+        """
+        Publie un fichier local déjà haché sous son nom de blob, par renommage
+        (même système de fichiers), ou le supprime si ce contenu existe déjà.
+        Le CRC-32 est conservé pour les archives ZIP en flux. Retourne le nom du blob.
+        Une référence est prise sous le verrou de la ligne, de sorte qu'une suppression
+        concurrente ne retire pas le blob avant que l'appelant ne l'ait rattaché; elle est
+        reprise par l'enregistrement suivant du fichier (post_save), ou par pop_claim(), et
+        rendue à la validation de la transaction si personne ne l'a reprise.
+        """
+        from .models import StoredBlob
+
+        name = blob_name(digest, extension)
+        in_transaction = transaction.get_connection().in_atomic_block
+        try:
+            # Le verrou sur la ligne sérialise publication et suppression d'un même blob
+            with transaction.atomic():
+                blob, _ = StoredBlob.objects.select_for_update().get_or_create(
+                    name=name, defaults={'sha256': digest, 'size': size, 'crc32': crc32}
+                )
+                StoredBlob.objects.filter(pk=blob.pk).update(ref_count=F('ref_count') + 1)
+                _add_claim(name, in_transaction, self)
+                target = self.path(name)
+                if not os.path.exists(target):
+                    os.makedirs(os.path.dirname(target), exist_ok=True)
+                    os.replace(path, target)
+                    if self.file_permissions_mode is not None:
+                        os.chmod(target, self.file_permissions_mode)
+        finally:
+            if os.path.exists(path):
+                os.remove(path)
+        return name
+
+    def delete(self, name):
+        """
+        Supprime un blob seulement s'il n'est plus référencé; les autres fichiers normalement
+        """
+        from .images import variant_index, variant_name
+        from .models import StoredBlob
+
+        if not is_blob(name):
+            return super().delete(name)
+        with transaction.atomic():
+            blob = StoredBlob.objects.select_for_update().filter(name=name).first()
+            if blob is not None and blob.ref_count > 0:
+                return
+            if history_references(name):
+                return
+            super().delete(name)
+            # Variantes d'image dérivées, rangées à côté du blob
+            for variant in settings.IMAGE_VARIANTS:
+                if self.exists(variant_name(name, variant)):
+                    super().delete(variant_name(name, variant))
+            variant_index.invalidate(name)
+            if blob is not None:
+                blob.delete()
+
+
+def blob_fields(model):
+    """
+    FileField du modèle stockés par ContentAddressedStorage
+    """
+    return [
+        field for field in model._meta.concrete_fields
+        if isinstance(field, models.FileField) and isinstance(field.storage, ContentAddressedStorage)
+    ]
+
+
+def tracked_models():
+    """
+    {modèle: champs fichiers} dont les références sont comptées (tables historiques exclues)
+    """
+    tracked = {}
+    for model in apps.get_models():
+        if issubclass(model, HistoricalChanges):
+            continue
+        fields = blob_fields(model)
+        if fields:
+            tracked[model] = fields
+    return tracked
+
+
+def history_references(name):
+    """
+    True si une version historique d'un modèle suivi cite encore le fichier
+    """
+    for model, fields in tracked_models().items():
+        history = getattr(model, 'history', None)
+        if history is None:
+            continue
+        cited = Q()
+        for field in fields:
+            cited |= Q(**{field.attname: name})
+        if history.model._base_manager.filter(cited).exists():
+            return True
+    return False
+
+
+def _release(name, storage):
+    adjust_blob_references(Counter(), Counter({name: 1}), storage)
+
+
+def _add_claim(name, in_transaction, storage):
+    """
+    Enregistre une référence prise par publish(). Prise dans une transaction englobante,
+    elle est accompagnée d'un rappel on_commit témoin: Django retire ce rappel si la
+    transaction (ou le point de sauvegarde) est annulée, la référence avec elle; à la
+    validation, une référence que personne n'a reprise est rendue.
+    """
+    claims = _claims.__dict__.setdefault('items', [])
+    claim = [name, None, storage]
+    if in_transaction:
+        def settle():
+            if claim in claims:
+                claims.remove(claim)
+                _release(name, storage)
+        claim[1] = settle
+        transaction.on_commit(settle)
+    claims.append(claim)
+
+
+def _live_claims():
+    """
+    Références de ce thread encore comptées en base (les autres sont oubliées)
+    """
+    claims = _claims.__dict__.setdefault('items', [])
+    pending = {id(callback) for _, callback, _ in transaction.get_connection().run_on_commit}
+    claims[:] = [claim for claim in claims if claim[1] is None or id(claim[1]) in pending]
+    return claims
+
+
+def pop_claim(name):
+    """
+    Retire de ce thread la référence prise par publish() pour `name`, dont l'appelant devient
+    responsable (session d'upload, réécriture en masse). Retourne True si elle existait.
+    """
+    claims = _live_claims()
+    for claim in claims:
+        if claim[0] == name:
+            claims.remove(claim)
+            return True
+    return False
+
+
+def release_claims(**kwargs):
+    """
+    Rend les références prises hors transaction par publish() et jamais reprises (fin de requête)
+    """
+    claims = _live_claims()
+    leftover = [claim for claim in claims if claim[1] is None]
+    claims[:] = [claim for claim in claims if claim[1] is not None]
+    for name, _, storage in leftover:
+        _release(name, storage)
+
+
+def _referenced_blobs(names):
+    return Counter(name for name in names if is_blob(name))
+
+
+def adjust_blob_references(added, removed, storage):
+    """
+    Applique les variations de références (Counter {nom: nombre}); les blobs qui ne sont
+    plus référencés sont supprimés après la validation de la transaction
+    """
+    from .models import StoredBlob
+
+    for name, count in added.items():
+        StoredBlob.objects.filter(name=name).update(ref_count=F('ref_count') + count)
+    for name, count in removed.items():
+        StoredBlob.objects.filter(name=name, ref_count__gte=count).update(ref_count=F('ref_count') - count)
+        transaction.on_commit(lambda name=name: storage.delete(name))
+
+
+def _capture_previous_blobs(sender, instance, raw=False, **kwargs):
+    fields = blob_fields(sender)
+    if raw or not fields:
+        return
+    previous = ()
+    if not instance._state.adding and instance.pk is not None:
+        previous = sender._base_manager.filter(pk=instance.pk).values_list(
+            *[field.attname for field in fields]
+        ).first() or ()
+    instance._previous_blobs = _referenced_blobs(previous)
+
+
+def _count_saved_blobs(sender, instance, raw=False, **kwargs):
+    fields = blob_fields(sender)
+    if raw or not fields:
+        return
+    current = _referenced_blobs(getattr(instance, field.attname).name for field in fields)
+    previous = getattr(instance, '_previous_blobs', Counter())
+    # Références déjà prises à la publication des fichiers de la ligne: reprises pour les
+    # nouveaux fichiers, rendues pour un contenu republié à l'identique; les autres restent
+    claims = _live_claims()
+    claimed = Counter()
+    for claim in list(claims):
+        if claimed[claim[0]] < current[claim[0]]:
+            claimed[claim[0]] += 1
+            claims.remove(claim)
+    added = current - previous
+    adjust_blob_references(added - claimed, (previous - current) + (claimed - added), fields[0].storage)
+    instance._previous_blobs = current
+
+
+def _count_deleted_blobs(sender, instance, **kwargs):
+    fields = blob_fields(sender)
+    if not fields:
+        return
+    removed = _referenced_blobs(getattr(instance, field.attname).name for field in fields)
+    adjust_blob_references(Counter(), removed, fields[0].storage)
+
+
+def connect_blob_reference_signals():
+    """
+    Branche le comptage des références sur les modèles ayant des fichiers en stockage adressé par contenu
+    """
+    for model in tracked_models():
+        uid = f'blob_refs_{model._meta.label_lower}'
+        pre_save.connect(_capture_previous_blobs, sender=model, dispatch_uid=uid)
+        post_save.connect(_count_saved_blobs, sender=model, dispatch_uid=uid)
+        post_delete.connect(_count_deleted_blobs, sender=model, dispatch_uid=uid)
+    request_finished.connect(release_claims, dispatch_uid='blob_claims')
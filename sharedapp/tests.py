@@ -1,3 +1,1309 @@
 from django.test import TestCase
 
 # Create your tests here.
+import hashlib
+import io
+import os
+import struct
+import tempfile
+import threading
+import time
+import uuid
+import zipfile
+from datetime import timedelta
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db.models import F
+from django.test import override_settings
+from django.utils import timezone
+from PIL import Image
+
+from rest_framework.test import APIClient
+
+from issuingCompany.models import IssuingCompany, Transaction
+from issuingCompany.serializers import IssuingCompanySerializer
+from shareholders.constants import KeycloakRoles, ShareholderStatus
+from shareholders.models import (Address, ContactPerson, DocumentValidationStatus, FileDocument,
+                                 KeycloakUser, LegalShareholder, PhysicalShareholder)
+
+from .constants import DuplicateStatus, NotificationStatus
+from .duplicates import detect_duplicates, phonetic_key
+from .events import EventBroker, event_stream, fetch_events, publish_events
+from .history import TimelineViewSetMixin, decode_timeline_cursor, merge_timeline
+from .http import DocumentBundleMixin
+from .ids import rewrite_uuid_keys, uuid7, uuid7_datetime
+from .images import ensure_variant, existing_variants, generate_variants, variant_index, variant_name
+from .mediagc import collect_orphans, file_columns, purge_quarantine
+from .models import (Announcement, Dividend, Notification, NotificationCounter,
+                     DuplicateCandidate, NotificationDigest, NotificationJob, SearchTerm,
+                     StoredBlob, StreamEvent, UploadSession, WorkflowEvent)
+from .notifications import (create_notifications, dispatch_notification_jobs,
+                            flush_notification_digests, get_transition_recipients,
+                            get_unread_count, notify_status_change, reconcile_unread_counters)
+from .responsecache import cache_statistics
+from .search import search_entities, search_index
+from .singleflight import SingleFlight, shared_flight
+from .uploads import purge_upload_sessions
+from .validation import validate_pending_documents
+from .workflow import apply_bulk_transition
+
+
+def make_user(username, roles):
+    user = User.objects.create_user(username=username, password='password')
+    KeycloakUser.objects.create(
+        user=user, keycloak_id=username, username=username,
+        email=f"{username}@example.com", roles=roles
+    )
+    return user
+
+
+class TransitionNotificationTests(TestCase):
+
+    def setUp(self):
+        self.editor = make_user('editor', [KeycloakRoles.EDITOR])
+        self.examiner = make_user('examiner', [KeycloakRoles.EXAMINER])
+        self.approver = make_user('approver', [KeycloakRoles.APPROVER])
+
+    def test_role_entries_follow_roles(self):
+        keycloak_user = self.examiner.keycloak_user
+        keycloak_user.roles = [KeycloakRoles.APPROVER]
+        keycloak_user.save(update_fields=['roles'])
+        self.assertEqual(
+            list(keycloak_user.role_entries.values_list('role', flat=True)),
+            [KeycloakRoles.APPROVER]
+        )
+
+    def test_recipients_are_next_role_and_creator(self):
+        class Entity:
+            status = 'SUBMITTED'
+            created_by_id = self.editor.pk
+
+        recipients = get_transition_recipients(Entity(), self.approver)
+        self.assertEqual(recipients, {self.examiner.pk, self.editor.pk})
+
+    def test_create_notifications_in_bulk(self):
+        create_notifications([self.editor.pk, self.examiner.pk], 'Titre', 'Description')
+        self.assertEqual(Notification.objects.count(), 2)
+
+    def test_transition_fan_out_is_queued(self):
+        shareholder = make_physical_shareholder('PH-001', status=ShareholderStatus.SUBMITTED, created_by=self.editor)
+        notify_status_change(shareholder, self.approver)
+        self.assertFalse(Notification.objects.exists())
+        self.assertEqual(NotificationJob.objects.count(), 1)
+
+        self.assertEqual(dispatch_notification_jobs(), (1, 0))
+        self.assertEqual(
+            set(Notification.objects.values_list('recipient_id', flat=True)), {self.editor.pk, self.examiner.pk}
+        )
+        self.assertEqual(fetch_events(self.approver.pk, 0)[0].payload['status'], ShareholderStatus.SUBMITTED)
+        self.assertFalse(NotificationJob.objects.exists())
+
+
+class UnreadCounterTests(TestCase):
+
+    def setUp(self):
+        self.user = make_user('reader', [KeycloakRoles.EDITOR])
+
+    def test_counter_follows_creation(self):
+        create_notifications([self.user.pk, self.user.pk], 'Titre', 'Description')
+        self.assertEqual(get_unread_count(self.user.pk), 2)
+
+    def test_reconcile_fixes_drift(self):
+        create_notifications([self.user.pk], 'Titre', 'Description')
+        NotificationCounter.objects.filter(pk=self.user.pk).update(unread_count=7)
+        self.assertEqual(reconcile_unread_counters(), 1)
+        self.assertEqual(get_unread_count(self.user.pk), 1)
+
+
+@override_settings(NOTIFICATION_DIGEST={'ENABLED': True, 'WINDOW_SECONDS': 60})
+class NotificationDigestTests(TestCase):
+
+    def setUp(self):
+        self.user = make_user('approver', [KeycloakRoles.APPROVER])
+
+    def test_burst_is_collapsed_into_one_digest(self):
+        for index in range(5):
+            create_notifications([self.user.pk], f'Actionnaire {index}', 'Description')
+        digest = NotificationDigest.objects.get()
+        self.assertEqual(digest.notification_count, 5)
+        self.assertEqual(Notification.objects.filter(digest=digest).count(), 5)
+
+        self.assertEqual(flush_notification_digests(), 0)
+        self.assertEqual(flush_notification_digests(now=timezone.now() + timedelta(minutes=2)), 1)
+        digest.refresh_from_db()
+        self.assertEqual(digest.status, NotificationStatus.SENT)
+        self.assertIn('Actionnaire 4', digest.description)
+        self.assertFalse(Notification.objects.filter(status=NotificationStatus.PENDING).exists())
+
+
+class EventStreamTests(TestCase):
+
+    def setUp(self):
+        self.user = make_user('listener', [KeycloakRoles.EXAMINER])
+        self.other = make_user('other', [KeycloakRoles.EDITOR])
+
+    def test_events_are_replayed_from_cursor(self):
+        publish_events('status', {self.user.pk: {'status': 'SUBMITTED'}, self.other.pk: {}})
+        publish_events('status', {self.user.pk: {'status': 'EXAMINED'}})
+        first, second = fetch_events(self.user.pk, 0)
+        self.assertEqual(second.payload, {'status': 'EXAMINED'})
+        self.assertEqual(fetch_events(self.user.pk, first.id), [second])
+
+    def test_events_behind_a_skipped_id_wait_for_it(self):
+        def ids(cursor):
+            return [stream_event.id for stream_event in fetch_events(self.user.pk, cursor)]
+
+        def create(event_id):
+            StreamEvent.objects.create(id=event_id, recipient=self.user, event='status', payload={})
+
+        with mock.patch('sharedapp.events.broker', EventBroker()):
+            publish_events('status', {self.user.pk: {'status': 'SUBMITTED'}})
+            first = fetch_events(self.user.pk, 0)[-1].id
+            # Id suivant pris par une transaction encore ouverte: l'événement validé avant elle attend
+            create(first + 2)
+            self.assertEqual(ids(first), [])
+            create(first + 1)
+            self.assertEqual(ids(first), [first + 1, first + 2])
+
+            # Id sauté jamais validé (transaction annulée): abandonné après SETTLE_SECONDS
+            create(first + 4)
+            self.assertEqual(ids(first + 2), [])
+            later = time.monotonic() + settings.EVENT_STREAM['SETTLE_SECONDS'] + 1
+            with mock.patch('sharedapp.events.time.monotonic', return_value=later):
+                self.assertEqual(ids(first + 2), [first + 4])
+
+    def test_stream_sends_missed_events(self):
+        publish_events('notification', {self.user.pk: {'title': 'Titre'}})
+
+        async def first_chunks():
+            stream = event_stream(self.user.pk, 0)
+            chunks = [await stream.__anext__(), await stream.__anext__()]
+            await stream.aclose()
+            return chunks
+
+        retry, event = async_to_sync(first_chunks)()
+        self.assertTrue(retry.startswith('retry:'))
+        self.assertIn('event: notification', event)
+        self.assertIn('"title": "Titre"', event)
+
+    def test_idle_stream_sends_heartbeats_without_queries(self):
+        async def idle_chunks():
+            stream = event_stream(self.user.pk, 0)
+            chunks = [await stream.__anext__() for _ in range(4)]
+            await stream.aclose()
+            return chunks
+
+        with override_settings(EVENT_STREAM={**settings.EVENT_STREAM, 'HEARTBEAT_SECONDS': 0.01}), \
+                mock.patch('sharedapp.events.fetch_events', return_value=[]) as fetch:
+            chunks = async_to_sync(idle_chunks)()
+        self.assertEqual(chunks[1:], [': heartbeat\n\n'] * 3)
+        fetch.assert_called_once_with(self.user.pk, 0)
+
+
+def make_physical_shareholder(reference, **kwargs):
+    kwargs.setdefault('total_shares', 10)
+    kwargs.setdefault('activity_sector', 'Banque')
+    kwargs.setdefault('national_id', f"ID-{reference}")
+    kwargs.setdefault('date_of_birth', '1980-01-01')
+    return PhysicalShareholder.objects.create(
+        effective_date='2025-01-01', national_id_expiration='2030-01-01', reference_number=reference, **kwargs
+    )
+
+
+class ChangeFeedTests(TestCase):
+
+    def setUp(self):
+        self.admin = make_user('admin', [KeycloakRoles.ADMIN])
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.admin)
+        self.url = '/api/shareholders/physical/changes/'
+
+    def test_changes_since_cursor(self):
+        kept = make_physical_shareholder('REF-1')
+        removed = make_physical_shareholder('REF-2')
+        cursor = self.client.get(self.url).data['cursor']
+
+        created = make_physical_shareholder('REF-3')
+        kept.activity_sector = 'Assurance'
+        kept.save()
+        removed_id = removed.pk
+        removed.delete()
+
+        data = self.client.get(self.url, {'cursor': cursor}).data
+        self.assertEqual([item['id'] for item in data['created']], [str(created.pk)])
+        self.assertEqual([item['id'] for item in data['updated']], [str(kept.pk)])
+        self.assertEqual(data['deleted'], [removed_id])
+        self.assertFalse(data['has_more'])
+
+        data = self.client.get(self.url, {'cursor': data['cursor']}).data
+        self.assertEqual(data['created'] + data['updated'] + data['deleted'], [])
+
+    def test_late_commit_below_cursor_is_delivered(self):
+        cursor = self.client.get(self.url).data['cursor']
+        late = make_physical_shareholder('REF-1')
+        make_physical_shareholder('REF-2')
+        # La ligne d'historique de `late` (id inférieur) n'est pas encore validée à la lecture
+        history = PhysicalShareholder.history.model
+        late_row = history.objects.get(id=late.pk)
+        history.objects.filter(pk=late_row.pk).delete()
+
+        data = self.client.get(self.url, {'cursor': cursor}).data
+        self.assertEqual([item['reference_number'] for item in data['created']], ['REF-2'])
+
+        late_row.save()
+        data = self.client.get(self.url, {'cursor': data['cursor']}).data
+        self.assertEqual([item['id'] for item in data['created']], [str(late.pk)])
+        data = self.client.get(self.url, {'cursor': data['cursor']}).data
+        self.assertEqual(data['created'] + data['updated'] + data['deleted'], [])
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.client.get(self.url, {'cursor': 'nope'}).status_code, 400)
+
+
+class HistoryApiTests(TestCase):
+
+    def setUp(self):
+        self.admin = make_user('admin', [KeycloakRoles.ADMIN])
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.admin)
+
+    def test_paginated_diffs(self):
+        shareholder = make_physical_shareholder('REF-1')
+        for sector in ['Assurance', 'Industrie']:
+            shareholder.activity_sector = sector
+            shareholder.save()
+        url = f'/api/shareholders/physical/{shareholder.pk}/history/'
+
+        data = self.client.get(url, {'page_size': 2}).data
+        self.assertEqual([entry['type'] for entry in data['results']], ['updated', 'updated'])
+        self.assertEqual(data['results'][0]['changes'],
+                         [{'field': 'activity_sector', 'old': 'Assurance', 'new': 'Industrie'}])
+        self.assertEqual(data['results'][1]['changes'],
+                         [{'field': 'activity_sector', 'old': 'Banque', 'new': 'Assurance'}])
+
+        data = self.client.get(url, {'page_size': 2, 'before': data['next']}).data
+        self.assertEqual([entry['type'] for entry in data['results']], ['created'])
+        self.assertIsNone(data['next'])
+
+
+def make_company(name='Sonatel'):
+    return IssuingCompany.objects.create(
+        name=name, legal='SA', logo='logos/logo.png', founded_date='2000-01-01',
+        status_document='documents/status.pdf', internal_regulations_document='documents/ri.pdf',
+        registration_trade_register='documents/rccm.pdf', ninea='123456789',
+        organization_chart='documents/chart.pdf', capital_social=1000, number_of_shares=100,
+        value_of_shares=10
+    )
+
+
+class CompanyTimelineTests(TestCase):
+
+    def test_merged_pages(self):
+        company = make_company()
+        other = make_company('Autre')
+        for index in range(3):
+            make_physical_shareholder(f'REF-{index}', issuing_company=company)
+        make_physical_shareholder('REF-OTHER', issuing_company=other)
+        company.notes = 'Revue'
+        company.save()
+
+        sources = [
+            ('issuingcompany.issuingcompany', IssuingCompany.history.filter(id=company.pk)),
+            ('shareholders.physicalshareholder', PhysicalShareholder.history.filter(issuing_company=company.pk)),
+            ('sharedapp.dividend', Dividend.history.filter(issuing_company=company.pk)),
+        ]
+        entries, cursor = [], None
+        with self.assertNumQueries(9):
+            while True:
+                page, next_cursor = merge_timeline(sources, 2, cursor=cursor)
+                entries += page
+                if next_cursor is None:
+                    break
+                cursor = decode_timeline_cursor(next_cursor)
+
+        keys = [(row['history_date'], source, row['history_id']) for source, row in entries]
+        self.assertEqual(len(keys), 5)
+        self.assertEqual(keys, sorted(keys, reverse=True))
+        self.assertEqual(entries[-1][0], 'issuingcompany.issuingcompany')
+
+    def test_default_sources(self):
+        company = make_company()
+        [(label, rows)] = TimelineViewSetMixin().get_timeline_sources(company)
+        self.assertEqual(label, IssuingCompany._meta.label_lower)
+        self.assertEqual(list(rows.values_list('id', flat=True)), [company.pk])
+
+        event = WorkflowEvent.objects.create(
+            content_type=ContentType.objects.get_for_model(company), object_id=str(company.pk), action='examine'
+        )
+        with self.assertRaises(ImproperlyConfigured):
+            TimelineViewSetMixin().get_timeline_sources(event)
+
+
+class WorkflowEventTests(TestCase):
+
+    def setUp(self):
+        self.examiner = make_user('examiner', [KeycloakRoles.EXAMINER])
+        self.admin = make_user('admin', [KeycloakRoles.ADMIN])
+        self.client = APIClient()
+
+    def test_transition_appends_event(self):
+        shareholder = make_physical_shareholder('REF-1', notes='Dossier initial')
+        self.client.force_authenticate(user=self.examiner)
+        response = self.client.post(
+            f'/api/shareholders/physical/{shareholder.pk}/examine/', {'comments': 'RAS'}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+
+        shareholder.refresh_from_db()
+        self.assertEqual(shareholder.notes, 'Dossier initial')
+        event = WorkflowEvent.objects.get()
+        self.assertEqual((event.from_status, event.to_status, event.comment), ('SUBMITTED', 'EXAMINED', 'RAS'))
+
+        self.client.force_authenticate(user=self.admin)
+        item = self.client.get('/api/shareholders/physical/').data[0]
+        self.assertNotIn('notes', item)
+        self.assertEqual(item['latest_event']['action'], 'examine')
+        self.assertEqual(item['latest_event']['actor__username'], 'examiner')
+
+        events = self.client.get(f'/api/shareholders/physical/{shareholder.pk}/events/').data
+        self.assertEqual([row['comment'] for row in events['results']], ['RAS'])
+
+
+class BulkTransitionTests(TestCase):
+
+    def setUp(self):
+        self.examiner = make_user('examiner', [KeycloakRoles.EXAMINER])
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.examiner)
+        self.url = '/api/shareholders/physical/bulk_transition/'
+
+    def test_examine_many(self):
+        submitted = [make_physical_shareholder(f'REF-{index}') for index in range(3)]
+        approved = make_physical_shareholder('REF-A', status='APPROVED')
+        ids = [str(shareholder.pk) for shareholder in submitted + [approved]]
+
+        response = self.client.post(self.url, {'transition': 'examine', 'ids': ids, 'comment': 'Lot'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sorted(response.data['updated']), sorted(ids[:3]))
+        # Les actionnaires approuvés ne sont pas visibles pour un examinateur
+        self.assertEqual(response.data['not_found'], [ids[3]])
+
+        self.assertEqual(
+            set(PhysicalShareholder.objects.filter(examined_by=self.examiner).values_list('status', flat=True)),
+            {'EXAMINED'}
+        )
+        self.assertEqual(WorkflowEvent.objects.filter(action='examine', comment='Lot').count(), 3)
+        self.assertEqual(PhysicalShareholder.history.filter(history_change_reason='examine').count(), 3)
+
+    def test_requires_transition_role(self):
+        shareholder = make_physical_shareholder('REF-1')
+        response = self.client.post(self.url, {'transition': 'approve', 'ids': [str(shareholder.pk)]}, format='json')
+        self.assertEqual(response.status_code, 403)
+
+    def test_rows_changed_after_read_are_skipped(self):
+        first, second = make_physical_shareholder('REF-1'), make_physical_shareholder('REF-2')
+        queryset = PhysicalShareholder.objects.filter(pk__in=[first.pk, second.pk])
+        list(queryset)
+        # Examiné par une autre requête entre la lecture et la mise à jour
+        PhysicalShareholder.objects.filter(pk=second.pk).update(status='EXAMINED')
+
+        transition = PhysicalShareholder.workflow.get('examine')
+        updated, skipped = apply_bulk_transition(queryset, transition, self.examiner)
+        self.assertEqual(updated, [first])
+        self.assertEqual(skipped, {str(second.pk): 'SUBMITTED'})
+        self.assertEqual(
+            list(WorkflowEvent.objects.values_list('object_id', flat=True)), [str(first.pk)]
+        )
+
+
+class ConditionalTransitionTests(TestCase):
+
+    def setUp(self):
+        self.examiner = make_user('examiner', [KeycloakRoles.EXAMINER])
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.examiner)
+
+    def test_stale_version_conflicts(self):
+        shareholder = make_physical_shareholder('REF-1')
+        url = f'/api/shareholders/physical/{shareholder.pk}/examine/'
+
+        response = self.client.post(url, {'version': 3}, format='json')
+        self.assertEqual(response.status_code, 409)
+
+        response = self.client.post(url, {'version': 0}, format='json')
+        self.assertEqual(response.status_code, 200)
+        shareholder.refresh_from_db()
+        self.assertEqual((shareholder.status, shareholder.version), ('EXAMINED', 1))
+        self.assertEqual(shareholder.history.first().status, 'EXAMINED')
+
+    def test_lost_race_conflicts(self):
+        shareholder = make_physical_shareholder('REF-1')
+        stale = PhysicalShareholder.objects.get(pk=shareholder.pk)
+        self.assertTrue(shareholder.transition_status('EXAMINED', self.examiner))
+        with self.assertRaises(ValueError):
+            stale.transition_status('EXAMINED', self.examiner)
+
+    def test_unversioned_transition_reads_new_version(self):
+        shareholder = make_physical_shareholder('REF-1')
+        PhysicalShareholder.objects.filter(pk=shareholder.pk).update(version=F('version') + 2)
+
+        self.assertTrue(shareholder.transition_status('EXAMINED', self.examiner))
+        self.assertEqual(shareholder.version, 3)
+        self.assertEqual(shareholder.history.first().version, 3)
+        self.assertEqual(PhysicalShareholder.objects.get(pk=shareholder.pk).version, 3)
+
+
+class UuidKeyTests(TestCase):
+
+    def test_uuid7_is_time_ordered(self):
+        keys = [uuid7() for _ in range(5000)]
+        self.assertEqual(sorted(keys), keys)
+        self.assertEqual({key.version for key in keys}, {7})
+        self.assertLess(abs(uuid7_datetime(keys[0]) - timezone.now()), timedelta(seconds=5))
+
+    def test_rewrite_updates_references(self):
+        company = make_company()
+        seller = make_physical_shareholder('REF-1', id=uuid.uuid4(), issuing_company=company)
+        buyer = make_physical_shareholder('REF-2', id=uuid.uuid4(), issuing_company=company)
+        dividend = Dividend.objects.create(
+            general_assembly_date='2025-01-01', general_assembly_minutes='minutes.pdf',
+            total_dividend_amount=1000, dividend_per_share=10, payment_date='2025-02-01', issuing_company=company
+        )
+        seller.dividends.add(dividend)
+        announcement = Announcement.objects.create(
+            id=uuid.uuid4(), description='Vente', quantity=1, price=100, expiration_date='2030-01-01', share=company
+        )
+        content_type = ContentType.objects.get_for_model(PhysicalShareholder)
+        sale = Transaction.objects.create(
+            seller_content_type=content_type, seller_object_id=seller.pk,
+            buyer_content_type=content_type, buyer_object_id=buyer.pk,
+            quantity=1, price_per_share=100, issuing_company=company, announcement=announcement
+        )
+        WorkflowEvent.objects.create(content_type=content_type, object_id=str(seller.pk), action='examine')
+
+        rewritten = rewrite_uuid_keys(django_apps, ['shareholders.PhysicalShareholder', 'sharedapp.Announcement'])
+        self.assertEqual(rewritten, {'shareholders.PhysicalShareholder': 2, 'sharedapp.Announcement': 1})
+
+        seller = PhysicalShareholder.objects.get(reference_number='REF-1')
+        self.assertEqual(seller.pk.version, 7)
+        sale.refresh_from_db()
+        self.assertEqual(sale.seller_object_id, seller.pk)
+        self.assertEqual(sale.buyer.reference_number, 'REF-2')
+        self.assertEqual(sale.announcement.description, 'Vente')
+        self.assertEqual(list(seller.dividends.all()), [dividend])
+        self.assertEqual(seller.history.count(), 1)
+        self.assertEqual(WorkflowEvent.objects.get().object_id, str(seller.pk))
+        # Relançable: les clés déjà en version 7 sont conservées
+        self.assertEqual(rewrite_uuid_keys(django_apps, ['sharedapp.Announcement']), {'sharedapp.Announcement': 0})
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class ContentAddressedStorageTests(TestCase):
+
+    def make_document(self, shareholder, content):
+        return FileDocument.objects.create(
+            file=SimpleUploadedFile('statuts.pdf', content),
+            content_type=ContentType.objects.get_for_model(shareholder), object_id=shareholder.pk
+        )
+
+    def test_identical_uploads_share_one_blob(self):
+        shareholder = make_physical_shareholder('REF-1')
+        first = self.make_document(shareholder, b'%PDF-1.4 statuts')
+        second = self.make_document(shareholder, b'%PDF-1.4 statuts')
+
+        self.assertEqual(first.file.name, second.file.name)
+        self.assertTrue(first.file.name.startswith('blobs/'))
+        blob = StoredBlob.objects.get()
+        self.assertEqual(blob.ref_count, 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        blob.refresh_from_db()
+        self.assertEqual(blob.ref_count, 1)
+        self.assertTrue(default_storage.exists(blob.name))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(StoredBlob.objects.exists())
+        self.assertFalse(default_storage.exists(blob.name))
+
+    def test_replacing_file_moves_reference(self):
+        document = self.make_document(make_physical_shareholder('REF-1'), b'v1')
+        old_name = document.file.name
+        document.file = SimpleUploadedFile('statuts.pdf', b'v2')
+        with self.captureOnCommitCallbacks(execute=True):
+            document.save()
+        self.assertEqual(StoredBlob.objects.get(name=document.file.name).ref_count, 1)
+        self.assertFalse(default_storage.exists(old_name))
+
+    def test_publish_pins_blob_against_concurrent_delete(self):
+        document = self.make_document(make_physical_shareholder('REF-1'), b'%PDF-1.4 statuts')
+        with self.captureOnCommitCallbacks(execute=True):
+            # Même contenu publié par un autre upload, pas encore rattaché à sa ligne
+            name = default_storage.save('statuts.pdf', ContentFile(b'%PDF-1.4 statuts'))
+            with self.captureOnCommitCallbacks(execute=True):
+                document.delete()
+            self.assertTrue(default_storage.exists(name))
+            FileDocument.objects.create(file=name, content_object=make_physical_shareholder('REF-2'))
+        self.assertEqual(StoredBlob.objects.get(name=name).ref_count, 1)
+        self.assertTrue(default_storage.exists(name))
+
+    def test_unattached_publications_are_released_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            kept = default_storage.save('statuts.pdf', ContentFile(b'%PDF-1.4 kept'))
+            dropped = default_storage.save('brouillon.pdf', ContentFile(b'%PDF-1.4 dropped'))
+            FileDocument.objects.create(file=kept, content_object=make_physical_shareholder('REF-1'))
+        self.assertEqual(StoredBlob.objects.get(name=kept).ref_count, 1)
+        self.assertFalse(default_storage.exists(dropped))
+        self.assertFalse(StoredBlob.objects.filter(name=dropped).exists())
+
+    def test_history_keeps_replaced_blob(self):
+        company = make_company()
+        with self.captureOnCommitCallbacks(execute=True):
+            company.logo = SimpleUploadedFile('logo.png', b'\x89PNG v1')
+            company.save()
+        first = company.logo.name
+        with self.captureOnCommitCallbacks(execute=True):
+            company.logo = SimpleUploadedFile('logo.png', b'\x89PNG v2')
+            company.save()
+        self.assertEqual(StoredBlob.objects.get(name=first).ref_count, 0)
+        self.assertTrue(default_storage.exists(first))  # cité par la version historique
+
+
+@override_settings(
+    MEDIA_ROOT=tempfile.mkdtemp(),
+    UPLOADS={'CHUNK_SIZE': 8, 'MAX_SIZE': 1024, 'SESSION_HOURS': 1}
+)
+class ChunkedUploadTests(TestCase):
+
+    def setUp(self):
+        self.editor = make_user('editor', [KeycloakRoles.EDITOR])
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.editor)
+        self.content = b'%PDF-1.4 statuts signes'
+
+    def put_chunk(self, upload_id, index, data, **headers):
+        return self.client.generic(
+            'PUT', f'/api/sharedapp/uploads/{upload_id}/chunks/{index}/', data,
+            content_type='application/octet-stream', **headers
+        )
+
+    def test_resumable_upload_attached_by_reference(self):
+        response = self.client.post('/api/sharedapp/uploads/', {
+            'filename': 'statuts.pdf', 'size': len(self.content),
+            'sha256': hashlib.sha256(self.content).hexdigest()
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        upload_id = response.data['id']
+        self.assertEqual(response.data['chunk_count'], 3)
+
+        # Blocs dans le désordre, avec un bloc interrompu puis renvoyé
+        self.assertEqual(self.put_chunk(upload_id, 2, self.content[16:]).status_code, 200)
+        self.assertEqual(self.put_chunk(upload_id, 0, self.content[:5]).status_code, 400)
+        self.assertEqual(self.put_chunk(upload_id, 0, self.content[:8]).status_code, 200)
+        response = self.client.post(f'/api/sharedapp/uploads/{upload_id}/complete/')
+        self.assertEqual((response.status_code, response.data['missing_chunks']), (400, ['1']))
+
+        chunk = self.content[8:16]
+        response = self.put_chunk(upload_id, 1, chunk, HTTP_X_CHUNK_SHA256=hashlib.sha256(chunk).hexdigest())
+        self.assertEqual(response.data['received'], [0, 1, 2])
+        response = self.client.post(f'/api/sharedapp/uploads/{upload_id}/complete/')
+        self.assertEqual(response.data['status'], 'COMPLETED')
+
+        shareholder = make_physical_shareholder('REF-1', created_by=self.editor)
+        response = self.client.post(
+            f'/api/shareholders/physical/{shareholder.pk}/upload-document/',
+            {'file_upload': upload_id, 'document_type': 'other'}, format='json'
+        )
+        self.assertEqual(response.status_code, 201, response.data)
+        document = FileDocument.objects.get()
+        self.assertEqual(document.file.read(), self.content)
+        # Référencé par le document et par la session jusqu'à sa purge
+        self.assertEqual(StoredBlob.objects.get(name=document.file.name).ref_count, 2)
+        UploadSession.objects.update(expires_at=timezone.now())
+        with self.captureOnCommitCallbacks(execute=True):
+            purge_upload_sessions()
+        self.assertEqual(StoredBlob.objects.get(name=document.file.name).ref_count, 1)
+        self.assertTrue(default_storage.exists(document.file.name))
+
+    def test_invalid_resend_keeps_accepted_chunk(self):
+        response = self.client.post('/api/sharedapp/uploads/', {'filename': 'statuts.pdf', 'size': 16}, format='json')
+        upload_id = response.data['id']
+        for index in range(2):
+            self.assertEqual(self.put_chunk(upload_id, index, self.content[index * 8:index * 8 + 8]).status_code, 200)
+
+        # Renvoi altéré (empreinte fausse) puis tronqué du bloc déjà accepté
+        response = self.put_chunk(upload_id, 1, b'corrupt!', HTTP_X_CHUNK_SHA256=hashlib.sha256(b'other').hexdigest())
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.put_chunk(upload_id, 1, b'tiny').status_code, 400)
+        response = self.client.post(f'/api/sharedapp/uploads/{upload_id}/complete/')
+        self.assertEqual(response.data['status'], 'COMPLETED')
+        with default_storage.open(UploadSession.objects.get().blob_name) as uploaded:
+            self.assertEqual(uploaded.read(), self.content[:16])
+
+    def test_rejects_wrong_format(self):
+        response = self.client.post('/api/sharedapp/uploads/', {'filename': 'statuts.pdf', 'size': 8}, format='json')
+        response = self.put_chunk(response.data['id'], 0, b'MZ\x90\x00exe!')
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class DocumentBundleTests(TestCase):
+
+    def setUp(self):
+        self.editor = make_user('editor', [KeycloakRoles.EDITOR])
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.editor)
+        self.shareholder = make_physical_shareholder('REF-1', created_by=self.editor)
+        self.contents = {'statuts.pdf': b'%PDF-1.4 ' + os.urandom(200000), 'id.png': b'\x89PNG image'}
+        for filename, content in self.contents.items():
+            FileDocument.objects.create(
+                file=SimpleUploadedFile(filename, content), content_object=self.shareholder
+            )
+        self.url = f'/api/shareholders/physical/{self.shareholder.pk}/documents-bundle/'
+
+    def test_bundle_is_a_valid_zip(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        body = b''.join(response.streaming_content)
+        self.assertEqual(int(response['Content-Length']), len(body))
+        with zipfile.ZipFile(io.BytesIO(body)) as archive:
+            self.assertIsNone(archive.testzip())
+            contents = sorted(archive.read(info) for info in archive.infolist())
+            self.assertEqual({info.compress_type for info in archive.infolist()}, {zipfile.ZIP_STORED})
+        self.assertEqual(contents, sorted(self.contents.values()))
+
+    def test_range_and_resume(self):
+        full = self.client.get(self.url)
+        body = b''.join(full.streaming_content)
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=100-150000', HTTP_IF_RANGE=full['ETag'])
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 100-150000/{len(body)}')
+        self.assertEqual(b''.join(response.streaming_content), body[100:150001])
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-50')
+        self.assertEqual(b''.join(response.streaming_content), body[-50:])
+        response = self.client.get(self.url, HTTP_RANGE='bytes=100-', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get(self.url, HTTP_RANGE=f'bytes={len(body)}-').status_code, 416)
+
+    def test_default_files_are_the_file_fields(self):
+        dividend = Dividend.objects.create(
+            general_assembly_date='2025-01-01', general_assembly_minutes='minutes/pv.pdf',
+            total_dividend_amount=1000, dividend_per_share=10, payment_date='2025-02-01',
+            issuing_company=make_company()
+        )
+        [(arcname, field_file, _)] = DocumentBundleMixin().get_bundle_files(dividend)
+        self.assertEqual((arcname, field_file.name), ('general_assembly_minutes.pdf', 'minutes/pv.pdf'))
+
+        event = WorkflowEvent.objects.create(
+            content_type=ContentType.objects.get_for_model(dividend), object_id=str(dividend.pk), action='examine'
+        )
+        with self.assertRaises(ImproperlyConfigured):
+            DocumentBundleMixin().get_bundle_files(event)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class SignedMediaTests(TestCase):
+
+    def setUp(self):
+        self.editor = make_user('editor', [KeycloakRoles.EDITOR])
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.editor)
+        self.shareholder = make_physical_shareholder('REF-1', created_by=self.editor)
+        self.content = b'%PDF-1.4 ' + os.urandom(5000)
+        self.document = FileDocument.objects.create(
+            file=SimpleUploadedFile('statuts.pdf', self.content), content_object=self.shareholder
+        )
+        self.base = f'/api/shareholders/physical/{self.shareholder.pk}'
+
+    def test_signed_url_serves_without_authentication(self):
+        links = self.client.get(f'{self.base}/document-links/').data
+        self.assertEqual(len(links['results']), 1)
+        url = links['results'][0]['url']
+        self.assertEqual(self.client.get(f'{self.base}/document-links/').data['results'][0]['url'], url)
+
+        anonymous = APIClient()
+        response = anonymous.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertIn('max-age=', response['Cache-Control'])
+
+        self.assertEqual(anonymous.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        response = anonymous.get(url, HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), self.content[10:20])
+        self.assertEqual(anonymous.get(url.replace('/media/', '/media/x')).status_code, 404)
+
+        redirect = self.client.get(f'{self.base}/download-document/{self.document.pk}/')
+        self.assertEqual(redirect.status_code, 302)
+        self.assertEqual(redirect['Location'], url)
+
+    def test_offloaded_and_expired(self):
+        url = self.client.get(f'{self.base}/document-links/').data['results'][0]['url']
+        with override_settings(MEDIA_SERVING={**settings.MEDIA_SERVING, 'BACKEND': 'x-accel'}):
+            response = APIClient().get(url)
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected-media/{self.document.file.name}')
+        self.assertEqual(response.content, b'')
+
+        with mock.patch('sharedapp.http.time.time', return_value=time.time() + 3 * settings.MEDIA_SERVING['SIGNED_URL_SECONDS']):
+            self.assertEqual(APIClient().get(url).status_code, 410)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class ImageVariantTests(TestCase):
+
+    def setUp(self):
+        variant_index.clear()
+
+    def test_variants_generated_and_listed(self):
+        buffer = io.BytesIO()
+        Image.new('RGBA', (800, 400), (200, 30, 30, 255)).save(buffer, 'PNG')
+        serializer = IssuingCompanySerializer(
+            make_company(), data={'logo': SimpleUploadedFile('logo.png', buffer.getvalue())}, partial=True
+        )
+        serializer.is_valid(raise_exception=True)
+        with self.captureOnCommitCallbacks(execute=True):
+            company = serializer.save()
+        self.assertTrue(default_storage.exists(variant_name(company.logo.name, 'medium')))
+
+        data = IssuingCompanySerializer(company).data
+        self.assertEqual(set(data['logo_variants']), {'small', 'medium', 'webp'})
+        with default_storage.open(variant_name(company.logo.name, 'small')) as small, Image.open(small) as image:
+            self.assertEqual(image.size, (64, 32))
+        with default_storage.open(variant_name(company.logo.name, 'webp')) as webp, Image.open(webp) as image:
+            self.assertEqual((image.format, image.size), ('WEBP', (512, 256)))
+        self.assertTrue(data['logo_variants']['webp'].endswith('.webp.webp'))
+
+        default_storage.delete(company.logo.name)  # encore référencé
+        self.assertTrue(default_storage.exists(variant_name(company.logo.name, 'small')))
+        name, pk = company.logo.name, company.pk
+        with self.captureOnCommitCallbacks(execute=True):
+            company.delete()
+        self.assertTrue(default_storage.exists(variant_name(name, 'small')))  # cité par l'historique
+        IssuingCompany.history.filter(id=pk).delete()
+        default_storage.delete(name)
+        self.assertFalse(default_storage.exists(variant_name(name, 'small')))
+
+    def test_variant_index_is_bounded_and_invalidated(self):
+        buffer = io.BytesIO()
+        Image.new('RGB', (100, 100)).save(buffer, 'PNG')
+        name = default_storage.save('logos/index.png', ContentFile(buffer.getvalue()))
+        with mock.patch.object(default_storage, 'exists', wraps=default_storage.exists) as exists:
+            self.assertEqual((existing_variants(name), existing_variants(name)), ({}, {}))
+            self.assertEqual(exists.call_count, 3)  # une lecture par variante, puis l'index
+
+            self.assertEqual(generate_variants(name), 3)
+            exists.reset_mock()
+            self.assertEqual(set(existing_variants(name)), {'small', 'medium', 'webp'})
+            self.assertEqual(exists.call_count, 3)
+
+            with override_settings(IMAGE_VARIANT_INDEX={**settings.IMAGE_VARIANT_INDEX, 'MAX_SIZE': 1}):
+                existing_variants('logos/other.png')  # évince l'image la moins récente
+                exists.reset_mock()
+                existing_variants(name)
+            self.assertEqual(exists.call_count, 3)
+
+    def test_unreadable_logo_has_no_variants(self):
+        data = IssuingCompanySerializer(make_company()).data
+        self.assertEqual(data['logo_variants'], {'small': None, 'medium': None, 'webp': None})
+
+    def test_corrupt_logo_is_listed_without_variants(self):
+        buffer = io.BytesIO()
+        Image.new('RGB', (800, 400), (200, 30, 30)).save(buffer, 'PNG')
+        company = make_company()
+        company.logo.name = default_storage.save('logos/logo.png', ContentFile(buffer.getvalue()[:200]))
+        company.save()
+        self.assertIsNone(ensure_variant(company.logo.name, 'small'))
+
+        client = APIClient()
+        client.force_authenticate(user=make_user('admin', [KeycloakRoles.ADMIN]))
+        response = client.get('/api/issuingCompany/issuing-companies/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data[0]['logo_variants'], {'small': None, 'medium': None, 'webp': None})
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class DocumentValidationTests(TestCase):
+
+    def setUp(self):
+        self.shareholder = make_physical_shareholder('REF-1')
+
+    def add_document(self, filename, content):
+        return FileDocument.objects.create(file=SimpleUploadedFile(filename, content), content_object=self.shareholder)
+
+    def test_pool_marks_documents(self):
+        photo = Image.new('RGB', (40, 20), (10, 20, 30))
+        exif = photo.getexif()
+        exif[0x0112] = 6  # rotation de 90°
+        exif[0x010f] = 'Camera'
+        buffer = io.BytesIO()
+        photo.save(buffer, 'JPEG', exif=exif)
+
+        pdf = self.add_document('statuts.pdf', b'%PDF-1.4\n1 0 obj << /Type /Pages /Count 2 >>\n'
+                                b'2 0 obj << /Type /Page >>\n3 0 obj << /Type/Page >>\nstartxref\n0\n%%EOF\n')
+        truncated = self.add_document('coupe.pdf', b'%PDF-1.4\n1 0 obj << /Type /Page >>')
+        fake = self.add_document('photo.png', b'MZ\x90\x00 not an image')
+        jpeg = self.add_document('photo.jpg', buffer.getvalue())
+        self.assertEqual(jpeg.validation_status, DocumentValidationStatus.PENDING)
+
+        self.assertEqual(validate_pending_documents(workers=2), (2, 2))
+        for document in (pdf, truncated, fake, jpeg):
+            document.refresh_from_db()
+        self.assertEqual((pdf.validation_status, pdf.page_count), (DocumentValidationStatus.VALID, 2))
+        self.assertEqual(truncated.validation_status, DocumentValidationStatus.REJECTED)
+        self.assertIn('.png', fake.validation_error)
+        self.assertEqual(jpeg.validation_status, DocumentValidationStatus.VALID)
+        with jpeg.file.open() as content, Image.open(content) as image:
+            self.assertEqual((image.size, dict(image.getexif())), ((20, 40), {}))
+        self.assertEqual(StoredBlob.objects.get(name=jpeg.file.name).ref_count, 1)
+
+    def test_batches_follow_upload_order(self):
+        documents = [self.add_document(f'statuts-{index}.pdf', b'MZ not a pdf') for index in range(3)]
+        # Même date d'upload: la clé primaire départage les lots
+        FileDocument.objects.update(uploaded_at=timezone.now())
+        self.assertEqual(validate_pending_documents(workers=0, batch_size=1), (0, 3))
+        self.assertFalse(FileDocument.objects.filter(
+            pk__in=[document.pk for document in documents], validation_status=DocumentValidationStatus.PENDING
+        ).exists())
+
+    def test_unexpected_errors_reject_only_their_document(self):
+        photo = Image.new('RGB', (20, 20))
+        exif = photo.getexif()
+        exif[0x010f] = 'Camera'
+        buffer = io.BytesIO()
+        photo.save(buffer, 'JPEG', exif=exif)
+        malformed = self.add_document('statuts.pdf', b'%PDF-1.4\nstartxref\n0\n%%EOF\n')
+        unpublished = self.add_document('photo.jpg', buffer.getvalue())
+        name = unpublished.file.name
+        valid = self.add_document('liste.pdf', b'%PDF-1.4\nstartxref\n0\n%%EOF\n')
+        FileDocument.objects.filter(pk=valid.pk).update(uploaded_at=timezone.now() + timedelta(seconds=1))
+
+        with mock.patch('sharedapp.validation._check_pdf', side_effect=[struct.error('unpack requires a buffer'), None]), \
+                mock.patch.object(default_storage, 'publish', side_effect=OSError('disk full')):
+            self.assertEqual(validate_pending_documents(workers=0, batch_size=1), (1, 2))
+        for document in (malformed, unpublished, valid):
+            document.refresh_from_db()
+        self.assertIn('unpack requires a buffer', malformed.validation_error)
+        self.assertEqual(malformed.validation_status, DocumentValidationStatus.REJECTED)
+        self.assertEqual((unpublished.validation_status, unpublished.file.name), (DocumentValidationStatus.REJECTED, name))
+        self.assertIn('disk full', unpublished.validation_error)
+        self.assertEqual(valid.validation_status, DocumentValidationStatus.VALID)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class OrphanMediaTests(TestCase):
+
+    def write(self, name, content=b'x', age_hours=48):
+        path = default_storage.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as file:
+            file.write(content)
+        old = time.time() - age_hours * 3600
+        os.utime(path, (old, old))
+        return name
+
+    def test_incremental_collection(self):
+        document = FileDocument.objects.create(
+            file=SimpleUploadedFile('logo.png', b'\x89PNG kept'), content_object=make_physical_shareholder('REF-1')
+        )
+        kept = [
+            self.write(document.file.name, b'\x89PNG kept'),
+            self.write(variant_name(document.file.name, 'webp')),
+            self.write('logos/recent.png', age_hours=1),
+        ]
+        # Référencé par la seule colonne (compteur de références faussé)
+        StoredBlob.objects.filter(name=document.file.name).update(ref_count=0)
+        orphans = [
+            self.write('logos/old.png'),
+            self.write('documents/a/b/deleted.pdf'),
+            self.write('blobs/tmp/tmpabc123'),
+            self.write(f'blobs/tmp/uploads/{uuid.uuid4()}.part'),
+        ]
+
+        runs = 0
+        while True:
+            sweep, scanned, _ = collect_orphans(limit=2)
+            runs += 1
+            if not sweep.cursor:
+                break
+        self.assertEqual(runs, 4)
+        self.assertEqual(sweep.quarantined, len(orphans))
+        for name in orphans:
+            self.assertFalse(default_storage.exists(name))
+        for name in kept:
+            self.assertTrue(default_storage.exists(name))
+
+        quarantine_root = os.path.join(settings.MEDIA_ROOT, settings.MEDIA_GC['QUARANTINE_DIR'])
+        old = time.time() - 30 * 86400
+        for name in orphans:
+            os.utime(os.path.join(quarantine_root, name), (old, old))
+        FileDocument.objects.filter(pk=document.pk).update(file='logos/old.png')  # de nouveau référencé
+        self.assertEqual(purge_quarantine(file_columns()), (3, 1))
+        self.assertTrue(default_storage.exists('logos/old.png'))
+
+    @override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+    def test_history_keeps_files(self):
+        company = make_company()
+        company.logo = self.write('logos/v1.png')
+        company.save()
+        company.logo = self.write('logos/v2.png')
+        company.save()
+        orphan = self.write('logos/orphan.png')
+
+        while collect_orphans()[0].cursor:
+            pass
+        self.assertTrue(default_storage.exists('logos/v1.png'))  # version historique
+        self.assertTrue(default_storage.exists('logos/v2.png'))
+        self.assertFalse(default_storage.exists(orphan))
+
+    def test_file_columns_are_indexed(self):
+        # Une requête `__in` par lot et par colonne: aucune ne doit parcourir toute sa table
+        columns = file_columns()
+        self.assertIn((IssuingCompany.history.model, 'logo'), columns)
+        for model, column in columns:
+            self.assertTrue(model._meta.get_field(column).db_index, f'{model._meta.label}.{column}')
+
+
+class SearchIndexTests(TestCase):
+
+    def setUp(self):
+        self.editor = make_user('editor', [KeycloakRoles.EDITOR])
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.editor)
+        with self.captureOnCommitCallbacks(execute=True):
+            contact = ContactPerson.objects.create(
+                first_name='Aminata', last_name='Ndiaye', email='aminata@example.com', phone='+221770000001'
+            )
+            self.ndiaye = make_physical_shareholder('SN-DKR-001', contact_person=contact, created_by=self.editor)
+            self.diop = make_physical_shareholder('SN-DKR-002', activity_sector='Télécoms', created_by=self.editor)
+            make_physical_shareholder('SN-THS-003', activity_sector='Ndiayene')  # autre éditeur
+
+    def search(self, query):
+        response = self.client.get('/api/shareholders/physical/', {'search': query})
+        self.assertEqual(response.status_code, 200)
+        results = response.data['results'] if isinstance(response.data, dict) else response.data
+        return [row['reference_number'] for row in results]
+
+    def test_exact_prefix_fuzzy_and_visibility(self):
+        self.assertEqual(self.search('ndiaye'), ['SN-DKR-001'])
+        self.assertEqual(self.search('sndkr'), ['SN-DKR-001', 'SN-DKR-002'])
+        self.assertEqual(self.search('telecom'), ['SN-DKR-002'])
+        self.assertEqual(self.search('Ndyaye'), ['SN-DKR-001'])  # orthographe approchée
+        self.assertEqual(search_index(PhysicalShareholder, 'ndiaye')[0][0], str(self.ndiaye.pk))
+        self.assertEqual(len(search_index(PhysicalShareholder, 'ndiaye')), 2)
+
+    def test_hidden_matches_do_not_crowd_out_visible_ones(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            hidden = make_physical_shareholder('NDIAYE-9')  # autre éditeur, mieux classé
+        self.assertEqual(search_index(PhysicalShareholder, 'ndiaye', limit=1)[0][0], str(hidden.pk))
+        with mock.patch('sharedapp.search.RANKING_PAGE_SIZE', 1), \
+                mock.patch('sharedapp.search.SearchIndexFilter.max_results', 1):
+            self.assertEqual(self.search('ndiaye'), ['SN-DKR-001'])
+
+    def test_common_terms_are_capped_and_paged_by_keyset(self):
+        # « sn » figure dans toutes les références: sa lecture s'arrête à MAX_TERMS_PER_TOKEN lignes
+        with mock.patch('sharedapp.search.MAX_TERMS_PER_TOKEN', 2):
+            self.assertEqual(len(search_entities([PhysicalShareholder], 'sn')), 2)
+        ranking = search_entities([PhysicalShareholder], 'sn')
+        self.assertEqual(len(ranking), 3)
+        first = search_entities([PhysicalShareholder], 'sn', limit=1)
+        self.assertEqual(first + search_entities([PhysicalShareholder], 'sn', after=first[-1]), ranking)
+
+    def test_kept_up_to_date(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            contact = self.ndiaye.contact_person
+            contact.last_name = 'Sarr'
+            contact.save()
+        self.assertEqual(self.search('sarr'), ['SN-DKR-001'])
+        self.assertEqual(self.search('ndiaye'), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.diop.delete()
+        self.assertFalse(SearchTerm.objects.filter(object_id=str(self.diop.pk)).exists())
+
+
+class GlobalSearchTests(TestCase):
+
+    def setUp(self):
+        self.admin = make_user('admin', [KeycloakRoles.ADMIN])
+        self.examiner = make_user('examiner', [KeycloakRoles.EXAMINER])
+        with self.captureOnCommitCallbacks(execute=True):
+            make_company('Sonatel')
+            contact = ContactPerson.objects.create(
+                first_name='Moussa', last_name='Sonko', email='moussa@example.com', phone='+221770000002'
+            )
+            make_physical_shareholder('PH-001', contact_person=contact, status=ShareholderStatus.APPROVED)
+            LegalShareholder.objects.create(
+                company_name='Sonatel Holding', registration_number='SN-DKR-2020-B-1', tax_id='NINEA-1',
+                legal_representative='Awa Sy', representative_email='awa@example.com',
+                representative_phone='+221770000003', capital_percentage=10, effective_beneficiary=10,
+                reference_number='LG-001', effective_date='2025-01-01', activity_sector='Télécoms',
+                total_shares=10
+            )
+
+    def search(self, user, **params):
+        client = APIClient()
+        client.force_authenticate(user=user)
+        response = client.get('/api/search/', params)
+        self.assertEqual(response.status_code, 200)
+        return [(hit['type'], hit['label']) for hit in response.data['results']]
+
+    def test_typed_ranked_hits_and_visibility(self):
+        self.assertEqual(set(self.search(self.admin, q='sonatel')), {
+            ('issuing_company', 'Sonatel'),
+            ('legal_shareholder', 'Sonatel Holding - Ref: LG-001'),
+        })
+        self.assertEqual(self.search(self.admin, q='sonatel holding')[0], ('legal_shareholder', 'Sonatel Holding - Ref: LG-001'))
+        self.assertEqual(self.search(self.admin, q='SN-DKR-2020-B-1'), [('legal_shareholder', 'Sonatel Holding - Ref: LG-001')])
+        self.assertEqual(self.search(self.admin, q='123456789'), [('issuing_company', 'Sonatel')])
+        self.assertEqual(
+            self.search(self.admin, q='sonko', type='contact_person'), [('contact_person', 'Moussa Sonko')]
+        )
+        # L'examinateur ne voit que les actionnaires soumis et pas la liste des sociétés
+        self.assertEqual(self.search(self.examiner, q='sonatel'), [('legal_shareholder', 'Sonatel Holding - Ref: LG-001')])
+        self.assertEqual(self.search(self.examiner, q='sonko'), [])
+
+
+class DuplicateDetectionTests(TestCase):
+
+    def setUp(self):
+        self.examiner = make_user('examiner', [KeycloakRoles.EXAMINER])
+        people = [('Aminata', 'Ndiaye', '1'), ('Aminatou', 'Ndiaye', '2'), ('Moussa', 'Diop', '3')]
+        contacts = [
+            ContactPerson.objects.create(
+                first_name=first, last_name=last, email=f'{first}@example.com', phone=f'+22177000000{n}'
+            )
+            for first, last, n in people
+        ]
+        self.first = make_physical_shareholder('PH-001', national_id='1234567', contact_person=contacts[0])
+        self.typo = make_physical_shareholder('PH-002', national_id='1234576', contact_person=contacts[1])
+        make_physical_shareholder('PH-003', national_id='7654321', contact_person=contacts[2])
+        # Même identifiant, saisi avec séparateurs et sans personne de contact
+        self.same_id = make_physical_shareholder('PH-004', national_id='12-345-67', date_of_birth='1975-05-05')
+
+    def pairs(self, **filters):
+        return {
+            frozenset((candidate.first_id, candidate.second_id)): candidate.status
+            for candidate in DuplicateCandidate.objects.filter(**filters)
+        }
+
+    def test_blocking_scoring_and_review(self):
+        self.assertEqual(phonetic_key('Coulibaly'), phonetic_key('Koulibaly'))
+        self.assertEqual(detect_duplicates(PhysicalShareholder)[2], 2)
+        typo_pair = frozenset((str(self.first.pk), str(self.typo.pk)))
+        self.assertEqual(self.pairs(), {
+            typo_pair: DuplicateStatus.PENDING,
+            frozenset((str(self.first.pk), str(self.same_id.pk))): DuplicateStatus.PENDING,
+        })
+
+        client = APIClient()
+        client.force_authenticate(user=self.examiner)
+        response = client.get('/api/sharedapp/duplicates/', {'shareholder': str(self.typo.pk)})
+        self.assertEqual(len(response.data), 1)
+        self.assertEqual(response.data[0]['type'], 'physical_shareholder')
+        self.assertEqual({response.data[0]['first'], response.data[0]['second']}, {str(self.first), str(self.typo)})
+        response = client.post(f"/api/sharedapp/duplicates/{response.data[0]['id']}/review/", {'decision': 'dismiss'})
+        self.assertEqual(response.data['status'], DuplicateStatus.DISMISSED)
+
+        # Décision conservée; la paire corrigée entre-temps sort de la file
+        PhysicalShareholder.objects.filter(pk=self.same_id.pk).update(national_id='99-999-99')
+        detect_duplicates(PhysicalShareholder)
+        self.assertEqual(self.pairs(), {typo_pair: DuplicateStatus.DISMISSED})
+        self.assertEqual(client.get('/api/sharedapp/duplicates/').data, [])
+
+
+class ConditionalGetTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(user=make_user('admin', [KeycloakRoles.ADMIN]))
+        self.contact = ContactPerson.objects.create(
+            first_name='Awa', last_name='Sy', email='awa@example.com', phone='+221770000009'
+        )
+        self.shareholder = make_physical_shareholder('PH-001', contact_person=self.contact)
+        self.url = f'/api/shareholders/physical/{self.shareholder.pk}/'
+
+    def test_detail_validators(self):
+        past = timezone.now() - timedelta(minutes=1)
+        PhysicalShareholder.objects.filter(pk=self.shareholder.pk).update(updated_at=past)
+        ContactPerson.objects.filter(pk=self.contact.pk).update(updated_at=past)
+        response = self.client.get(self.url)
+        etag = response['ETag']
+        self.assertFalse(etag.startswith('W/'))
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        response = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+        # Relation imbriquée modifiée: nouvelle représentation
+        self.contact.last_name = 'Sall'
+        self.contact.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        # Seconde en cours: Last-Modified (précis à la seconde) n'est pas encore donné
+        self.assertNotIn('Last-Modified', response)
+
+        etag = response['ETag']
+        address = Address.objects.create(street='Rue 1', city='Dakar', postal_code='10000', country='SN', effective_date='2024-01-01')
+        self.shareholder.addresses.add(address)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_list_validators_follow_workflow_events(self):
+        url = '/api/shareholders/physical/'
+        etag = self.client.get(url)['ETag']
+        WorkflowEvent.objects.create(
+            content_type=ContentType.objects.get_for_model(PhysicalShareholder),
+            object_id=str(self.shareholder.pk), action='examine'
+        )
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_list_validators(self):
+        url = '/api/shareholders/physical/'
+        etag = self.client.get(url)['ETag']
+        self.assertTrue(etag.startswith('W/'))
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.client.get(url, {'status': 'APPROVED'}, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        self.shareholder.delete()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual((response.status_code, len(response.data)), (200, 0))
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'response-cache-tests'},
+    'shared': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': tempfile.mkdtemp()},
+})
+class ResponseCacheTests(TestCase):
+
+    def setUp(self):
+        for alias in ('default', 'shared'):
+            caches[alias].clear()
+        self.client = APIClient()
+        self.client.force_authenticate(user=make_user('admin', [KeycloakRoles.ADMIN]))
+        self.company, self.other = make_company(), make_company('Orange')
+        self.dividend = self.make_dividend(self.company)
+
+    def make_dividend(self, company):
+        return Dividend.objects.create(
+            general_assembly_date='2025-01-01', general_assembly_minutes='minutes.pdf', total_dividend_amount=1000,
+            dividend_per_share=10, payment_date=timezone.now().date() + timedelta(days=30), issuing_company=company,
+            is_validated=True
+        )
+
+    def test_company_tag_invalidation(self):
+        url = '/api/sharedapp/dividends/upcoming_payments/'
+        params = {'issuing_company': self.company.pk}
+        self.assertEqual(self.client.get(url, params)['X-Cache'], 'MISS')
+        response = self.client.get(url, params)
+        self.assertEqual((response['X-Cache'], len(response.data)), ('HIT', 1))
+
+        # Dividende d'une autre société: la réponse de la première reste valide
+        with self.captureOnCommitCallbacks(execute=True):
+            self.make_dividend(self.other)
+        self.assertEqual(self.client.get(url, params)['X-Cache'], 'HIT')
+        self.assertEqual(self.client.get(url)['X-Cache'], 'MISS')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.dividend.is_validated = False
+            self.dividend.save()
+        response = self.client.get(url, params)
+        self.assertEqual((response['X-Cache'], response.data), ('MISS', []))
+        self.assertEqual(cache_statistics()['dividend.upcoming_payments'], {'hits': 2, 'misses': 3, 'hit_ratio': 0.4})
+
+    def test_role_visibility_fingerprint(self):
+        url = '/api/shareholders/legal/group_statistics/'
+        self.assertEqual(self.client.get(url)['X-Cache'], 'MISS')
+        self.assertEqual(self.client.get(url)['X-Cache'], 'HIT')
+        editor = APIClient()
+        editor.force_authenticate(user=make_user('editor', [KeycloakRoles.EDITOR]))
+        self.assertEqual(editor.get(url)['X-Cache'], 'MISS')
+
+    def test_transition_invalidates_statistics(self):
+        # Les transitions passent par queryset.update(), sans post_save
+        LegalShareholder.objects.create(
+            company_name='Sonatel Holding', registration_number='SN-DKR-2020-B-1', tax_id='NINEA-1',
+            legal_representative='Awa Sy', representative_email='awa@example.com',
+            representative_phone='+221770000003', capital_percentage=10, effective_beneficiary=10,
+            reference_number='LG-001', effective_date='2025-01-01', activity_sector='Télécoms',
+            total_shares=10, issuing_company=self.company, status=ShareholderStatus.EXAMINED
+        )
+        shareholder = LegalShareholder.objects.get()
+        approver = APIClient()
+        approver.force_authenticate(user=make_user('approver', [KeycloakRoles.APPROVER]))
+        url = '/api/shareholders/legal/group_statistics/'
+        self.assertEqual(approver.get(url).data['total_companies'], 1)
+        self.assertEqual(approver.get(url)['X-Cache'], 'HIT')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = approver.post(
+                f'/api/shareholders/legal/{shareholder.pk}/approve/', {'decision': 'approve'}, format='json'
+            )
+        self.assertEqual(response.status_code, 200)
+        response = approver.get(url)
+        self.assertEqual((response['X-Cache'], response.data['total_companies']), ('MISS', 0))
+
+    def test_stale_while_revalidate(self):
+        url = '/api/sharedapp/dividends/upcoming_payments/'
+        self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.dividend.is_validated = False
+            self.dividend.save()
+        with override_settings(RESPONSE_CACHE={**settings.RESPONSE_CACHE, 'STALE_SECONDS': 60}), \
+                mock.patch('sharedapp.responsecache.threading.Thread') as thread:
+            responses = [self.client.get(url) for _ in range(2)]
+        self.assertEqual([(response['X-Cache'], len(response.data)) for response in responses], [('STALE', 1)] * 2)
+        # Recalcul réservé avant le lancement du thread: un seul pour les deux requêtes
+        thread.return_value.start.assert_called_once_with()
+
+        # Exécuté après la fin des requêtes, sur une vue et une requête reconstruites
+        with mock.patch('sharedapp.responsecache.connection'):
+            thread.call_args.kwargs['target']()
+        response = self.client.get(url)
+        self.assertEqual((response['X-Cache'], response.data), ('HIT', []))
+
+
+class SingleFlightTests(TestCase):
+
+    def test_concurrent_callers_share_one_computation(self):
+        group, calls, results = SingleFlight(), [], []
+        started = threading.Event()
+
+        def compute():
+            calls.append(1)
+            started.set()
+            time.sleep(0.2)
+            return 'stats'
+
+        threads = [threading.Thread(target=lambda: results.append(group.do('key', compute, 5))) for _ in range(5)]
+        threads[0].start()
+        started.wait(5)
+        for thread in threads[1:]:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sorted(results), [('stats', False)] * 4 + [('stats', True)])
+        self.assertFalse(group.in_flight('key'))
+
+    def test_shared_flight_waits_for_published_result(self):
+        store = caches['default']
+        store.clear()
+        self.assertEqual(shared_flight(store, 'key', lambda: 'leader', 5, 0.01), ('leader', True))
+        store.add('flight-lock:other', 1, 5)
+        store.set('flight-result:other', 'published', 5)
+        self.assertEqual(shared_flight(store, 'other', lambda: 'recomputed', 5, 0.01), ('published', False))
+        # Verrou libéré sans résultat (calcul échoué): calcul local
+        self.assertEqual(shared_flight(store, 'failed', lambda: 'recomputed', 5, 0.01), ('recomputed', True))
@@ -0,0 +1,156 @@
+# transitions.py
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from shareholders.constants import KeycloakRoles
+
+from .responsecache import COMPANY_FIELD, invalidate_updated
+
+
+class InvalidTransition(APIException, ValueError):
+    """
+    Le graphe du workflow ne permet pas de passer de l'état courant à l'état demandé
+    """
+    status_code = status.HTTP_400_BAD_REQUEST
+    default_detail = "Transition d'état invalide."
+    default_code = 'invalid_transition'
+
+
+class TransitionConflict(APIException, ValueError):
+    """
+    L'objet n'est plus dans l'état attendu (modification concurrente ou version périmée)
+    """
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "L'objet a été modifié entre-temps, rechargez-le avant de réessayer."
+    default_code = 'conflict'
+
+
+class Transition:
+    """
+    Action de workflow: états source autorisés, état cible, rôles autorisés
+    et champ qui enregistre l'auteur
+    """
+
+    def __init__(self, name, sources, target, roles=(), actor_field=None):
+        self.name = name
+        self.sources = tuple(sources)
+        self.target = target
+        self.roles = tuple(roles)
+        self.actor_field = actor_field
+
+    def allows(self, user):
+        """
+        Vérifie les rôles Keycloak de l'utilisateur
+        """
+        keycloak_user = getattr(user, 'keycloak_user', None)
+        if keycloak_user is None:
+            return False
+        return not self.roles or any(keycloak_user.has_role(role) for role in self.roles)
+
+
+class Workflow:
+    """
+    Machine à états déclarative partagée par les modèles soumis à validation
+    """
+
+    def __init__(self, transitions, status_field='status'):
+        self.transitions = tuple(transitions)
+        self.status_field = status_field
+        self.by_name = {transition.name: transition for transition in self.transitions}
+
+    def get(self, name):
+        return self.by_name.get(name)
+
+    def find(self, current, target):
+        """
+        Transition menant de `current` à `target`, ou None
+        """
+        for transition in self.transitions:
+            if transition.target == target and current in transition.sources:
+                return transition
+        return None
+
+    def targets(self, current):
+        return [transition.target for transition in self.transitions if current in transition.sources]
+
+    def check(self, current, target):
+        """
+        Transition menant de `current` à `target`; lève InvalidTransition (un ValueError)
+        si le graphe ne le permet pas
+        """
+        transition = self.find(current, target)
+        if transition is None:
+            raise InvalidTransition(
+                f"Transition d'état invalide : '{current}' -> '{target}'. "
+                f"États possibles : {self.targets(current)}."
+            )
+        return transition
+
+    def apply(self, instance, target, user=None):
+        """
+        Passe l'instance à l'état `target` en mémoire (statut et auteur), sans sauvegarde
+        """
+        transition = self.check(getattr(instance, self.status_field), target)
+        setattr(instance, self.status_field, target)
+        if user is not None and transition.actor_field:
+            setattr(instance, transition.actor_field, user)
+        return transition
+
+    def update_values(self, model, transition, user=None):
+        """
+        Colonnes écrites par une transition: statut, auteur, version et date de modification
+        """
+        values = {self.status_field: transition.target}
+        if user is not None and transition.actor_field:
+            values[transition.actor_field] = user
+        field_names = {field.name for field in model._meta.concrete_fields}
+        if 'version' in field_names:
+            values['version'] = F('version') + 1
+        if 'updated_at' in field_names:
+            values['updated_at'] = timezone.now()
+        return values
+
+    def perform(self, instance, target, user=None, expected_version=None):
+        """
+        Transition en un seul UPDATE conditionnel
+        (WHERE pk = ... AND statut = attendu [AND version = attendue]) qui n'écrit
+        que les colonnes modifiées, suivi d'une seule ligne d'historique.
+        Lève InvalidTransition si le graphe ne le permet pas, TransitionConflict si l'objet
+        a changé depuis sa lecture.
+        """
+        model = type(instance)
+        current = getattr(instance, self.status_field)
+        transition = self.check(current, target)
+        values = self.update_values(model, transition, user)
+
+        filters = {'pk': instance.pk, self.status_field: current}
+        if expected_version is not None:
+            filters['version'] = expected_version
+        with transaction.atomic():
+            if not model._base_manager.filter(**filters).update(**values):
+                raise TransitionConflict()
+
+            for field_name, value in values.items():
+                if field_name != 'version':
+                    setattr(instance, field_name, value)
+            if 'version' in values:
+                # sans version attendue, la ligne a pu changer depuis sa lecture: la version
+                # écrite est relue sous le verrou posé par l'UPDATE
+                instance.version = model._base_manager.filter(pk=instance.pk).values_list('version', flat=True).get()
+            history = getattr(model, 'history', None)
+            if history is not None:
+                history.bulk_history_create([instance], update=True, default_user=user)
+            invalidate_updated(model, {getattr(instance, COMPANY_FIELD, None)})
+        return transition
+
+
+# SUBMITTED -> EXAMINED -> APPROVED / REJECTED, puis REJECTED -> SUBMITTED
+APPROVAL_WORKFLOW = Workflow([
+    Transition('submit', ['REJECTED'], 'SUBMITTED', [KeycloakRoles.EDITOR]),
+    Transition('examine', ['SUBMITTED'], 'EXAMINED', [KeycloakRoles.EXAMINER], 'examined_by'),
+    Transition('approve', ['EXAMINED'], 'APPROVED', [KeycloakRoles.APPROVER], 'approved_by'),
+    Transition('reject', ['EXAMINED'], 'REJECTED', [KeycloakRoles.APPROVER], 'approved_by'),
+])
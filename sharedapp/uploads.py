@@ -0,0 +1,206 @@
+# uploads.py
+import hashlib
+import os
+import shutil
+import tempfile
+import zlib
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.exceptions import NotFound, ValidationError
+
+from .constants import UploadStatus
+from .models import UploadSession
+from .storage import BLOB_PREFIX, CHUNK_SIZE, adjust_blob_references, pop_claim
+from .validation import FILE_SIGNATURES
+
+
+def staging_path(session):
+    return default_storage.path(os.path.join(BLOB_PREFIX, 'tmp', 'uploads', f'{session.pk}.part'))
+
+
+def remove_staging_file(session):
+    path = staging_path(session)
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def open_upload_session(user, filename, size, sha256=''):
+    """
+    Crée une session d'upload et son fichier de staging, préalloué à la taille annoncée
+    """
+    session = UploadSession.objects.create(
+        owner=user,
+        filename=filename,
+        size=size,
+        sha256=sha256.lower(),
+        chunk_size=settings.UPLOADS['CHUNK_SIZE'],
+        expires_at=timezone.now() + timedelta(hours=settings.UPLOADS['SESSION_HOURS']),
+    )
+    path = staging_path(session)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as staging:
+        staging.truncate(size)
+    return session
+
+
+def _open_session_or_error(session):
+    if session.status != UploadStatus.OPEN:
+        raise ValidationError({"status": f"Upload session is {session.status}"})
+    if session.expires_at <= timezone.now():
+        raise ValidationError({"status": "Upload session has expired"})
+
+
+def write_chunk(session, index, stream, expected_sha256=''):
+    """
+    Reçoit le bloc `index` dans un fichier temporaire, en le hachant et en le validant au fil
+    de la lecture (taille, signature du format pour le premier bloc, empreinte SHA-256 du bloc
+    si le client la fournit), puis le recopie à sa place dans le fichier de staging sous le
+    verrou de la session: un bloc renvoyé invalide ne remplace pas le bloc déjà accepté.
+    Les blocs peuvent arriver dans n'importe quel ordre et être renvoyés.
+    """
+    _open_session_or_error(session)
+    if not 0 <= index < session.chunk_count:
+        raise ValidationError({"index": f"Must be between 0 and {session.chunk_count - 1}"})
+    expected_length = min(session.chunk_size, session.size - index * session.chunk_size)
+
+    digest, written, head = hashlib.sha256(), 0, b''
+    path = staging_path(session)
+    with tempfile.NamedTemporaryFile(dir=os.path.dirname(path), prefix=f'{session.pk}.', suffix='.chunk') as received:
+        while True:
+            block = stream.read(min(CHUNK_SIZE, expected_length - written + 1))
+            if not block:
+                break
+            written += len(block)
+            if written > expected_length:
+                raise ValidationError({"chunk": f"Chunk {index} must be {expected_length} bytes"})
+            if index == 0 and len(head) < 16:
+                head += block[:16 - len(head)]
+            digest.update(block)
+            received.write(block)
+
+        if written != expected_length:
+            raise ValidationError({"chunk": f"Chunk {index} must be {expected_length} bytes, got {written}"})
+        if index == 0 and not head.startswith(FILE_SIGNATURES[session.extension]):
+            raise ValidationError({"chunk": f"Content does not match the {session.extension} format"})
+        digest = digest.hexdigest()
+        if expected_sha256 and digest != expected_sha256.lower():
+            raise ValidationError({"chunk": "SHA-256 mismatch, resend the chunk"})
+
+        with transaction.atomic():
+            session = UploadSession.objects.select_for_update().get(pk=session.pk)
+            _open_session_or_error(session)
+            received.seek(0)
+            with open(path, 'r+b') as staging:
+                staging.seek(index * session.chunk_size)
+                shutil.copyfileobj(received, staging, CHUNK_SIZE)
+            session.chunks[str(index)] = digest
+            session.save(update_fields=['chunks'])
+    return session
+
+
+def complete_upload(session):
+    """
+    Vérifie que tous les blocs sont reçus, calcule l'empreinte du fichier en une lecture
+    séquentielle du staging, puis le publie dans le stockage par renommage (sans copie)
+    """
+    with transaction.atomic():
+        session = UploadSession.objects.select_for_update().get(pk=session.pk)
+        if session.status == UploadStatus.COMPLETED:
+            return session
+        _open_session_or_error(session)
+        missing = [index for index in range(session.chunk_count) if str(index) not in session.chunks]
+        if missing:
+            raise ValidationError({"missing_chunks": missing[:100]})
+
+        path = staging_path(session)
+        digest, crc32 = hashlib.sha256(), 0
+        with open(path, 'rb') as staging:
+            for block in iter(lambda: staging.read(CHUNK_SIZE), b''):
+                digest.update(block)
+                crc32 = zlib.crc32(block, crc32)
+        digest = digest.hexdigest()
+        if session.sha256 and digest != session.sha256:
+            session.status = UploadStatus.FAILED
+            session.save(update_fields=['status'])
+            remove_staging_file(session)
+            return session
+
+        session.blob_name = default_storage.publish(path, digest, session.size, session.extension, crc32)
+        # La session garde la référence prise à la publication jusqu'à son expiration
+        pop_claim(session.blob_name)
+        session.sha256 = digest
+        session.status = UploadStatus.COMPLETED
+        session.save(update_fields=['blob_name', 'sha256', 'status'])
+    return session
+
+
+def resolve_upload(user, upload_id):
+    """
+    Nom du blob d'une session terminée de l'utilisateur, à référencer dans un FileField
+    """
+    session = UploadSession.objects.filter(
+        pk=upload_id, owner=user, status=UploadStatus.COMPLETED, expires_at__gt=timezone.now()
+    ).only('blob_name').first()
+    if session is None:
+        raise NotFound(f"No completed upload {upload_id}")
+    return session.blob_name
+
+
+def purge_upload_sessions():
+    """
+    Supprime les sessions expirées et leurs fichiers de staging, et rend la référence des
+    sessions terminées: les blobs jamais rattachés sont supprimés après validation
+    """
+    expired = list(UploadSession.objects.filter(expires_at__lte=timezone.now()))
+    with transaction.atomic():
+        for session in expired:
+            remove_staging_file(session)
+            if session.blob_name and session.status == UploadStatus.COMPLETED:
+                adjust_blob_references(Counter(), Counter({session.blob_name: 1}), default_storage)
+        UploadSession.objects.filter(pk__in=[session.pk for session in expired]).delete()
+    return len(expired)
+
+
+class UploadedFileFieldsMixin:
+    """
+    Mixin de serializer: chaque FileField peut aussi être fourni par référence à une session
+    d'upload terminée (`<champ>_upload`), le fichier étant rattaché sans recopie
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        self.upload_required_fields = set()
+        for name, field in list(fields.items()):
+            if isinstance(field, serializers.FileField) and not field.read_only:
+                if field.required:
+                    self.upload_required_fields.add(name)
+                    field.required = False
+                fields[f'{name}_upload'] = serializers.UUIDField(write_only=True, required=False)
+        return fields
+
+    def validate(self, attrs):
+        request = self.context.get('request')
+        errors = {}
+        for name, field in self.fields.items():
+            if not isinstance(field, serializers.FileField) or field.read_only:
+                continue
+            upload_id = attrs.pop(f'{name}_upload', None)
+            if upload_id is not None:
+                attrs[name] = resolve_upload(request.user, upload_id)
+                with default_storage.open(attrs[name]) as uploaded:
+                    uploaded.name = attrs[name]
+                    try:
+                        field.run_validators(uploaded)
+                    except ValidationError as e:
+                        errors[name] = e.detail
+            elif name in self.upload_required_fields and name not in attrs and self.instance is None:
+                errors[name] = ["This field is required."]
+        if errors:
+            raise ValidationError(errors)
+        return super().validate(attrs)
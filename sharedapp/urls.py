@@ -6,9 +6,13 @@ router = DefaultRouter()
 router.register(r'announcements', views.AnnouncementViewSet)
 router.register(r'notifications', views.NotificationViewSet)
 router.register(r'dividends', views.DividendViewSet)
+router.register(r'uploads', views.UploadSessionViewSet, basename='upload')
+router.register(r'duplicates', views.DuplicateCandidateViewSet, basename='duplicate')
 
 app_name = 'sharedapp'
 
 urlpatterns = [
+    path('events/stream/', views.event_stream_view, name='event-stream'),
+    path('media/<str:token>/', views.signed_media_view, name='signed-media'),
     path('', include(router.urls)),
 ]
\ No newline at end of file
@@ -0,0 +1,239 @@
+# validation.py
+"""
+Vérification approfondie des fichiers envoyés (signature, décodage des images, structure
+des PDF, suppression des métadonnées EXIF), exécutée hors des workers HTTP dans un pool
+de processus borné. Les fonctions d'inspection n'utilisent ni Django ni la base: elles
+tournent dans des processus lancés en mode `spawn`.
+"""
+import functools
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import zipfile
+import zlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+
+from PIL import Image, ImageOps
+
+# Premiers octets attendus par extension
+FILE_SIGNATURES = {
+    '.pdf': b'%PDF-',
+    '.png': b'\x89PNG\r\n\x1a\n',
+    '.jpg': b'\xff\xd8\xff',
+    '.jpeg': b'\xff\xd8\xff',
+    '.doc': b'\xd0\xcf\x11\xe0',
+    '.xls': b'\xd0\xcf\x11\xe0',
+    '.docx': b'PK\x03\x04',
+    '.xlsx': b'PK\x03\x04',
+}
+IMAGE_EXTENSIONS = {'.png', '.jpg', '.jpeg'}
+PDF_PAGE_RE = re.compile(rb'/Type\s*/Page(?![a-zA-Z])')
+PDF_TAIL_SIZE = 2048
+ORIENTATION_TAG = 0x0112
+READ_SIZE = 64 * 1024
+
+logger = logging.getLogger(__name__)
+
+
+class FileCheckError(Exception):
+    """
+    Le fichier ne correspond pas à son type déclaré
+    """
+
+
+def _check_signature(path, extension):
+    signature = FILE_SIGNATURES.get(extension)
+    if signature is None:
+        raise FileCheckError(f"Unsupported file type {extension}")
+    with open(path, 'rb') as content:
+        if content.read(len(signature)) != signature:
+            raise FileCheckError(f"Content does not match the {extension} format")
+
+
+def _check_pdf(path, max_pages):
+    """
+    Structure minimale (en-tête, startxref, %%EOF) et nombre de pages; les pages rangées
+    dans des flux d'objets compressés ne sont pas comptées (None)
+    """
+    with open(path, 'rb') as content:
+        content.seek(0, os.SEEK_END)
+        content.seek(max(content.tell() - PDF_TAIL_SIZE, 0))
+        tail = content.read()
+        if b'%%EOF' not in tail or b'startxref' not in tail:
+            raise FileCheckError("Truncated or malformed PDF")
+        content.seek(0)
+        pages, overlap = 0, b''
+        for block in iter(lambda: content.read(READ_SIZE), b''):
+            # Recouvrement pour les marqueurs à cheval sur deux blocs
+            window = overlap + block
+            pages += len(PDF_PAGE_RE.findall(window)) - len(PDF_PAGE_RE.findall(overlap))
+            overlap = block[-32:]
+    if pages > max_pages:
+        raise FileCheckError(f"PDF has {pages} pages, at most {max_pages} are allowed")
+    return pages or None
+
+
+def _check_office_archive(path):
+    try:
+        with zipfile.ZipFile(path) as archive:
+            if '[Content_Types].xml' not in archive.namelist():
+                raise FileCheckError("Not an Office Open XML document")
+    except zipfile.BadZipFile:
+        raise FileCheckError("Corrupted Office document")
+
+
+def _strip_metadata(path, extension, temporary_dir):
+    """
+    Décode entièrement l'image; si elle porte des métadonnées EXIF, la réécrit sans elles
+    (orientation appliquée) dans temporary_dir. Retourne (chemin, sha256, taille, crc32) ou None.
+    """
+    try:
+        with Image.open(path) as image:
+            image.verify()
+        with Image.open(path) as image:
+            image.load()
+            if 'exif' not in image.info and not image.getexif():
+                return None
+            image_format = image.format
+            cleaned = ImageOps.exif_transpose(image) if image.getexif().get(ORIENTATION_TAG, 1) != 1 else image
+            # Le JPEG d'origine est réenregistré avec ses tables de quantification (sans perte
+            # supplémentaire); une image retournée doit être réencodée
+            options = {'quality': 'keep' if cleaned is image else 95} if image_format == 'JPEG' else {}
+            with tempfile.NamedTemporaryFile(dir=temporary_dir, suffix=extension, delete=False) as temporary:
+                # Pillow n'écrit les métadonnées EXIF que si elles sont passées explicitement
+                cleaned.save(temporary, image_format, **options)
+    except (OSError, SyntaxError, Image.DecompressionBombError) as e:
+        raise FileCheckError(f"Unreadable image: {e}")
+
+    digest, size, crc32 = hashlib.sha256(), 0, 0
+    with open(temporary.name, 'rb') as content:
+        for block in iter(lambda: content.read(READ_SIZE), b''):
+            digest.update(block)
+            crc32 = zlib.crc32(block, crc32)
+            size += len(block)
+    return temporary.name, digest.hexdigest(), size, crc32
+
+
+def inspect_file(path, extension, max_pages, temporary_dir):
+    """
+    Exécuté dans un processus du pool. Retourne un dict: error (None si valide),
+    page_count, et cleaned (fichier réécrit sans EXIF) le cas échéant. Toute erreur levée
+    par un fichier malformé (et non les seules FileCheckError) devient un motif de rejet.
+    """
+    result = {'error': None, 'page_count': None, 'cleaned': None}
+    try:
+        _check_signature(path, extension)
+        if extension == '.pdf':
+            result['page_count'] = _check_pdf(path, max_pages)
+        elif extension in IMAGE_EXTENSIONS:
+            result['cleaned'] = _strip_metadata(path, extension, temporary_dir)
+        elif extension in ('.docx', '.xlsx'):
+            _check_office_archive(path)
+    except FileCheckError as e:
+        result['error'] = str(e)
+    except FileNotFoundError:
+        result['error'] = "File is missing"
+    except Exception as e:
+        result['error'] = f"Unreadable file: {type(e).__name__}: {e}"
+    return result
+
+
+def _raise(error):
+    raise error
+
+
+def _rejection(error):
+    return {'error': error, 'page_count': None, 'cleaned': None}
+
+
+def validate_pending_documents(workers=None, batch_size=None):
+    """
+    Vérifie les FileDocument en attente par lots, dans un pool de `workers` processus
+    (0: dans le processus courant), et les marque valides ou rejetés. Les lots sont lus par
+    pagination sur (uploaded_at, pk): un document resté en attente n'est pas relu. Un document
+    dont l'inspection ou l'enregistrement échoue est rejeté sans interrompre le lot. Retourne
+    (nombre de valides, nombre de rejetés).
+    """
+    from django.conf import settings
+    from django.core.files.storage import default_storage
+    from django.db import transaction
+    from django.db.models import Q
+    from django.utils import timezone
+
+    from shareholders.models import DocumentValidationStatus, FileDocument
+
+    config = settings.DOCUMENT_VALIDATION
+    workers = config['WORKERS'] if workers is None else workers
+    batch_size = batch_size or config['BATCH_SIZE']
+    temporary_dir = default_storage.path(os.path.join('blobs', 'tmp'))
+    os.makedirs(temporary_dir, exist_ok=True)
+    counts = {DocumentValidationStatus.VALID: 0, DocumentValidationStatus.REJECTED: 0}
+
+    def record(document, result):
+        if result['cleaned']:
+            path, digest, size, crc32 = result['cleaned']
+            extension = os.path.splitext(document.file.name)[1].lower()
+            document.file.name = default_storage.publish(path, digest, size, extension, crc32)
+        document.validation_status = (
+            DocumentValidationStatus.REJECTED if result['error'] else DocumentValidationStatus.VALID
+        )
+        document.validation_error = result['error'] or ''
+        document.page_count = result['page_count']
+        document.validated_at = timezone.now()
+        document.save(update_fields=['file', 'validation_status', 'validation_error', 'page_count', 'validated_at'])
+        counts[document.validation_status] += 1
+
+    def settle(document, outcome):
+        # Résultat de l'inspection (outcome()) enregistré, ou rejet du document s'il échoue
+        name = document.file.name
+        try:
+            with transaction.atomic():
+                record(document, outcome())
+        except Exception as e:
+            logger.exception("Validation of document %s failed", document.pk)
+            document.file.name = name
+            record(document, _rejection(f"Validation failed: {type(e).__name__}: {e}"))
+
+    def new_executor():
+        return ProcessPoolExecutor(max_workers=workers, mp_context=get_context('spawn'))
+
+    def arguments(document):
+        return (default_storage.path(document.file.name), os.path.splitext(document.file.name)[1].lower(),
+                config['MAX_PDF_PAGES'], temporary_dir)
+
+    executor = new_executor() if workers else None
+    try:
+        pending = FileDocument.objects.filter(validation_status=DocumentValidationStatus.PENDING)
+        last = None
+        while True:
+            remaining = pending
+            if last is not None:
+                remaining = pending.filter(Q(uploaded_at__gt=last.uploaded_at) | Q(uploaded_at=last.uploaded_at, pk__gt=last.pk))
+            batch = list(remaining.order_by('uploaded_at', 'pk')[:batch_size])
+            if not batch:
+                break
+            last = batch[-1]
+            if executor is None:
+                for document in batch:
+                    settle(document, lambda: inspect_file(*arguments(document)))
+                continue
+            futures = {}
+            for document in batch:
+                try:
+                    futures[executor.submit(inspect_file, *arguments(document))] = document
+                except Exception as e:
+                    settle(document, functools.partial(_raise, e))
+            for future in as_completed(futures):
+                settle(futures[future], future.result)
+            if any(isinstance(future.exception(), BrokenProcessPool) for future in futures):
+                # Processus du pool tué (mémoire, crash natif): nouveau pool pour les lots suivants
+                executor.shutdown()
+                executor = new_executor()
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    return counts[DocumentValidationStatus.VALID], counts[DocumentValidationStatus.REJECTED]
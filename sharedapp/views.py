@@ -1,21 +1,39 @@
 
 # Create your views here.
+from collections import defaultdict
 from datetime import timedelta
+from asgiref.sync import sync_to_async
+from django.contrib.contenttypes.models import ContentType
+from django.http import HttpResponse, StreamingHttpResponse
 from django.forms import ValidationError
-from rest_framework import viewsets, filters, status
+from rest_framework import mixins, viewsets, filters, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import AuthenticationFailed, NotAuthenticated, PermissionDenied
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.views import APIView
 from django_filters.rest_framework import DjangoFilterBackend
 from django.utils import timezone
 from django.db.models import Q
 
 from shareholders.constants import KeycloakRoles
 
-from .models import Announcement, Notification, Dividend
-from .serializers import AnnouncementSerializer, NotificationSerializer, DividendSerializer
-from .constants import NotificationStatus
-from shareholders.views import HasKeycloakRole
+from .models import Announcement, Notification, Dividend, DuplicateCandidate, UploadSession
+from .serializers import (AnnouncementSerializer, NotificationSerializer, DividendSerializer,
+                          DuplicateCandidateSerializer, UploadSessionSerializer)
+from .constants import DuplicateStatus, NotificationStatus, UploadStatus
+from .duplicates import pair_objects
+from .notifications import decrement_unread, get_unread_count, increment_unread
+from .responsecache import cached_response
+from issuingCompany.models import IssuingCompany
+from issuingCompany.views import IssuingCompanyViewSet
+from shareholders.models import ContactPerson, LegalShareholder, PhysicalShareholder
+from shareholders.views import HasKeycloakRole, LegalShareholderViewSet, PhysicalShareholderViewSet
+from swenshares.auth import KeycloakAuthentication
+from .events import broker, event_stream
+from .http import ConditionalGetMixin, signed_media_response
+from .search import search_visible
+from .uploads import complete_upload, open_upload_session, remove_staging_file, write_chunk
 from django.db.models import Sum, Avg, Count
 
 # ViewSet pour la gestion des annonces
@@ -134,14 +152,34 @@ class NotificationViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         return self.queryset.filter(recipient=self.request.user)
 
+    def perform_create(self, serializer):
+        notification = serializer.save()
+        if not notification.is_read:
+            increment_unread({notification.recipient_id: 1})
+
+    def perform_update(self, serializer):
+        previous_recipient_id = serializer.instance.recipient_id
+        was_unread = not serializer.instance.is_read
+        notification = serializer.save()
+        if was_unread:
+            decrement_unread(previous_recipient_id)
+        if not notification.is_read:
+            increment_unread({notification.recipient_id: 1})
+
+    def perform_destroy(self, instance):
+        instance.delete()
+        if not instance.is_read:
+            decrement_unread(instance.recipient_id)
+
     @action(detail=True, methods=['POST'])
     def mark_as_read(self, request, pk=None):
         """
         Marque une notification comme lue
         """
         notification = self.get_object()
-        notification.is_read = True
-        notification.save()
+        # Mise à jour conditionnelle: seul le passage non lu -> lu décrémente le compteur
+        if Notification.objects.filter(pk=notification.pk, is_read=False).update(is_read=True):
+            decrement_unread(notification.recipient_id)
         return Response({"status": "notification marked as read"})
 
     @action(detail=True, methods=['POST'])
@@ -155,6 +193,11 @@ class NotificationViewSet(viewsets.ModelViewSet):
                 {"error": "Only pending notifications can be sent"},
                 status=status.HTTP_400_BAD_REQUEST
             )
+        if notification.digest_id:
+            return Response(
+                {"error": "This notification will be sent with its digest"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
         notification.status = NotificationStatus.SENT
         notification.date_sent = timezone.now()
@@ -166,7 +209,8 @@ class NotificationViewSet(viewsets.ModelViewSet):
         """
         Marque toutes les notifications de l'utilisateur comme lues
         """
-        self.get_queryset().filter(is_read=False).update(is_read=True)
+        updated = self.get_queryset().filter(is_read=False).update(is_read=True)
+        decrement_unread(request.user.pk, updated)
         return Response({"status": "all notifications marked as read"})
 
     @action(detail=False, methods=['GET'])
@@ -174,8 +218,7 @@ class NotificationViewSet(viewsets.ModelViewSet):
         """
         Retourne le nombre de notifications non lues
         """
-        count = self.get_queryset().filter(is_read=False).count()
-        return Response({"unread_count": count})
+        return Response({"unread_count": get_unread_count(request.user.pk)})
 
     @action(detail=True, methods=['POST'])
     def resend(self, request, pk=None):
@@ -195,7 +238,7 @@ class NotificationViewSet(viewsets.ModelViewSet):
     
 
 # ViewSet pour la gestion des dividendes
-class DividendViewSet(viewsets.ModelViewSet):
+class DividendViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     """
     ViewSet pour la gestion des dividendes
     """
@@ -230,12 +273,13 @@ class DividendViewSet(viewsets.ModelViewSet):
         return Response({"status": "dividend validated"})
 
     @action(detail=False, methods=['GET'])
+    @cached_response(company_param='issuing_company')
     def upcoming_payments(self, request):
         """
         Liste les paiements de dividendes à venir
         """
         now = timezone.now().date()
-        upcoming = self.queryset.filter(
+        upcoming = self.filter_queryset(self.get_queryset()).filter(
             payment_date__gt=now,
             is_validated=True
         ).order_by('payment_date')
@@ -243,11 +287,12 @@ class DividendViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
     
     @action(detail=False, methods=['GET'])
+    @cached_response(company_param='issuing_company')
     def statistics(self, request):
         """
         Fournit des statistiques sur les dividendes
         """
-        queryset = self.get_queryset()
+        queryset = self.filter_queryset(self.get_queryset())
         current_year = timezone.now().year
         stats = {
             'total_amount_this_year': queryset.filter(
@@ -269,6 +314,7 @@ class DividendViewSet(viewsets.ModelViewSet):
         return Response(stats)
 
     @action(detail=False, methods=['GET'])
+    @cached_response(company_param='issuing_company')
     def payment_calendar(self, request):
         """
         Retourne un calendrier des paiements de dividendes
@@ -283,7 +329,7 @@ class DividendViewSet(viewsets.ModelViewSet):
         )
         
         try:
-            payments = self.queryset.filter(
+            payments = self.filter_queryset(self.get_queryset()).filter(
                 payment_date__range=[start_date, end_date],
                 is_validated=True
             ).order_by('payment_date')
@@ -317,4 +363,242 @@ class DividendViewSet(viewsets.ModelViewSet):
         dividend.is_validated = False
         dividend.validated_by = None
         dividend.save()
-        return Response({"status": "dividend validation cancelled"})
\ No newline at end of file
+        return Response({"status": "dividend validation cancelled"})
+
+
+class GlobalSearchView(APIView):
+    """
+    Recherche unifiée (nom, NINEA, RCCM, numéro de référence...) sur les actionnaires physiques
+    et moraux, les sociétés émettrices et les personnes de contact. Les résultats sont typés,
+    classés ensemble par pertinence et limités à ce que l'utilisateur voit sur chaque écran.
+    """
+    permission_classes = [IsAuthenticated]
+    default_limit = 20
+    max_limit = 50
+
+    result_types = {
+        PhysicalShareholder: 'physical_shareholder',
+        LegalShareholder: 'legal_shareholder',
+        IssuingCompany: 'issuing_company',
+        ContactPerson: 'contact_person',
+    }
+
+    def visible_querysets(self, request):
+        """
+        {modèle: queryset visible}: même filtrage et mêmes permissions que la liste de chaque
+        écran; une personne de contact est visible via un actionnaire visible
+        """
+        querysets = {}
+        for viewset_class in (PhysicalShareholderViewSet, LegalShareholderViewSet, IssuingCompanyViewSet):
+            view = viewset_class(request=request, action='list', format_kwarg=None, args=(), kwargs={})
+            try:
+                view.check_permissions(request)
+            except (PermissionDenied, NotAuthenticated):
+                continue
+            querysets[view.queryset.model] = view.get_queryset().prefetch_related(None)
+
+        contacts = Q()
+        for model in (PhysicalShareholder, LegalShareholder):
+            if model in querysets:
+                contacts |= Q(**{f'{model._meta.model_name}__in': querysets[model].values('pk')})
+        if contacts:
+            querysets[ContactPerson] = ContactPerson.objects.filter(contacts).distinct()
+        return querysets
+
+    def get(self, request):
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response({"error": "Parameter q is required"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = min(int(request.query_params.get('limit', self.default_limit)), self.max_limit)
+        except ValueError:
+            return Response({"error": "limit must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+
+        querysets = self.visible_querysets(request)
+        types = request.query_params.getlist('type')
+        if types:
+            querysets = {model: qs for model, qs in querysets.items() if self.result_types[model] in types}
+        hits = search_visible(querysets, query, limit=limit) if querysets else []
+
+        ids = defaultdict(list)
+        for model, object_id, _ in hits:
+            ids[model].append(object_id)
+        visible = {
+            (model, str(instance.pk)): instance
+            for model, object_ids in ids.items()
+            for instance in querysets[model].filter(pk__in=object_ids)
+        }
+        results = [
+            {
+                'type': self.result_types[model],
+                'id': object_id,
+                'label': str(visible[(model, object_id)]),
+                'score': score,
+            }
+            for model, object_id, score in hits if (model, object_id) in visible
+        ][:limit]
+        return Response({'query': query, 'count': len(results), 'results': results})
+
+
+class DuplicateCandidateViewSet(mixins.ListModelMixin, mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+    """
+    File de revue des doublons d'actionnaires détectés par la commande detect_duplicates:
+    paires par score décroissant (paramètres status, en attente par défaut, type et
+    shareholder), puis POST review/ avec decision=confirm ou dismiss
+    """
+    serializer_class = DuplicateCandidateSerializer
+    permission_classes = [IsAuthenticated]
+
+    result_types = {
+        PhysicalShareholder: 'physical_shareholder',
+        LegalShareholder: 'legal_shareholder',
+    }
+    decisions = {
+        'confirm': DuplicateStatus.CONFIRMED,
+        'dismiss': DuplicateStatus.DISMISSED,
+    }
+
+    def get_permissions(self):
+        return [HasKeycloakRole([KeycloakRoles.ADMIN, KeycloakRoles.EXAMINER, KeycloakRoles.APPROVER])]
+
+    def get_queryset(self):
+        queryset = DuplicateCandidate.objects.select_related('reviewed_by').order_by('-score', 'pk')
+        if self.action != 'list':
+            return queryset
+        params = self.request.query_params
+        queryset = queryset.filter(status=params.get('status', DuplicateStatus.PENDING))
+        types = params.getlist('type')
+        if types:
+            content_types = ContentType.objects.get_for_models(*self.result_types)
+            queryset = queryset.filter(content_type__in=[
+                content_type for model, content_type in content_types.items() if self.result_types[model] in types
+            ])
+        shareholder = params.get('shareholder')
+        if shareholder:
+            queryset = queryset.filter(Q(first_id=shareholder) | Q(second_id=shareholder))
+        return queryset
+
+    def get_serializer(self, *args, **kwargs):
+        instance = args[0] if args else None
+        candidates = instance if kwargs.get('many') else [instance] if instance is not None else []
+        content_types = ContentType.objects.get_for_models(*self.result_types)
+        kwargs['context'] = {
+            **self.get_serializer_context(),
+            'types': {content_type.pk: self.result_types[model] for model, content_type in content_types.items()},
+            'shareholders': pair_objects(candidates),
+        }
+        return super().get_serializer(*args, **kwargs)
+
+    @action(detail=True, methods=['POST'])
+    def review(self, request, pk=None):
+        """
+        Enregistre la décision du relecteur: doublon confirmé ou fausse alerte; une paire
+        écartée n'est plus proposée par les détections suivantes
+        """
+        candidate = self.get_object()
+        decision = self.decisions.get(request.data.get('decision'))
+        if decision is None:
+            return Response(
+                {"error": f"decision must be one of: {', '.join(self.decisions)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        candidate.status = decision
+        candidate.reviewed_by = request.user
+        candidate.reviewed_at = timezone.now()
+        candidate.save(update_fields=['status', 'reviewed_by', 'reviewed_at'])
+        return Response(self.get_serializer(candidate).data)
+
+
+def authenticate_stream_request(request):
+    """
+    EventSource ne permet pas d'envoyer d'en-tête: le jeton peut aussi
+    être passé dans le paramètre `token`
+    """
+    authentication = KeycloakAuthentication()
+    try:
+        token = request.GET.get('token')
+        result = authentication.authenticate_token(token) if token else authentication.authenticate(request)
+    except AuthenticationFailed:
+        return None
+    return result[0] if result else None
+
+
+def signed_media_view(request, token):
+    """
+    Téléchargement d'un document par URL signée (voir DocumentBundleMixin.document_links):
+    ni authentification ni accès à la base, l'accès a été contrôlé à l'émission de l'URL
+    """
+    if request.method not in ('GET', 'HEAD'):
+        return HttpResponse(status=status.HTTP_405_METHOD_NOT_ALLOWED, headers={'Allow': 'GET, HEAD'})
+    return signed_media_response(request, token)
+
+
+async def event_stream_view(request):
+    """
+    Flux SSE (text/event-stream) des notifications et changements de statut
+    de l'utilisateur connecté. A servir via swenshares.asgi.
+    """
+    user = await sync_to_async(authenticate_stream_request)(request)
+    if user is None:
+        return HttpResponse(status=status.HTTP_401_UNAUTHORIZED)
+
+    cursor = request.headers.get('Last-Event-ID') or request.GET.get('cursor')
+    try:
+        cursor = int(cursor)
+    except (TypeError, ValueError):
+        # Depuis le premier id encore susceptible d'être validé en retard: aucun événement sauté
+        cursor = await sync_to_async(broker.stable_id)()
+
+    response = StreamingHttpResponse(event_stream(user.pk, cursor), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+# ViewSet pour les uploads par blocs reprenables
+class UploadSessionViewSet(mixins.CreateModelMixin, mixins.RetrieveModelMixin,
+                           mixins.DestroyModelMixin, viewsets.GenericViewSet):
+    """
+    Upload reprenable: POST crée la session, PUT chunks/<index>/ envoie chaque bloc
+    (corps brut, en-tête X-Chunk-Sha256 facultatif), GET indique les blocs reçus pour
+    reprendre, POST complete/ finalise. Le fichier obtenu se rattache ensuite à un
+    FileDocument ou à un champ fichier par son identifiant (`<champ>_upload`).
+    """
+    serializer_class = UploadSessionSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return UploadSession.objects.filter(owner=self.request.user)
+
+    def perform_create(self, serializer):
+        data = serializer.validated_data
+        serializer.instance = open_upload_session(
+            self.request.user, data['filename'], data['size'], data.get('sha256', '')
+        )
+
+    def perform_destroy(self, instance):
+        remove_staging_file(instance)
+        instance.delete()
+
+    @action(detail=True, methods=['PUT'], url_path=r'chunks/(?P<index>\d+)')
+    def chunk(self, request, pk=None, index=None):
+        """
+        Reçoit un bloc et l'écrit directement dans le fichier de staging
+        """
+        session = write_chunk(
+            self.get_object(), int(index), request.stream, request.headers.get('X-Chunk-Sha256', '')
+        )
+        return Response(self.get_serializer(session).data)
+
+    @action(detail=True, methods=['POST'])
+    def complete(self, request, pk=None):
+        """
+        Finalise l'upload une fois tous les blocs reçus
+        """
+        session = complete_upload(self.get_object())
+        if session.status != UploadStatus.COMPLETED:
+            return Response(
+                {"error": "SHA-256 of the assembled file does not match"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response(self.get_serializer(session).data)
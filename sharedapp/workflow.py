@@ -0,0 +1,248 @@
+# workflow.py
+from collections import defaultdict
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import transaction
+from django.db.models import Max
+from rest_framework import serializers
+from rest_framework.decorators import action
+from rest_framework.exceptions import PermissionDenied, ValidationError
+from rest_framework.response import Response
+
+from .history import parse_positive_int
+from .models import WorkflowEvent
+from .notifications import notify_bulk_status_change
+from .responsecache import COMPANY_FIELD, invalidate_updated
+
+SUMMARY_FIELDS = ('action', 'from_status', 'to_status', 'actor__username', 'created_at')
+
+
+def record_transition(instance, action_name, from_status, actor, comment=''):
+    """
+    Enregistre une transition de workflow en une seule insertion, sans réécrire l'entité
+    """
+    return WorkflowEvent.objects.create(
+        content_type=ContentType.objects.get_for_model(instance),
+        object_id=str(instance.pk),
+        action=action_name,
+        from_status=from_status or '',
+        to_status=instance.status,
+        actor=actor,
+        comment=comment or '',
+    )
+
+
+def get_expected_version(request):
+    """
+    Version de l'objet connue du client (`version`), pour le contrôle de concurrence optimiste
+    """
+    version = request.data.get('version')
+    if version in (None, ''):
+        return None
+    try:
+        version = int(version)
+    except (TypeError, ValueError):
+        raise ValidationError({"version": "Must be an integer"})
+    if version < 0:
+        raise ValidationError({"version": "Must be positive"})
+    return version
+
+
+def apply_bulk_transition(queryset, transition, actor, comment=''):
+    """
+    Applique une transition aux objets du queryset: le graphe est vérifié en mémoire, puis
+    les lignes encore dans un état source sont verrouillées (SELECT ... FOR UPDATE) et seules
+    celles-ci sont mises à jour, par un UPDATE conditionnel par état source; l'historique et
+    les événements de workflow sont écrits en masse pour ces seules lignes.
+    Retourne (objets mis à jour, {id: statut} des objets ignorés).
+    """
+    model = queryset.model
+    status_field = model.workflow.status_field
+    candidates, skipped = {}, {}
+    for instance in queryset:
+        current = getattr(instance, status_field)
+        if current in transition.sources:
+            candidates[instance.pk] = instance
+        else:
+            skipped[str(instance.pk)] = current
+
+    values = model.workflow.update_values(model, transition, actor)
+    locked_fields = ['pk', status_field] + (['version'] if 'version' in values else [])
+
+    updated, from_statuses = [], {}
+    with transaction.atomic():
+        # Etat de chaque ligne au moment du verrou, dans l'ordre des clés (pas d'interblocage)
+        locked = {
+            row['pk']: row for row in model.objects.select_for_update()
+            .filter(pk__in=list(candidates), **{f'{status_field}__in': transition.sources})
+            .order_by('pk').values(*locked_fields)
+        }
+        # Objets qui ont changé d'état entre la lecture et le verrou
+        skipped.update(
+            (str(pk), getattr(instance, status_field)) for pk, instance in candidates.items() if pk not in locked
+        )
+        by_source = defaultdict(list)
+        for pk, row in locked.items():
+            by_source[row[status_field]].append(candidates[pk])
+
+        for source, group in by_source.items():
+            model.objects.filter(pk__in=[instance.pk for instance in group], **{status_field: source}).update(**values)
+            for instance in group:
+                for field_name, value in values.items():
+                    if field_name != 'version':
+                        setattr(instance, field_name, value)
+                if 'version' in values:
+                    instance.version = locked[instance.pk]['version'] + 1
+                from_statuses[instance.pk] = source
+            updated += group
+        invalidate_updated(model, {getattr(instance, COMPANY_FIELD, None) for instance in updated})
+
+        if updated:
+            model.history.bulk_history_create(
+                updated, update=True, default_user=actor, default_change_reason=transition.name
+            )
+            content_type = ContentType.objects.get_for_model(model)
+            WorkflowEvent.objects.bulk_create([
+                WorkflowEvent(
+                    content_type=content_type,
+                    object_id=str(instance.pk),
+                    action=transition.name,
+                    from_status=from_statuses[instance.pk],
+                    to_status=transition.target,
+                    actor=actor,
+                    comment=comment or '',
+                )
+                for instance in updated
+            ], batch_size=500)
+            notify_bulk_status_change(updated, actor, comment)
+    return updated, skipped
+
+
+def latest_workflow_events(instances):
+    """
+    {object_id: résumé du dernier événement} pour une page d'objets d'un même modèle,
+    en une seule requête
+    """
+    instances = list(instances)
+    if not instances:
+        return {}
+    latest_ids = (
+        WorkflowEvent.objects.filter(
+            content_type=ContentType.objects.get_for_model(instances[0]),
+            object_id__in=[str(instance.pk) for instance in instances]
+        )
+        .order_by().values('object_id').annotate(latest_id=Max('id')).values('latest_id')
+    )
+    rows = WorkflowEvent.objects.filter(id__in=latest_ids).values('object_id', *SUMMARY_FIELDS)
+    return {row.pop('object_id'): row for row in rows}
+
+
+class LatestWorkflowEventField(serializers.Field):
+    """
+    Résumé du dernier événement de workflow, préparé pour toute la page par WorkflowEventMixin
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(source='*', read_only=True, **kwargs)
+
+    def to_representation(self, instance):
+        return self.context.get('latest_events', {}).get(str(instance.pk))
+
+
+class WorkflowEventMixin:
+    """
+    Mixin pour les ViewSets à workflow: les listes portent le résumé du dernier
+    événement au lieu des notes, et l'action `events` retourne le journal de l'objet.
+    """
+    workflow_list_excluded_fields = ('notes',)
+    workflow_events_page_size = 50
+    workflow_events_max_page_size = 200
+
+    def get_list_validator_values(self):
+        # Les listes portent le dernier événement: tout nouvel événement du modèle les périme
+        parent = getattr(super(), 'get_list_validator_values', None)
+        latest_id = WorkflowEvent.objects.filter(
+            content_type=ContentType.objects.get_for_model(self.queryset.model)
+        ).aggregate(latest_id=Max('id'))['latest_id']
+        return [*(parent() if parent is not None else []), latest_id]
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.action == 'list':
+            queryset = queryset.defer(*self.workflow_list_excluded_fields)
+        return queryset
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        if self.action == 'list' and kwargs.get('many') and args:
+            serializer.context['latest_events'] = latest_workflow_events(args[0])
+            fields = serializer.child.fields
+            for field_name in self.workflow_list_excluded_fields:
+                fields.pop(field_name, None)
+            fields['latest_event'] = LatestWorkflowEventField()
+        return serializer
+
+    @action(detail=True, methods=['GET'])
+    def events(self, request, pk=None):
+        """
+        Journal des transitions de l'objet, du plus récent au plus ancien, paginé par `before`
+        """
+        instance = self.get_object()
+        page_size = parse_positive_int(
+            request.query_params, 'page_size', self.workflow_events_page_size, self.workflow_events_max_page_size
+        )
+        before = parse_positive_int(request.query_params, 'before')
+
+        events = WorkflowEvent.objects.filter(
+            content_type=ContentType.objects.get_for_model(instance),
+            object_id=str(instance.pk)
+        )
+        if before:
+            events = events.filter(id__lt=before)
+        rows = list(
+            events.order_by('-id').values('id', 'actor_id', 'comment', *SUMMARY_FIELDS)[:page_size + 1]
+        )
+        return Response({
+            'results': rows[:page_size],
+            'next': rows[page_size - 1]['id'] if len(rows) > page_size else None,
+        })
+
+
+class BulkTransitionMixin:
+    """
+    Mixin ajoutant l'action `bulk_transition` aux ViewSets dont le modèle déclare un `workflow`
+    """
+    bulk_transition_max_size = 500
+
+    @action(detail=False, methods=['POST'])
+    def bulk_transition(self, request):
+        """
+        Applique la transition `transition` aux objets `ids` visibles par l'utilisateur
+        """
+        model = self.get_queryset().model
+        transition = model.workflow.get(request.data.get('transition'))
+        if transition is None:
+            raise ValidationError({"transition": f"Transitions possibles : {list(model.workflow.by_name)}"})
+        if not transition.allows(request.user):
+            raise PermissionDenied(f"Role required for '{transition.name}': {', '.join(transition.roles)}")
+
+        ids = request.data.get('ids')
+        if not isinstance(ids, list) or not ids:
+            raise ValidationError({"ids": "A non-empty list is required"})
+        if len(ids) > self.bulk_transition_max_size:
+            raise ValidationError({"ids": f"At most {self.bulk_transition_max_size} objects per request"})
+        try:
+            pks = {model._meta.pk.to_python(value) for value in ids}
+        except DjangoValidationError:
+            raise ValidationError({"ids": "Invalid identifier"})
+
+        queryset = self.filter_queryset(self.get_queryset()).filter(pk__in=pks)
+        updated, skipped = apply_bulk_transition(queryset, transition, request.user, request.data.get('comment', ''))
+
+        found = {str(instance.pk) for instance in updated} | skipped.keys()
+        return Response({
+            'updated': [str(instance.pk) for instance in updated],
+            'skipped': [{'id': pk, 'status': current} for pk, current in skipped.items()],
+            'not_found': sorted(str(pk) for pk in pks if str(pk) not in found),
+        })
@@ -0,0 +1,27 @@
+# Generated by Django 5.1.3 on 2026-10-19 10:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shareholders', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='KeycloakUserRole',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('role', models.CharField(max_length=50)),
+                ('keycloak_user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='role_entries', to='shareholders.keycloakuser')),
+            ],
+            options={
+                'verbose_name': 'Keycloak User Role',
+                'verbose_name_plural': 'Keycloak User Roles',
+                'constraints': [models.UniqueConstraint(fields=('role', 'keycloak_user'), name='unique_keycloak_user_role')],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+from django.db import migrations
+
+
+def populate_role_entries(apps, schema_editor):
+    KeycloakUser = apps.get_model('shareholders', 'KeycloakUser')
+    KeycloakUserRole = apps.get_model('shareholders', 'KeycloakUserRole')
+    entries = [
+        KeycloakUserRole(keycloak_user_id=keycloak_user_id, role=role)
+        for keycloak_user_id, roles in KeycloakUser.objects.values_list('id', 'roles').iterator()
+        for role in set(roles or [])
+    ]
+    KeycloakUserRole.objects.bulk_create(entries, batch_size=1000, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shareholders', '0002_keycloakuserrole'),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_role_entries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.1.3 on 2026-10-19 11:03
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('issuingCompany', '0004_transaction_updated_at'),
+        ('sharedapp', '0004_streamevent'),
+        ('shareholders', '0003_populate_keycloakuserrole'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='legalshareholder',
+            index=models.Index(fields=['updated_at'], name='shareholder_updated_3662b9_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='physicalshareholder',
+            index=models.Index(fields=['updated_at'], name='shareholder_updated_937c24_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.1.3 on 2026-10-19 11:06
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('issuingCompany', '0005_historical_company_date_indexes'),
+        ('shareholders', '0004_shareholder_updated_at_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='historicallegalshareholder',
+            index=models.Index(fields=['issuing_company', 'history_date'], name='shareholder_issuing_6661b1_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='historicalphysicalshareholder',
+            index=models.Index(fields=['issuing_company', 'history_date'], name='shareholder_issuing_f5799d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='historicalshare',
+            index=models.Index(fields=['issuing_company', 'history_date'], name='shareholder_issuing_7aee64_idx'),
+        ),
+    ]
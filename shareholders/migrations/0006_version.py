@@ -0,0 +1,33 @@
+# Generated by Django 5.1.3 on 2026-10-19 11:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shareholders', '0005_historical_company_date_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='historicallegalshareholder',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='historicalphysicalshareholder',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='legalshareholder',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='physicalshareholder',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
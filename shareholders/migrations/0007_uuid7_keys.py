@@ -0,0 +1,49 @@
+# Generated by Django 5.1.3 on 2026-10-19 11:18
+
+import sharedapp.ids
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shareholders', '0006_version'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='filedocument',
+            name='id',
+            field=models.UUIDField(default=sharedapp.ids.uuid7, editable=False, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='historicallegalshareholder',
+            name='id',
+            field=models.UUIDField(db_index=True, default=sharedapp.ids.uuid7, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='historicalphysicalshareholder',
+            name='id',
+            field=models.UUIDField(db_index=True, default=sharedapp.ids.uuid7, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='historicalshare',
+            name='id',
+            field=models.UUIDField(db_index=True, default=sharedapp.ids.uuid7, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='legalshareholder',
+            name='id',
+            field=models.UUIDField(default=sharedapp.ids.uuid7, editable=False, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='physicalshareholder',
+            name='id',
+            field=models.UUIDField(default=sharedapp.ids.uuid7, editable=False, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='share',
+            name='id',
+            field=models.UUIDField(default=sharedapp.ids.uuid7, editable=False, primary_key=True, serialize=False),
+        ),
+    ]
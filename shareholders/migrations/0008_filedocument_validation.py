@@ -0,0 +1,40 @@
+# Generated by Django 5.1.3 on 2026-10-19 11:34
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('shareholders', '0007_uuid7_keys'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='filedocument',
+            name='page_count',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='filedocument',
+            name='validated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='filedocument',
+            name='validation_error',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='filedocument',
+            name='validation_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('valid', 'Valid'), ('rejected', 'Rejected')], default='pending', max_length=10),
+        ),
+        migrations.AddIndex(
+            model_name='filedocument',
+            index=models.Index(fields=['validation_status', 'uploaded_at'], name='shareholder_validat_752949_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.3 on 2026-10-19 13:35
+
+import shareholders.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shareholders', '0009_address_updated_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='filedocument',
+            name='file',
+            field=models.FileField(db_index=True, max_length=255, upload_to=shareholders.models.document_file_path, validators=[shareholders.models.validate_file_extension]),
+        ),
+    ]
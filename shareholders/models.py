@@ -11,6 +11,9 @@ from django.utils import timezone
 
 from shareholders.constants import KeycloakRoles, ShareholderStatus
 from simple_history.models import HistoricalRecords
+from sharedapp.historical import IndexedHistoricalRecords
+from sharedapp.ids import uuid7
+from sharedapp.transitions import APPROVAL_WORKFLOW
 from django.contrib.contenttypes.fields import GenericForeignKey
 
 from django.contrib.contenttypes.fields import GenericRelation
@@ -29,6 +32,14 @@ class DocumentType(models.TextChoices):
     REGISTRATION = 'registration', 'Registration Document'
     OTHER = 'other', 'Other Document'
 
+class DocumentValidationStatus(models.TextChoices):
+    """
+    Result of the background content verification of an uploaded document
+    """
+    PENDING = 'pending', 'Pending'
+    VALID = 'valid', 'Valid'
+    REJECTED = 'rejected', 'Rejected'
+
 def document_file_path(instance, filename):
     """
     Generate a unique file path for uploaded documents
@@ -54,11 +65,12 @@ class FileDocument(models.Model):
     """
     Generic model for managing files across different models
     """
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
     file = models.FileField(
         upload_to=document_file_path, 
         validators=[validate_file_extension],
-        max_length=255
+        max_length=255,
+        db_index=True
     )
     document_type = models.CharField(
         max_length=30, 
@@ -81,6 +93,15 @@ class FileDocument(models.Model):
         null=True, 
         related_name='verified_documents'
     )
+    # Content verification (signature, image decoding, PDF structure) run by validate_documents
+    validation_status = models.CharField(
+        max_length=10,
+        choices=DocumentValidationStatus.choices,
+        default=DocumentValidationStatus.PENDING
+    )
+    validation_error = models.TextField(blank=True)
+    page_count = models.PositiveIntegerField(null=True, blank=True)
+    validated_at = models.DateTimeField(null=True, blank=True)
 
     # Generic relation to link documents to any model
     content_type = models.ForeignKey('contenttypes.ContentType', on_delete=models.CASCADE)
@@ -91,6 +112,7 @@ class FileDocument(models.Model):
         ordering = ['-uploaded_at']
         indexes = [
             models.Index(fields=['content_type', 'object_id']),
+            models.Index(fields=['validation_status', 'uploaded_at']),
         ]
 
     def __str__(self):
@@ -120,7 +142,57 @@ class KeycloakUser(models.Model):
     def has_role(self, role):
         """Vérifie si l'utilisateur a un rôle spécifique"""
         return role in self.roles
-    
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'roles' in update_fields:
+            self.sync_role_entries()
+
+    def sync_role_entries(self):
+        """
+        Synchronise la table indexée des rôles avec le champ JSON `roles`
+        """
+        roles = set(self.roles or [])
+        existing = set(self.role_entries.values_list('role', flat=True))
+        if existing - roles:
+            self.role_entries.filter(role__in=existing - roles).delete()
+        if roles - existing:
+            KeycloakUserRole.objects.bulk_create(
+                [KeycloakUserRole(keycloak_user=self, role=role) for role in roles - existing],
+                ignore_conflicts=True
+            )
+
+    @classmethod
+    def user_ids_with_roles(cls, roles):
+        """
+        Retourne les identifiants des utilisateurs actifs ayant au moins un des rôles
+        """
+        return User.objects.filter(
+            is_active=True,
+            keycloak_user__is_active=True,
+            keycloak_user__role_entries__role__in=roles
+        ).values_list('id', flat=True).distinct()
+
+
+class KeycloakUserRole(models.Model):
+    """
+    Index des rôles Keycloak, dénormalisé depuis KeycloakUser.roles
+    pour retrouver les utilisateurs d'un rôle sans parcourir le JSON
+    """
+    keycloak_user = models.ForeignKey(KeycloakUser, on_delete=models.CASCADE, related_name='role_entries')
+    role = models.CharField(max_length=50)
+
+    class Meta:
+        verbose_name = 'Keycloak User Role'
+        verbose_name_plural = 'Keycloak User Roles'
+        constraints = [
+            models.UniqueConstraint(fields=['role', 'keycloak_user'], name='unique_keycloak_user_role'),
+        ]
+
+    def __str__(self):
+        return f"{self.keycloak_user} - {self.role}"
+
 
 # Ajout de la classe ContactPerson pour les actionnaires physiques
 class ContactPerson(models.Model):
@@ -156,6 +228,7 @@ class Address(models.Model):
     country = models.CharField(max_length=100)  # Pays
     is_primary = models.BooleanField(default=False)  # Indique si l'adresse est principale
     effective_date = models.DateField()  # Date d'effet de l'adresse
+    updated_at = models.DateTimeField(auto_now=True)  # Validateur des réponses qui l'imbriquent
 
     class Meta:
         verbose_name_plural = 'addresses'
@@ -178,7 +251,7 @@ class Shareholder(models.Model):
     Modèle de base pour les actionnaires (physiques et moraux)
     """
 
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
     # Modification ici pour utiliser le User model de Django
     created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='%(class)s_created')
     examined_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='%(class)s_examined')
@@ -188,6 +261,7 @@ class Shareholder(models.Model):
     activity_sector = models.CharField(max_length=255)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    version = models.PositiveIntegerField(default=0)  # Incrémentée à chaque transition de statut
     notes = models.TextField(blank=True)  # Nouveau champ pour les notes
     total_shares = models.PositiveIntegerField(
         validators=[
@@ -198,7 +272,8 @@ class Shareholder(models.Model):
 
     issuing_company = models.ForeignKey('issuingCompany.IssuingCompany', on_delete=models.SET_NULL, null=True, blank=True)    # Ajout de la relation avec la société emettrice
 
-    history = HistoricalRecords(inherit=True) # Pour stocker l'historique des modifications
+    history = IndexedHistoricalRecords(inherit=True, indexes=[('issuing_company', 'history_date')]) # Pour stocker l'historique des modifications
+    workflow = APPROVAL_WORKFLOW
     class Meta:
         abstract = True
         ordering = ['-created_at']
@@ -235,37 +310,12 @@ class Shareholder(models.Model):
         except KeycloakUser.DoesNotExist:
             return False
 
-    def transition_status(self, new_status, user):
-        valid_transitions = {
-            ShareholderStatus.SUBMITTED: [ShareholderStatus.EXAMINED],
-            ShareholderStatus.EXAMINED: [ShareholderStatus.APPROVED, ShareholderStatus.REJECTED],
-            ShareholderStatus.APPROVED: [],
-            ShareholderStatus.REJECTED: [ShareholderStatus.SUBMITTED]
-        }
-
-        if new_status in valid_transitions[self.status]:
-            if self.status == ShareholderStatus.SUBMITTED and new_status == ShareholderStatus.EXAMINED:
-                if user.keycloak_user.has_role(KeycloakRoles.EXAMINER):
-                    self.status = new_status
-                    self.examined_by = user
-                    self.save()
-                    return True
-            elif self.status == ShareholderStatus.EXAMINED and new_status in ShareholderStatus.APPROVED:
-                if user.keycloak_user.has_role(KeycloakRoles.APPROVER):
-                    self.status = new_status
-                    if new_status == ShareholderStatus.APPROVED:
-                        self.approved_by = user
-                    self.save()
-                    return True
-                
-            elif self.status == ShareholderStatus.EXAMINED and new_status == ShareholderStatus.REJECTED:
-                    if user.keycloak_user.has_role(KeycloakRoles.APPROVER):
-                        self.status = new_status
-                    # Ne pas modifier created_by, il reste le même
-                    self.save()
-                    return True
-            
-        return False
+    def transition_status(self, new_status, user, expected_version=None):
+        transition = self.workflow.find(self.status, new_status)
+        if transition is None or not transition.allows(user):
+            return False
+        self.workflow.perform(self, new_status, user, expected_version)
+        return True
 
 
 # Modèle pour les Actionnaires Physiques (PhysicalShareholder)
@@ -292,9 +342,12 @@ class PhysicalShareholder(Shareholder):
     class Meta:
         verbose_name = 'Physical Shareholder'
         verbose_name_plural = 'Physical Shareholders'
+        indexes = [
+            models.Index(fields=['updated_at']),
+        ]
 
     def __str__(self):
-        return f"{self.first_name} {self.last_name}"
+        return f"{self.reference_number} ({self.national_id})"
 
 
 # Modèle pour les Actionnaires Moraux (LegalShareholder)
@@ -344,6 +397,9 @@ class LegalShareholder(Shareholder):
     class Meta:
         verbose_name = 'Legal Shareholder'
         verbose_name_plural = 'Legal Shareholders'
+        indexes = [
+            models.Index(fields=['updated_at']),
+        ]
 
     def __str__(self):
         return f"{self.company_name} - Ref: {self.reference_number}"
@@ -358,7 +414,7 @@ class Share(models.Model):
     """
     Represents a company share with its characteristics
     """ 
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
     label = models.CharField(max_length=100)
     description = models.TextField(blank=True)
     price = models.DecimalField(max_digits=10, decimal_places=2)
@@ -373,7 +429,7 @@ class Share(models.Model):
     
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
-    history = HistoricalRecords()
+    history = IndexedHistoricalRecords(indexes=[('issuing_company', 'history_date')])
 
     def __str__(self):
         return f"{self.label} ({self.issuing_company})"
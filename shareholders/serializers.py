@@ -2,12 +2,14 @@
 from xml.dom.minidom import DocumentType
 from rest_framework import serializers
 from django.contrib.auth.models import User
+from sharedapp.uploads import UploadedFileFieldsMixin
 from .models import Address, ContactPerson, PhysicalShareholder, LegalShareholder, KeycloakUser, Share, FileDocument, DocumentType
 
 
-class FileDocumentSerializer(serializers.ModelSerializer):
+class FileDocumentSerializer(UploadedFileFieldsMixin, serializers.ModelSerializer):
     """
-    Serializer for managing file documents
+    Serializer for managing file documents; the file is either uploaded directly
+    or referenced by a completed upload session (`file_upload`)
     """
     document_type = serializers.ChoiceField(choices=DocumentType.choices)
     file = serializers.FileField()
@@ -20,9 +22,12 @@ class FileDocumentSerializer(serializers.ModelSerializer):
             'document_type', 
             'description', 
             'uploaded_at', 
-            'is_verified'
+            'is_verified',
+            'validation_status',
+            'validation_error',
+            'page_count'
         ]
-        read_only_fields = ['id', 'uploaded_at', 'is_verified']
+        read_only_fields = ['id', 'uploaded_at', 'is_verified', 'validation_status', 'validation_error', 'page_count']
 
     def create(self, validated_data):
         """
@@ -174,10 +179,10 @@ class PhysicalShareholderSerializer(BaseShareholderSerializer):
         fields = ('id', 'national_id', 'national_id_expiration', 'date_of_birth',
                   'addresses', 'contact_person', 'created_by', 'examined_by',
                   'approved_by', 'status', 'effective_date', 'activity_sector',
-                  'created_at', 'updated_at', 'notes', 'total_shares',
+                  'created_at', 'updated_at', 'version', 'notes', 'total_shares',
                   'dividends', 'reference_number', 'issuing_company')
         read_only_fields = ('id', 'created_by', 'examined_by', 'approved_by',
-                            'status', 'created_at', 'updated_at', 'history')
+                            'status', 'version', 'created_at', 'updated_at', 'history')
 
     def validate_email(self, value):
         """Validation personnalisée pour l'email"""
@@ -198,11 +203,11 @@ class LegalShareholderSerializer(BaseShareholderSerializer):
                   'group_percentage', 'addresses', 'effective_beneficiary',
                   'visa_date', 'contact_person', 'created_by',
                   'examined_by', 'approved_by', 'status', 'effective_date',
-                  'activity_sector', 'created_at', 'updated_at',
+                  'activity_sector', 'created_at', 'updated_at', 'version',
                   'notes', 'total_shares', 'dividends', 'reference_number',
                   'issuing_company')
         read_only_fields = ('id', 'created_by', 'examined_by', 'approved_by',
-                            'status', 'created_at', 'updated_at', 'history')
+                            'status', 'version', 'created_at', 'updated_at', 'history')
 
     def validate(self, data):
         if data.get('is_group_member') and not data.get('group_percentage'):
@@ -1,11 +1,14 @@
 # views.py
+import os
+
+from django.contrib.contenttypes.models import ContentType
+from django.http import HttpResponseRedirect
 from rest_framework import viewsets, status, filters
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.exceptions import PermissionDenied, ValidationError
 from rest_framework.permissions import IsAuthenticated
-from django.db.models import Q, Count
-from django.utils import timezone
+from django.db.models import Avg, Count, Q, Sum
 from django.db import transaction
 from django_filters.rest_framework import DjangoFilterBackend
 from .constants import ShareholderStatus, KeycloakRoles
@@ -13,6 +16,15 @@ from .constants import ShareholderStatus, KeycloakRoles
 from rest_framework.permissions import BasePermission
 
 from .models import PhysicalShareholder, LegalShareholder, Share, FileDocument
+from sharedapp.changefeed import ChangeFeedMixin
+from sharedapp.history import HistoryViewSetMixin
+from sharedapp.http import ConditionalGetMixin, DocumentBundleMixin, sign_media_url
+from sharedapp.notifications import notify_status_change
+from sharedapp.responsecache import cached_response
+from sharedapp.search import SearchIndexFilter
+from sharedapp.uploads import resolve_upload
+from sharedapp.workflow import (BulkTransitionMixin, WorkflowEventMixin,
+                               get_expected_version, record_transition)
 from .serializers import (
     ContactPersonSerializer,
     PhysicalShareholderSerializer, 
@@ -45,8 +57,9 @@ class ShareholderViewSetMixin:
     Inclut la gestion des permissions, filtrage, et actions communes
     """
     permission_classes = [IsAuthenticated]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, SearchIndexFilter, filters.OrderingFilter]
     ordering_fields = ['created_at', 'effective_date', 'status']
+    conditional_related = ['contact_person', 'addresses']
 
 
     def get_permissions(self):
@@ -59,6 +72,8 @@ class ShareholderViewSetMixin:
             return [HasKeycloakRole(KeycloakRoles.EXAMINER)]
         elif self.action == 'approve' or self.action == 'reject':
             return [HasKeycloakRole(KeycloakRoles.APPROVER)]
+        elif self.action == 'bulk_transition':
+            return [HasKeycloakRole(KeycloakRoles.ALL_ROLES)]
         else:
             return [HasKeycloakRole([
                 KeycloakRoles.ADMIN,
@@ -99,6 +114,7 @@ class ShareholderViewSetMixin:
         
 
     @action(detail=True, methods=['POST'])
+    @transaction.atomic
     def submit(self, request, pk=None):
         """
         Soumet un actionnaire pour examen
@@ -111,15 +127,19 @@ class ShareholderViewSetMixin:
             raise ValidationError("All required fields must be filled before submission")
         
         # Lors de la création, le statut sera directement SUBMITTED
+        from_status = shareholder.status
         shareholder.status = ShareholderStatus.SUBMITTED
         shareholder.created_by = request.user
         shareholder.save()
         
         self.record_action(shareholder, "submitted", request.user)
+        record_transition(shareholder, 'submit', from_status, request.user)
+        notify_status_change(shareholder, request.user)
         serializer = self.get_serializer(shareholder)
         return Response(serializer.data)
 
     @action(detail=True, methods=['POST'])
+    @transaction.atomic
     def examine(self, request, pk=None):
         """
         Marque un actionnaire comme examiné
@@ -130,13 +150,12 @@ class ShareholderViewSetMixin:
             raise PermissionDenied("Only examiners can perform this action")
             
         comments = request.data.get('comments', '')
+        from_status = shareholder.status
         
-        if shareholder.transition_status(ShareholderStatus.EXAMINED, request.user):
-            # Ajout des commentaires d'examen
-            shareholder.notes = f"{shareholder.notes}\n[Examination {timezone.now()}]: {comments}".strip()
-            shareholder.save()
-            
+        if shareholder.transition_status(ShareholderStatus.EXAMINED, request.user, get_expected_version(request)):
             self.record_action(shareholder, "examined", request.user, comments)
+            record_transition(shareholder, 'examine', from_status, request.user, comments)
+            notify_status_change(shareholder, request.user, comments)
             serializer = self.get_serializer(shareholder)
             return Response(serializer.data)
         return Response(
@@ -146,6 +165,7 @@ class ShareholderViewSetMixin:
     
 
     @action(detail=True, methods=['POST'])
+    @transaction.atomic
     def approve(self, request, pk=None):
         """
         Approuve un actionnaire
@@ -159,12 +179,12 @@ class ShareholderViewSetMixin:
         comments = request.data.get('comments', '')
         
         new_status = ShareholderStatus.APPROVED if decision == 'approve' else ShareholderStatus.REJECTED
+        from_status = shareholder.status
         
-        if shareholder.transition_status(new_status, request.user):
-            shareholder.notes = f"{shareholder.notes}\n[{new_status} {timezone.now()}]: {comments}".strip()
-            shareholder.save()
-            
+        if shareholder.transition_status(new_status, request.user, get_expected_version(request)):
             self.record_action(shareholder, new_status.lower(), request.user, comments)
+            record_transition(shareholder, 'approve' if decision == 'approve' else 'reject', from_status, request.user, comments)
+            notify_status_change(shareholder, request.user, comments)
             serializer = self.get_serializer(shareholder)
             return Response(serializer.data)
         return Response(
@@ -174,6 +194,7 @@ class ShareholderViewSetMixin:
     
     # Rejeter un actionnaire
     @action(detail=True, methods=['POST'])
+    @transaction.atomic
     def reject(self, request, pk=None):
         """
         Action de rejet pour un actionnaire
@@ -186,15 +207,14 @@ class ShareholderViewSetMixin:
             raise PermissionDenied("Seuls les approbateurs peuvent rejeter un actionnaire")
         
         comments = request.data.get('comments', '')
+        from_status = shareholder.status
         
         # Transition vers le statut REJECTED
-        if shareholder.transition_status(ShareholderStatus.REJECTED, request.user):
-            # Ajouter des commentaires de rejet
-            shareholder.notes = f"{shareholder.notes}\n[Rejeté le {timezone.now()}]: {comments}".strip()
-            shareholder.save()
-            
+        if shareholder.transition_status(ShareholderStatus.REJECTED, request.user, get_expected_version(request)):
             # Enregistrer l'action de rejet
             self.record_action(shareholder, "rejected", request.user, comments)
+            record_transition(shareholder, 'reject', from_status, request.user, comments)
+            notify_status_change(shareholder, request.user, comments)
             
             serializer = self.get_serializer(shareholder)
             return Response(serializer.data)
@@ -205,6 +225,7 @@ class ShareholderViewSetMixin:
     )
 
     @action(detail=False, methods=['GET'])
+    @cached_response()
     def statistics(self, request):
         """
         Fournit des statistiques sur les actionnaires
@@ -219,14 +240,6 @@ class ShareholderViewSetMixin:
         }
         return Response(stats)
 
-    @action(detail=True, methods=['GET'])
-    def history(self, request, pk=None):
-        """
-        Récupère l'historique des modifications d'un actionnaire
-        """
-        shareholder = self.get_object()
-        return Response(shareholder.history)
-
     @action(detail=True, methods=['POST'])
     def add_address(self, request, pk=None):
         """
@@ -242,6 +255,8 @@ class ShareholderViewSetMixin:
                 if address.is_primary:
                     # Mettre à jour les autres adresses
                     shareholder.addresses.exclude(id=address.id).update(is_primary=False)
+                # Les adresses n'ont pas de date de modification: invalide l'ETag de l'actionnaire
+                shareholder.save(update_fields=['updated_at'])
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -257,25 +272,13 @@ class ShareholderViewSetMixin:
 
     def record_action(self, shareholder, action, user, comments=''):
         """
-        Enregistre une action dans l'historique
+        Renseigne l'action comme raison de changement de la dernière version historisée
         """
-        history_entry = {
-
-            'action': action,
-            'user': user.username,
-            'timestamp': timezone.now().isoformat(),
-            'comments': comments
-        }
-        if not isinstance(shareholder.history, list):
-             # Créer un enregistrement historique
-            shareholder.history.create(
-                history_type='~',  # Symbole pour la mise à jour
-                history_user=user,
-                history_change_reason=f"{action}: {comments}"
-            )
-            # shareholder.history = []
-        shareholder.history.append(history_entry)
-        shareholder.save(update_fields=['history'])
+        reason = f"{action}: {comments}" if comments else action
+        latest = shareholder.history.order_by('-history_id').values('history_id')[:1]
+        shareholder.history.model.objects.filter(history_id__in=latest).update(
+            history_change_reason=reason[:100]
+        )
 
     
     @action(detail=True, methods=['POST'])
@@ -301,10 +304,20 @@ class ShareholderViewSetMixin:
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-class FileDocumentMixin:
+class FileDocumentMixin(DocumentBundleMixin):
     """
     Mixin to add file management actions to ViewSets
     """
+    def get_bundle_files(self, instance):
+        documents = FileDocument.objects.filter(
+            content_type=ContentType.objects.get_for_model(instance), object_id=instance.pk
+        ).order_by('uploaded_at')
+        return [
+            (f"{document.document_type}/{document.pk}{os.path.splitext(document.file.name)[1]}",
+             document.file, document.uploaded_at)
+            for document in documents
+        ]
+
     @action(detail=True, methods=['POST'], url_path='upload-document')
     def upload_document(self, request, pk=None):
         """
@@ -331,6 +344,21 @@ class FileDocumentMixin:
         serializer = FileDocumentSerializer(documents, many=True)
         return Response(serializer.data)
 
+    @action(detail=True, methods=['GET'], url_path='download-document/(?P<doc_id>[^/.]+)')
+    def download_document(self, request, pk=None, doc_id=None):
+        """
+        Redirect to a temporary signed URL of a specific document
+        """
+        instance = self.get_object()
+        document = FileDocument.objects.filter(
+            id=doc_id, content_type=ContentType.objects.get_for_model(instance), object_id=instance.pk
+        ).first()
+        if document is None or not document.file:
+            return Response({"error": "Document not found"}, status=status.HTTP_404_NOT_FOUND)
+        filename = f"{document.pk}{os.path.splitext(document.file.name)[1]}"
+        url, _ = sign_media_url(request, document.file.name, filename)
+        return HttpResponseRedirect(url)
+
     @action(detail=True, methods=['DELETE'], url_path='delete-document/(?P<doc_id>[^/.]+)')
     def delete_document(self, request, pk=None, doc_id=None):
         """
@@ -351,7 +379,7 @@ class FileDocumentMixin:
             )
         
   
-class PhysicalShareholderViewSet(ShareholderViewSetMixin, FileDocumentMixin, viewsets.ModelViewSet):
+class PhysicalShareholderViewSet(ShareholderViewSetMixin, ConditionalGetMixin, FileDocumentMixin, ChangeFeedMixin, HistoryViewSetMixin, WorkflowEventMixin, BulkTransitionMixin, viewsets.ModelViewSet):
     """
     ViewSet pour les actionnaires physiques
     """
@@ -359,8 +387,6 @@ class PhysicalShareholderViewSet(ShareholderViewSetMixin, FileDocumentMixin, vie
     serializer_class = PhysicalShareholderSerializer
     filterset_fields = ['status', 'activity_sector', 'date_of_birth',
                        'total_shares', 'reference_number']
-    search_fields = ['first_name', 'last_name', 'email', 'national_id',
-                    'reference_number']
 
     def validate_submission(self, shareholder):
         """
@@ -378,7 +404,7 @@ class PhysicalShareholderViewSet(ShareholderViewSetMixin, FileDocumentMixin, vie
             shareholder.reference_number
         ])
 
-class LegalShareholderViewSet(ShareholderViewSetMixin,  FileDocumentMixin, viewsets.ModelViewSet):
+class LegalShareholderViewSet(ShareholderViewSetMixin, ConditionalGetMixin, FileDocumentMixin, ChangeFeedMixin, HistoryViewSetMixin, WorkflowEventMixin, BulkTransitionMixin, viewsets.ModelViewSet):
     """
     ViewSet pour les actionnaires moraux
     """
@@ -387,8 +413,6 @@ class LegalShareholderViewSet(ShareholderViewSetMixin,  FileDocumentMixin, views
     serializer_class = LegalShareholderSerializer
     filterset_fields = ['status', 'activity_sector', 'is_group_member',
                        'total_shares', 'reference_number']
-    search_fields = ['company_name', 'registration_number', 'tax_id',
-                    'reference_number']
 
     def validate_submission(self, shareholder):
         """
@@ -406,6 +430,7 @@ class LegalShareholderViewSet(ShareholderViewSetMixin,  FileDocumentMixin, views
         ])
     
     @action(detail=False, methods=['GET'])
+    @cached_response()
     def group_statistics(self, request):
         """
         Statistiques spécifiques pour les actionnaires moraux
@@ -426,11 +451,15 @@ class LegalShareholderViewSet(ShareholderViewSetMixin,  FileDocumentMixin, views
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         
+        # Documents uploadés directement ou par sessions d'upload terminées (rattachés sans recopie)
+        documents_data = request.FILES.getlist('visa_document')
+        upload_ids = request.data.getlist('visa_document_uploads') if hasattr(request.data, 'getlist') \
+            else request.data.get('visa_document_uploads', [])
+        documents_data += [resolve_upload(request.user, upload_id) for upload_id in upload_ids]
+
         # Création de l'instance principale
         instance = serializer.save()
 
-        # Gestion des documents uploadés
-        documents_data = request.FILES.getlist('visa_document')
         for doc in documents_data:
             FileDocument.objects.create(
                 file=doc,
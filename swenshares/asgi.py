@@ -3,6 +3,10 @@ ASGI config for swenshares project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+The server-sent events endpoint (/api/sharedapp/events/stream/) is an async
+view: serve it through this application (e.g. uvicorn swenshares.asgi:application)
+so that idle connections do not each hold a worker thread.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
 """
@@ -14,14 +14,18 @@ class KeycloakAuthentication(BaseAuthentication):
         if not auth_header:
             return None
 
-        try:
-            # Extraire le token
-            auth_parts = auth_header.split()
-            if len(auth_parts) != 2 or auth_parts[0].lower() != 'bearer':
-                raise AuthenticationFailed('Invalid authorization header format')
+        # Extraire le token
+        auth_parts = auth_header.split()
+        if len(auth_parts) != 2 or auth_parts[0].lower() != 'bearer':
+            raise AuthenticationFailed('Invalid authorization header format')
 
-            token = auth_parts[1]
+        return self.authenticate_token(auth_parts[1])
 
+    def authenticate_token(self, token):
+        """
+        Authentifie un jeton Keycloak déjà extrait (en-tête ou paramètre de requête)
+        """
+        try:
             # Décoder le token
             # Note: Dans un environnement de production, vous devriez vérifier la signature
             decoded_token = jwt.decode(token, options={"verify_signature": False})
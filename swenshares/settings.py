@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 import os
+import tempfile
 from pathlib import Path
 
 from decouple import config
@@ -268,3 +269,132 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR,'media')
+
+# Stockage adressé par contenu: chaque fichier n'est conservé qu'une fois (blobs/ab/cd/<sha256>)
+STORAGES = {
+    'default': {'BACKEND': 'sharedapp.storage.ContentAddressedStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+# Uploads par blocs reprenables (session, PUT des blocs numérotés, finalisation)
+UPLOADS = {
+    'CHUNK_SIZE': config('UPLOAD_CHUNK_SIZE', default=1024 * 1024, cast=int),
+    'MAX_SIZE': config('UPLOAD_MAX_SIZE', default=100 * 1024 * 1024, cast=int),
+    'SESSION_HOURS': 24,
+}
+
+# Vérification des documents envoyés (commande validate_documents), dans un pool de
+# WORKERS processus pour ne pas bloquer les workers HTTP
+DOCUMENT_VALIDATION = {
+    'WORKERS': config('DOCUMENT_VALIDATION_WORKERS', default=2, cast=int),
+    'BATCH_SIZE': 50,
+    'MAX_PDF_PAGES': 500,
+}
+
+# Ramasse-miettes des fichiers orphelins (commande collect_orphan_media): parcours
+# incrémental de MEDIA_ROOT, quarantaine puis suppression après QUARANTINE_DAYS
+MEDIA_GC = {
+    'FILES_PER_RUN': config('MEDIA_GC_FILES_PER_RUN', default=100000, cast=int),
+    'BATCH_SIZE': 500,
+    'GRACE_HOURS': 24,
+    'QUARANTINE_DAYS': 7,
+    'QUARANTINE_DIR': '.quarantine',
+}
+# Colonnes fichiers des tables historiques en varchar (et non en texte): leur index, repris du
+# db_index des FileField et utilisé par le ramasse-miettes, est alors possible sous MySQL
+SIMPLE_HISTORY_FILEFIELD_TO_CHARFIELD = True
+
+# Détection des doublons d'actionnaires (commande detect_duplicates): comparaison des paires
+# au sein des blocs (identifiant normalisé, clé phonétique du nom, date de naissance) seulement;
+# un bloc de plus de MAX_BLOCK_SIZE fiches n'est comparé que par fenêtre glissante de WINDOW
+DUPLICATE_DETECTION = {
+    'THRESHOLD': config('DUPLICATE_THRESHOLD', default=0.75, cast=float),
+    'MAX_BLOCK_SIZE': 50,
+    'WINDOW': 10,
+    'BATCH_SIZE': 1000,
+}
+
+# Caches: 'default' local à chaque processus (réponses mises en cache); 'shared' commun à tous
+# les workers (versions des étiquettes d'invalidation, compteurs), fichiers par défaut, ou
+# base de données (django.core.cache.backends.db.DatabaseCache + createcachetable) si les
+# workers tournent sur plusieurs machines
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'swenshares',
+    },
+    'shared': {
+        'BACKEND': config('SHARED_CACHE_BACKEND', default='django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': config('SHARED_CACHE_LOCATION', default=os.path.join(tempfile.gettempdir(), 'swenshares-cache')),
+    },
+}
+
+# Cache des réponses des statistiques et échéanciers (sharedapp.responsecache): réponses dans
+# CACHE pendant TIMEOUT secondes au plus, invalidées par les versions d'étiquettes de VERSIONS_CACHE.
+# Requêtes identiques simultanées calculées une seule fois: SINGLE_FLIGHT '' (désactivé),
+# 'process' (dans chaque worker) ou 'cache' (entre workers, verrou dans VERSIONS_CACHE), attente
+# de WAIT_TIMEOUT secondes au plus. Une réponse invalidée calculée il y a moins de STALE_SECONDS
+# est servie pendant son recalcul en arrière-plan (0: jamais)
+RESPONSE_CACHE = {
+    'ENABLED': config('RESPONSE_CACHE_ENABLED', default=True, cast=bool),
+    'CACHE': 'default',
+    'VERSIONS_CACHE': 'shared',
+    'TIMEOUT': 300,
+    'SINGLE_FLIGHT': config('RESPONSE_SINGLE_FLIGHT', default='process'),
+    'WAIT_TIMEOUT': 30,
+    'POLL_INTERVAL': 0.05,
+    'STALE_SECONDS': config('RESPONSE_STALE_SECONDS', default=0, cast=int),
+}
+
+# Variantes des images (logos): taille maximale en pixels et format (celui de l'original par défaut)
+IMAGE_VARIANTS = {
+    'small': {'size': 64},
+    'medium': {'size': 256},
+    'webp': {'size': 512, 'format': 'WEBP'},
+}
+# Index par processus des variantes existantes (LRU de MAX_SIZE images), pour ne pas interroger le
+# disque à chaque sérialisation; une image aux variantes incomplètes est revérifiée après MISSING_SECONDS
+IMAGE_VARIANT_INDEX = {
+    'MAX_SIZE': 4096,
+    'MISSING_SECONDS': 60,
+}
+
+# Téléchargement des documents: contrôle d'accès une fois, puis URL signée temporaire.
+# BACKEND 'x-accel' (nginx: `location /protected-media/ { internal; alias <MEDIA_ROOT>/; }`)
+# ou 'x-sendfile' (Apache mod_xsendfile) délègue le transfert au serveur web frontal;
+# 'python' sert le fichier depuis Django (ETag, Last-Modified, Range).
+MEDIA_SERVING = {
+    'BACKEND': config('MEDIA_SERVING_BACKEND', default='python'),
+    'INTERNAL_PREFIX': config('MEDIA_INTERNAL_PREFIX', default='/protected-media/'),
+    'SIGNED_URL_SECONDS': config('MEDIA_SIGNED_URL_SECONDS', default=900, cast=int),
+}
+
+# Mode digest des notifications: regroupe les notifications d'un destinataire
+# et d'un canal sur une fenêtre de temps en un seul message sortant
+NOTIFICATION_DIGEST = {
+    'ENABLED': config('NOTIFICATION_DIGEST_ENABLED', default=True, cast=bool),
+    'WINDOW_SECONDS': config('NOTIFICATION_DIGEST_WINDOW_SECONDS', default=300, cast=int),
+    'MAX_LISTED': 20,
+}
+
+# File des notifications de transitions (commande dispatch_notifications, en continu avec
+# --loop ou chaque minute par cron): destinataires, notifications et événements sont créés
+# hors de la requête; un travail en échec est retenté MAX_ATTEMPTS fois au plus
+NOTIFICATION_QUEUE = {
+    'BATCH_SIZE': 100,
+    'MAX_ATTEMPTS': 5,
+    'POLL_SECONDS': config('NOTIFICATION_QUEUE_POLL_SECONDS', default=1, cast=float),
+}
+
+# Flux SSE des événements temps réel (notifications, changements de statut)
+EVENT_STREAM = {
+    'HEARTBEAT_SECONDS': 15,
+    'POLL_SECONDS': 2,
+    'RETRY_MILLISECONDS': 3000,
+    'BATCH_SIZE': 100,
+    'RETENTION_HOURS': config('EVENT_STREAM_RETENTION_HOURS', default=24, cast=int),
+    # Un événement dont l'id est sauté (transaction validée après un id supérieur) retient les
+    # suivants au plus SETTLE_SECONDS, au-delà sa transaction est tenue pour annulée
+    'SETTLE_SECONDS': 30,
+    'MAX_GAPS': 1000,
+}
@@ -22,6 +22,7 @@ from django.contrib import admin
 from rest_framework import permissions
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
+from sharedapp.views import GlobalSearchView
 
 #Configuration du Swagger
 
@@ -44,6 +45,7 @@ urlpatterns = [
     path('api/shareholders/', include('shareholders.urls')),
     path('api/issuingCompany/', include('issuingCompany.urls')),
     path('api/sharedapp/', include('sharedapp.urls'), name='sharedapp', ),
+    path('api/search/', GlobalSearchView.as_view(), name='search'),
     # URLs Swagger
     path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
     path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),